@@ -8,9 +8,10 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import argparse
-from collections import defaultdict
 import re
 
+import sample_inventory
+
 def parse_summary_statistics(file_path):
     # Parse the summary statistics file
     stats = {}
@@ -115,153 +116,84 @@ def parse_structural_errors(file_path):
     
     return df
 
+def sweep_error_types(contigs, starts, ends, types):
+    # One boundary-event sweep over all errors: each start/end is an event
+    # that changes its type's active count, and the bp between consecutive
+    # events is credited to the bitmask of types active there (bit i = type i).
+    # Returns the type names and {bitmask: bp}.
+    type_code, type_names = pd.factorize(np.asarray(types))
+    contig_code = pd.factorize(np.asarray(contigs))[0].astype(np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+
+    # zero-length errors cover no sequence
+    keep = ends > starts
+    if not keep.any():
+        return list(type_names), {}
+
+    # contigs laid end to end on one axis; nothing is active between them
+    offset = contig_code[keep] << 40
+    pos = np.concatenate([offset + starts[keep], offset + ends[keep]])
+    code = np.concatenate([type_code[keep], type_code[keep]])
+    delta = np.concatenate([np.ones(keep.sum(), dtype=np.int32), -np.ones(keep.sum(), dtype=np.int32)])
+    order = np.argsort(pos, kind='stable')
+    pos, code, delta = pos[order], code[order], delta[order]
+
+    active = np.zeros((len(pos), len(type_names)), dtype=np.int32)
+    active[np.arange(len(pos)), code] = delta
+    np.cumsum(active, axis=0, out=active)
+    mask = (active > 0) @ (np.int64(1) << np.arange(len(type_names), dtype=np.int64))
+
+    masks, inverse = np.unique(mask[:-1], return_inverse=True)
+    bp = np.bincount(inverse, weights=np.diff(pos))
+    return list(type_names), {int(m): int(b) for m, b in zip(masks, bp) if m}
+
+def attribute_error_bp(type_names, bp_by_mask):
+    # Union bp, each type's union bp, bp covered by one type only, and bp
+    # shared by each pair of types, all read off the sweep's bitmask totals
+    bp_by_type = {}
+    exclusive_bp_by_type = {}
+    shared_bp_by_pair = {}
+    for i, error_type in enumerate(type_names):
+        bit = 1 << i
+        bp_by_type[error_type] = sum(bp for mask, bp in bp_by_mask.items() if mask & bit)
+        exclusive_bp_by_type[error_type] = bp_by_mask.get(bit, 0)
+        for j in range(i + 1, len(type_names)):
+            both = bit | (1 << j)
+            pair = tuple(sorted((error_type, type_names[j])))
+            shared_bp_by_pair[pair] = sum(bp for mask, bp in bp_by_mask.items() if mask & both == both)
+
+    return {
+        'union_bp': sum(bp_by_mask.values()),
+        'bp_by_type': bp_by_type,
+        'exclusive_bp_by_type': exclusive_bp_by_type,
+        'shared_bp_by_pair': shared_bp_by_pair
+    }
+
 def calculate_nonredundant_coverage(errors_df):
-    # Calculate non-redundant base pairs covered by errors
+    # Calculate non-redundant base pairs covered by errors, in total and by type
     if errors_df.empty:
         return 0, {}
     
-    # Group by contig to handle each chromosome separately
-    total_nonredundant_bp = 0
-    bp_by_type = defaultdict(int)
-    
-    for contig in errors_df['contig'].unique():
-        contig_errors = errors_df[errors_df['contig'] == contig].copy()
-        
-        # Sort by start position
-        contig_errors = contig_errors.sort_values('start')
-        
-        # Calculate non-redundant coverage for this contig
-        merged_intervals = []
-        type_intervals = defaultdict(list)  # Track intervals by type
-        
-        for _, error in contig_errors.iterrows():
-            start, end = error['start'], error['end']
-            error_type = error['type']
-            
-            # Add to type-specific intervals
-            type_intervals[error_type].append((start, end))
-            
-            # Merge overlapping intervals for total coverage
-            if not merged_intervals or start > merged_intervals[-1][1]:
-                merged_intervals.append((start, end))
-            else:
-                # Extend the last interval if overlapping
-                merged_intervals[-1] = (merged_intervals[-1][0], max(merged_intervals[-1][1], end))
-        
-        # Calculate total non-redundant bp for this contig
-        contig_bp = sum(end - start for start, end in merged_intervals)
-        total_nonredundant_bp += contig_bp
-        
-        # Calculate non-redundant bp by error type for this contig
-        for error_type, intervals in type_intervals.items():
-            # Merge overlapping intervals for this error type
-            intervals.sort()
-            merged_type_intervals = []
-            
-            for start, end in intervals:
-                if not merged_type_intervals or start > merged_type_intervals[-1][1]:
-                    merged_type_intervals.append((start, end))
-                else:
-                    merged_type_intervals[-1] = (merged_type_intervals[-1][0], 
-                                               max(merged_type_intervals[-1][1], end))
-            
-            type_bp = sum(end - start for start, end in merged_type_intervals)
-            bp_by_type[error_type] += type_bp
-    
-    return total_nonredundant_bp, dict(bp_by_type)
+    attribution = attribute_error_bp(*sweep_error_types(
+        errors_df['contig'], errors_df['start'], errors_df['end'], errors_df['type']))
+    return attribution['union_bp'], attribution['bp_by_type']
 
 def calculate_combined_nonredundant_coverage(small_errors, struct_errors):
     # Combine all errors into one dataset first, then calculate non-redundant coverage
-    # This properly handles overlaps between small-scale and structural errors
+    # This properly handles overlaps between small-scale and structural errors.
+    # Returns the union bp, union bp by type, and the full attribution
+    # (exclusive bp per type and shared bp per type pair)
     
-    if small_errors.empty and struct_errors.empty:
-        return 0, {}
+    frames = [df[['contig', 'start', 'end', 'type']] for df in (small_errors, struct_errors) if not df.empty]
+    if not frames:
+        return 0, {}, attribute_error_bp([], {})
     
-    # Step 1: Create a combined dataset with all errors
-    combined_errors = []
+    combined_df = pd.concat(frames, ignore_index=True)
+    attribution = attribute_error_bp(*sweep_error_types(
+        combined_df['contig'], combined_df['start'], combined_df['end'], combined_df['type']))
     
-    # Add small-scale errors
-    if not small_errors.empty:
-        for _, error in small_errors.iterrows():
-            combined_errors.append({
-                'contig': error['contig'],
-                'start': error['start'], 
-                'end': error['end'],
-                'type': error['type'],
-                'category': 'small_scale'
-            })
-    
-    # Add structural errors  
-    if not struct_errors.empty:
-        for _, error in struct_errors.iterrows():
-            combined_errors.append({
-                'contig': error['contig'],
-                'start': error['start'],
-                'end': error['end'], 
-                'type': error['type'],
-                'category': 'structural'
-            })
-    
-    if not combined_errors:
-        return 0, {}
-    
-    # Convert to DataFrame for easier processing
-    import pandas as pd
-    combined_df = pd.DataFrame(combined_errors)
-    
-    # Step 2: Calculate non-redundant coverage across ALL errors
-    total_nonredundant_bp = 0
-    bp_by_type = defaultdict(int)
-    
-    # Group by contig to handle each chromosome separately
-    for contig in combined_df['contig'].unique():
-        contig_errors = combined_df[combined_df['contig'] == contig].copy()
-        
-        # Sort by start position
-        contig_errors = contig_errors.sort_values('start')
-        
-        # Step 3: Merge overlapping intervals across ALL error types
-        merged_intervals = []
-        type_intervals = defaultdict(list)  # Track intervals by type
-        
-        for _, error in contig_errors.iterrows():
-            start, end = error['start'], error['end']
-            error_type = error['type']
-            
-            # Add to type-specific tracking
-            type_intervals[error_type].append((start, end))
-            
-            # Merge overlapping intervals for total coverage
-            if not merged_intervals or start > merged_intervals[-1][1]:
-                # No overlap with previous interval
-                merged_intervals.append((start, end))
-            else:
-                # Overlap detected - merge with previous interval
-                merged_intervals[-1] = (merged_intervals[-1][0], max(merged_intervals[-1][1], end))
-        
-        # Step 4: Calculate total non-redundant bp for this contig
-        contig_bp = sum(end - start for start, end in merged_intervals)
-        total_nonredundant_bp += contig_bp
-        
-        # Step 5: Calculate non-redundant bp by error type for this contig
-        # Note: This still calculates per-type coverage separately because
-        # we want to know how much each error type contributes
-        for error_type, intervals in type_intervals.items():
-            # Merge overlapping intervals for this specific error type
-            intervals.sort()
-            merged_type_intervals = []
-            
-            for start, end in intervals:
-                if not merged_type_intervals or start > merged_type_intervals[-1][1]:
-                    merged_type_intervals.append((start, end))
-                else:
-                    merged_type_intervals[-1] = (merged_type_intervals[-1][0], 
-                                               max(merged_type_intervals[-1][1], end))
-            
-            type_bp = sum(end - start for start, end in merged_type_intervals)
-            bp_by_type[error_type] += type_bp
-    
-    return total_nonredundant_bp, dict(bp_by_type)
+    return attribution['union_bp'], attribution['bp_by_type'], attribution
 
 
 def calculate_error_statistics(small_errors, struct_errors, summary_stats):
@@ -317,7 +249,7 @@ def calculate_error_statistics(small_errors, struct_errors, summary_stats):
         }
     
     # Calculate combined non-redundant coverage
-    combined_nonredundant_bp, combined_bp_by_type = calculate_combined_nonredundant_coverage(small_errors, struct_errors)
+    combined_nonredundant_bp, combined_bp_by_type, attribution = calculate_combined_nonredundant_coverage(small_errors, struct_errors)
     
     # Combined statistics
     stats['combined'] = {
@@ -327,7 +259,9 @@ def calculate_error_statistics(small_errors, struct_errors, summary_stats):
         'error_fraction': combined_nonredundant_bp / total_length if total_length > 0 else 0,
         'assembly_length': total_length,
         'assembly_length_mbp': total_length_mbp,
-        'combined_bp_by_type': combined_bp_by_type
+        'combined_bp_by_type': combined_bp_by_type,
+        'exclusive_bp_by_type': attribution['exclusive_bp_by_type'],
+        'shared_bp_by_pair': attribution['shared_bp_by_pair']
     }
     
     # Add summary statistics
@@ -344,11 +278,18 @@ def calculate_error_statistics(small_errors, struct_errors, summary_stats):
 def analyze_sample(sample_dir, sample_name, haplotype):
     # Analyze a single sample/haplotype combination
     hap_dir = os.path.join(sample_dir, haplotype)
+    return analyze_files(os.path.join(hap_dir, 'summary_statistics'),
+                         os.path.join(hap_dir, 'small_scale_error.bed'),
+                         os.path.join(hap_dir, 'structural_error.bed'),
+                         sample_name, haplotype)
+
+def analyze_files(summary_path, small_path, struct_path, sample_name, haplotype):
+    # Analyze one haplotype's Inspector outputs
     
     # Parse files
-    summary_stats = parse_summary_statistics(os.path.join(hap_dir, 'summary_statistics'))
-    small_errors = parse_small_scale_errors(os.path.join(hap_dir, 'small_scale_error.bed'))
-    struct_errors = parse_structural_errors(os.path.join(hap_dir, 'structural_error.bed'))
+    summary_stats = parse_summary_statistics(summary_path)
+    small_errors = parse_small_scale_errors(small_path)
+    struct_errors = parse_structural_errors(struct_path)
     
     # Calculate statistics
     stats = calculate_error_statistics(small_errors, struct_errors, summary_stats)
@@ -408,11 +349,18 @@ def create_summary_table(all_stats):
         for error_type, bp in stats['structural_errors']['bp_by_type'].items():
             row[f'struct_{error_type}_bp'] = bp
         
+        # bp affected by only one error type, and bp shared by two types
+        for error_type, bp in stats['combined']['exclusive_bp_by_type'].items():
+            row[f'exclusive_{error_type}_bp'] = bp
+        
+        for (type_a, type_b), bp in stats['combined']['shared_bp_by_pair'].items():
+            row[f'shared_{type_a}_{type_b}_bp'] = bp
+        
         rows.append(row)
     
     return pd.DataFrame(rows)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Analyze Inspector error statistics')
     parser.add_argument('--input-dir', default='/projects/standard/hsiehph/shared/globus-incoming/assembly_qc_files',
                         help='Input directory containing sample folders')
@@ -422,45 +370,60 @@ def main():
                         help='Save detailed error files (large files)')
     parser.add_argument('--save-text-report', action='store_true',
                         help='Save human-readable text report')
-    args = parser.parse_args()
+    parser.add_argument('--inventory',
+                        help='sample_inventory.py cache to read (and refresh) instead of scanning --input-dir')
+    args = parser.parse_args(argv)
     
     # Create output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
     
-    # Get all sample directories
-    sample_dirs = sorted([d for d in os.listdir(args.input_dir) if os.path.isdir(os.path.join(args.input_dir, d))])
+    # One scan of the input directory, or the cached sample inventory
+    if args.inventory:
+        try:
+            rows = sample_inventory.load_inventory(args.inventory)
+        except (OSError, ValueError) as e:
+            sys.exit(f"analyze_inspector_error.py: {e}")
+    else:
+        rows, _ = sample_inventory.scan(None, args.input_dir)
+    rows = [row for row in rows if row['SmallScaleErrors'] or row['StructuralErrors'] or row['SummaryStatistics']]
+    sample_names = sorted({row['Sample'] for row in rows})
     
-    print(f"Found {len(sample_dirs)} samples to analyze")
+    print(f"Found {len(sample_names)} samples to analyze")
     
     all_stats = []
     all_small_errors = []
     all_struct_errors = []
     
-    # Analyze each sample
-    for sample_dir_name in sample_dirs:
-        sample_path = os.path.join(args.input_dir, sample_dir_name)
-        sample_name = sample_dir_name.split('_', 1)[1]  # Remove number prefix
+    # Analyze each haplotype
+    for row in rows:
+        sample_name = row['Sample']
+        haplotype = row['Haplotype']
         
-        print(f"Analyzing {sample_name}...")
+        print(f"Analyzing {sample_name} {haplotype}...")
         
-        for haplotype in ['hap1', 'hap2']:
-            try:
-                stats, small_errors, struct_errors = analyze_sample(sample_path, sample_name, haplotype)
-                all_stats.append(stats)
-                
-                # Add sample info to error dataframes
-                if not small_errors.empty:
-                    small_errors['sample'] = sample_name
-                    small_errors['haplotype'] = haplotype
-                    all_small_errors.append(small_errors)
+        missing = [c for c in ('SummaryStatistics', 'SmallScaleErrors', 'StructuralErrors') if not row[c]]
+        if missing:
+            print(f"Error processing {sample_name} {haplotype}: no {', '.join(missing)}")
+            continue
+        
+        try:
+            stats, small_errors, struct_errors = analyze_files(
+                row['SummaryStatistics'], row['SmallScaleErrors'], row['StructuralErrors'], sample_name, haplotype)
+            all_stats.append(stats)
+            
+            # Add sample info to error dataframes
+            if not small_errors.empty:
+                small_errors['sample'] = sample_name
+                small_errors['haplotype'] = haplotype
+                all_small_errors.append(small_errors)
+            
+            if not struct_errors.empty:
+                struct_errors['sample'] = sample_name
+                struct_errors['haplotype'] = haplotype
+                all_struct_errors.append(struct_errors)
                 
-                if not struct_errors.empty:
-                    struct_errors['sample'] = sample_name
-                    struct_errors['haplotype'] = haplotype
-                    all_struct_errors.append(struct_errors)
-                    
-            except Exception as e:
-                print(f"Error processing {sample_name} {haplotype}: {str(e)}")
+        except Exception as e:
+            print(f"Error processing {sample_name} {haplotype}: {str(e)}")
     
     # Create summary table
     summary_df = create_summary_table(all_stats)
@@ -487,7 +450,7 @@ def main():
     
     # Print summary statistics
     print("\n=== OVERALL STATISTICS ===")
-    print(f"Total samples analyzed: {len(sample_dirs)}")
+    print(f"Total samples analyzed: {len(sample_names)}")
     print(f"Total haplotypes analyzed: {len(all_stats)}")
     print(f"Mean QV score: {summary_df['qv_score'].mean():.2f}")
     print(f"Mean assembly size: {summary_df['assembly_length'].mean() / 1e9:.2f} Gbp")
@@ -517,6 +480,13 @@ def main():
                 for error_type, count in stats['structural_errors']['types'].items():
                     bp = stats['structural_errors']['bp_by_type'].get(error_type, 0)
                     f.write(f"  {error_type}: {count} errors, {bp:,} bp\n")
+                f.write("\nbp affected by one error type only:\n")
+                for error_type, bp in stats['combined']['exclusive_bp_by_type'].items():
+                    f.write(f"  {error_type}: {bp:,} bp\n")
+                f.write("\nbp shared by two error types:\n")
+                for (type_a, type_b), bp in stats['combined']['shared_bp_by_pair'].items():
+                    if bp:
+                        f.write(f"  {type_a} + {type_b}: {bp:,} bp\n")
                 f.write("\n" + "-" * 30 + "\n\n")
         
         print(f"Detailed statistics saved to {stats_file}")
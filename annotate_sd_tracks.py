@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+# Annotate both domains of every SD against any number of named BED tracks
+# (gaps, centromere/satellite masks, gene models, low-MAPQ regions, and
+# optionally the Inspector errors themselves) and write one wide table.
+#
+# Domains are ordered and paired exactly as the filter scripts do.  Every
+# track is merged, then all tracks are swept together once: the sweep
+# records, at each breakpoint of any track, which tracks cover the next
+# segment and the bp each track has covered so far.  A domain's overlap bp
+# with every track is then two searchsorted lookups, however many tracks.
+# Overlap is in bp, so zero-length records add nothing.
+#
+# Track paths may use {Sample} and {Haplotype} (and any other manifest
+# column).  Track names become the column prefixes <name>_bp1 / <name>_bp2
+# and must be Python identifiers, so --filter can be any pandas expression
+# over the table; passing lines get Pass = 1 and, with --selection, an
+# sd_selection bitmap:
+#
+#   python annotate_sd_tracks.py --manifest cohort_manifest.tsv --output-dir annotations/ \
+#       --track gaps=/data/{Sample}.{Haplotype}.gaps.bed \
+#       --track satellites=/data/{Sample}.{Haplotype}.rm_satellites.bed --error-tracks \
+#       --filter "gaps_bp1 + gaps_bp2 == 0 and satellites_bp1 < 0.5 * Length1"
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import sd_index
+import sd_selection
+
+ERROR_TRACKS = ('small_scale_errors', 'structural_errors')
+
+
+def coverage_sweep(tracks):
+    # One sweep over the merged blocks of all tracks.  Returns the sorted
+    # distinct breakpoints, active[i, t] (track t covers the segment starting
+    # at breakpoint i) and covered[i, t] (bp of track t below breakpoint i).
+    n_tracks = len(tracks)
+    pos, track_id, delta = [], [], []
+    for t, (axis_start, axis_end) in enumerate(tracks):
+        block_start, block_end = sd_index.merge_axis(axis_start, axis_end)
+        pos += [block_start, block_end]
+        track_id += [np.full(len(block_start), t), np.full(len(block_end), t)]
+        delta += [np.ones(len(block_start), dtype=np.int8), -np.ones(len(block_end), dtype=np.int8)]
+    if n_tracks == 0 or sum(len(p) for p in pos) == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros((0, n_tracks), dtype=bool),
+                np.zeros((0, n_tracks), dtype=np.int64))
+
+    pos = np.concatenate(pos)
+    track_id = np.concatenate(track_id)
+    delta = np.concatenate(delta)
+    order = np.argsort(pos, kind='stable')
+    pos, track_id, delta = pos[order], track_id[order], delta[order]
+
+    steps = np.zeros((len(pos), n_tracks), dtype=np.int8)
+    steps[np.arange(len(pos)), track_id] = delta
+    active = np.cumsum(steps, axis=0, dtype=np.int8)
+
+    # several events can share a position; the state after the last one holds
+    last = np.append(pos[1:] != pos[:-1], True)
+    points = pos[last]
+    active = active[last] > 0
+    segment = np.diff(points)
+    covered = np.zeros((len(points), n_tracks), dtype=np.int64)
+    np.cumsum(active[:-1] * segment[:, None], axis=0, out=covered[1:])
+    return points, active, covered
+
+
+def covered_below(sweep, x):
+    # covered[i, t]: bp of track t below axis position x[i]
+    points, active, covered = sweep
+    x = np.asarray(x, dtype=np.int64)
+    if len(points) == 0:
+        return np.zeros((len(x), active.shape[1]), dtype=np.int64)
+    k = np.searchsorted(points, x, side='right') - 1
+    inside = k >= 0
+    k = np.maximum(k, 0)
+    result = covered[k] + active[k] * (x - points[k])[:, None]
+    result[~inside] = 0
+    return result
+
+
+def domain_overlap_bp(sweep, contig, start, end):
+    # (n_domains, n_tracks) overlap bp
+    axis_start, axis_end = sd_index.to_axis(contig, start, end, bedtools_zero_length=False)
+    return covered_below(sweep, axis_end) - covered_below(sweep, axis_start)
+
+
+def parse_tracks(specs):
+    # ['name=path', ...] -> [(name, path template)]
+    tracks = []
+    for spec in specs:
+        name, sep, path = spec.partition('=')
+        if not sep or not name.isidentifier() or not path:
+            raise ValueError(f"--track {spec}: expected NAME=PATH with NAME a valid identifier")
+        tracks.append((name, path))
+    return tracks
+
+
+def annotate(row, tracks, error_tracks):
+    # The wide table for one manifest row
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+
+    names = []
+    axes = []
+    for name, template in tracks:
+        contig, start, end = sd_index.load_bed_intervals(template.format(**row), contigs)
+        names.append(name)
+        axes.append(sd_index.to_axis(contig, start, end, bedtools_zero_length=False))
+    if error_tracks:
+        errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+        for name, mask in zip(ERROR_TRACKS, (~errors.structural, errors.structural)):
+            names.append(name)
+            axes.append(sd_index.to_axis(errors.contig[mask], errors.start[mask], errors.end[mask],
+                                         bedtools_zero_length=False))
+
+    # once per canonical pair, expanded to both of its lines (every line has
+    # its pair_row's domain order, so bp1 / bp2 follow the line's Chr1 / Chr2)
+    sweep = coverage_sweep(axes)
+    r = sd.pair_row
+    bp1 = domain_overlap_bp(sweep, sd.chr1[r], sd.start1[r], sd.end1[r])[sd.pair]
+    bp2 = domain_overlap_bp(sweep, sd.chr2[r], sd.start2[r], sd.end2[r])[sd.pair]
+
+    contig_names = np.array(contigs.names, dtype=object)
+    table = pd.DataFrame({'Line': sd.line,
+                          'Chr1': contig_names[sd.chr1], 'Start1': sd.start1, 'End1': sd.end1,
+                          'Length1': sd.end1 - sd.start1,
+                          'Chr2': contig_names[sd.chr2], 'Start2': sd.start2, 'End2': sd.end2,
+                          'Length2': sd.end2 - sd.start2})
+    for t, name in enumerate(names):
+        table[f'{name}_bp1'] = bp1[:, t]
+        table[f'{name}_bp2'] = bp2[:, t]
+    return table, sd.n_lines
+
+
+def process_row(row, tracks, error_tracks, expression, output_dir, write_selection):
+    t0 = time.time()
+    table, n_lines = annotate(row, tracks, error_tracks)
+    szPrefix = os.path.join(output_dir, f"{row['Sample']}.{row['Haplotype']}")
+
+    nPass = None
+    if expression:
+        passed = np.asarray(table.eval(expression), dtype=bool)
+        table['Pass'] = passed.astype(np.int8)
+        nPass = int(passed.sum())
+        if write_selection:
+            mask = np.zeros(n_lines + 1, dtype=bool)
+            mask[table['Line'].to_numpy()[passed]] = True
+            szIndex = f"{szPrefix}.GenomicSuperDup{sd_selection.LINE_INDEX_SUFFIX}"
+            sd_selection.ensure_line_index(row['GenomicSuperDup'], szIndex)
+            sd_selection.write_selection(f"{szPrefix}.annotation_pass{sd_selection.SELECTION_SUFFIX}",
+                                         row['GenomicSuperDup'], szIndex, mask)
+
+    table.to_csv(f"{szPrefix}.sd_annotation.tsv", sep='\t', index=False)
+    return f"{szPrefix}.sd_annotation.tsv", len(table), nPass, time.time() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-domain overlap bp of SDs with named BED tracks')
+    parser.add_argument('--manifest', required=True)
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--track', action='append', default=[], metavar='NAME=PATH',
+                        help='BED track; PATH may use {Sample}/{Haplotype}.  Repeat for more tracks')
+    parser.add_argument('--error-tracks', action='store_true',
+                        help=f'Also annotate against the manifest Inspector errors ({", ".join(ERROR_TRACKS)})')
+    parser.add_argument('--filter', help='pandas expression over the table; adds a Pass column')
+    parser.add_argument('--selection', action='store_true',
+                        help='With --filter, also write the passing lines as an sd_selection bitmap')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    try:
+        tracks = parse_tracks(args.track)
+    except ValueError as e:
+        parser.error(str(e))
+    names = [name for name, _ in tracks] + (list(ERROR_TRACKS) if args.error_tracks else [])
+    if not names:
+        parser.error("give at least one --track or --error-tracks")
+    if len(set(names)) != len(names):
+        parser.error("track names must be distinct")
+    if args.selection and not args.filter:
+        parser.error("--selection needs --filter")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = sd_index.read_manifest(args.manifest)
+
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(process_row, row, tracks, args.error_tracks, args.filter,
+                               args.output_dir, args.selection): row for row in rows}
+        for future, row in futures.items():
+            try:
+                path, nLines, nPass, seconds = future.result()
+            except (OSError, ValueError, IndexError, KeyError, NameError, SyntaxError) as e:
+                print(f"Error annotating {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            szPass = f", {nPass} pass" if nPass is not None else ""
+            print(f"{row['Sample']} {row['Haplotype']}: {path} ({nLines} SD lines{szPass}, {seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Naive reference implementation of the three bedtools calls this repo makes,
+# for machines without bedtools.  It is written for obviousness, not speed:
+# every A record is tested against every B record on its contig.
+#
+#   bedtools_standin.py intersect -u -a A.bed -b B.bed
+#   bedtools_standin.py intersect -f 0.5 -F 0.5 -wa -wb -a A.bed -b B.bed
+#   bedtools_standin.py merge -i sorted.bed
+#
+# Semantics follow bedtools 2.29: half-open coordinates, zero-length records
+# widened to [start-1, end+1) before intersecting (and for -f/-F lengths),
+# and merge joining overlapping and book-ended records of sorted input.
+# check_overlap_engine.py puts this on PATH as `bedtools` when needed.
+
+import argparse
+import sys
+from collections import defaultdict
+
+
+def read_bed(path):
+    # [(fields, contig, start, end)] skipping blank, comment and header lines
+    records = []
+    with open(path, "r") as fBed:
+        for line in fBed:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            records.append((fields, fields[0], int(fields[1]), int(fields[2])))
+    return records
+
+
+def widen(start, end):
+    return (start - 1, end + 1) if start == end else (start, end)
+
+
+def intersect(args):
+    b_by_contig = defaultdict(list)
+    for fields, contig, start, end in read_bed(args.b):
+        b_by_contig[contig].append((fields, widen(start, end)))
+
+    out = sys.stdout
+    for a_fields, contig, start, end in read_bed(args.a):
+        a_start, a_end = widen(start, end)
+        for b_fields, (b_start, b_end) in b_by_contig[contig]:
+            overlap = min(a_end, b_end) - max(a_start, b_start)
+            if overlap <= 0:
+                continue
+            if args.f is not None and overlap / (a_end - a_start) < args.f:
+                continue
+            if args.F is not None and overlap / (b_end - b_start) < args.F:
+                continue
+            if args.u:
+                out.write("\t".join(a_fields) + "\n")
+                break
+            if args.wa and args.wb:
+                out.write("\t".join(a_fields + b_fields) + "\n")
+            elif args.wb:
+                out.write("\t".join([contig, str(max(start, b_start)), str(min(end, b_end))] + b_fields) + "\n")
+            else:
+                out.write("\t".join(a_fields) + "\n")
+
+
+def merge(args):
+    out = sys.stdout
+    current = None
+    for _, contig, start, end in read_bed(args.i):
+        if current and current[0] == contig:
+            if start < current[1]:
+                sys.exit(f"Error: input is not sorted ({contig}:{start} after {contig}:{current[1]})")
+            if start <= current[2]:
+                current[2] = max(current[2], end)
+                continue
+        if current:
+            out.write(f"{current[0]}\t{current[1]}\t{current[2]}\n")
+        current = [contig, start, end]
+    if current:
+        out.write(f"{current[0]}\t{current[1]}\t{current[2]}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in for bedtools intersect/merge')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('intersect')
+    p.add_argument('-a', required=True)
+    p.add_argument('-b', required=True)
+    p.add_argument('-u', action='store_true')
+    p.add_argument('-wa', action='store_true')
+    p.add_argument('-wb', action='store_true')
+    p.add_argument('-f', type=float)
+    p.add_argument('-F', type=float)
+    p.set_defaults(func=intersect)
+
+    p = sub.add_parser('merge')
+    p.add_argument('-i', required=True)
+    p.set_defaults(func=merge)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Every cohort table the R plotting scripts read, computed from the raw
+# inputs in one parallel pass over the manifest (each haplotype's SD table
+# and error BEDs are parsed once; both filters run on the same arrays):
+#
+#   {prefix}_SD_info.tsv     scatter_nonredbp_SDpairs.R, violin_nonredundant_bp.R
+#       Sample, Haplotype, SD_pairs, Nonredundant_bp, Superpopulation,
+#       SD_lines, SD_nonredundant_bp
+#   {prefix}_SD_counts.tsv   violin_SD_pair_counts.R
+#       Sample, Haplotype, SD_pairs, Superpopulation
+#   filter_SDs_by_structural_errors.tsv, filter_SDs_by_all_errors.tsv
+#                            violin_error_filtering_comparison*.R
+#       Sample, Haplotype, SD_pairs_before_filtering, SD_pairs_after_filtering,
+#       Nonredundant_bp_before_filtering, nonredundat_bp_after_filtering
+#   PI_ancestry_map.tsv      copied from --ancestry-map
+#
+# The R scripts select the SD_info and SD_counts columns by position, so the
+# column order is fixed (columns 4 and 7 hold the same nonredundant bp, as
+# the two scripts read it from different positions); the filter tables keep
+# the column names the scripts select, spelling included.  Superpopulation
+# is joined from the headerless Sample<TAB>population map.  Counts are
+# canonical SD pairs and overlap follows the filter scripts, so the filter
+# tables match their *.filtering_summary.txt files.
+#
+# --plots then runs each R script whose inputs are all in --output-dir:
+#
+#   python build_cohort_tables.py --manifest cohort_manifest.tsv \
+#       --ancestry-map PI_ancestry_map.tsv --output-dir figures/ --plots
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import sd_index
+from contig_length_stats import read_ancestry_map
+from interval_set import IntervalSet
+
+SD_INFO_COLUMNS = ['Sample', 'Haplotype', 'SD_pairs', 'Nonredundant_bp', 'Superpopulation',
+                   'SD_lines', 'SD_nonredundant_bp']
+SD_COUNTS_COLUMNS = ['Sample', 'Haplotype', 'SD_pairs', 'Superpopulation']
+FILTER_COLUMNS = ['Sample', 'Haplotype', 'SD_pairs_before_filtering', 'SD_pairs_after_filtering',
+                  'Nonredundant_bp_before_filtering', 'nonredundat_bp_after_filtering']
+FILTER_TABLES = {'structural': 'filter_SDs_by_structural_errors.tsv',
+                 'all': 'filter_SDs_by_all_errors.tsv'}
+ANCESTRY_MAP = 'PI_ancestry_map.tsv'
+
+# R script -> the tables it reads (HPRC_* are reference tables built with
+# --prefix HPRC or supplied by hand)
+R_SCRIPTS = {
+    'scatter_nonredbp_SDpairs.R': ['HPRC_SD_info.tsv', 'PI_SD_info.tsv'],
+    'violin_nonredundant_bp.R': ['HPRC_SD_info.tsv', 'PI_SD_info.tsv'],
+    'violin_SD_pair_counts.R': ['HPRC_SD_counts.tsv', 'PI_SD_counts.tsv'],
+    'violin_error_filtering_comparison.R': list(FILTER_TABLES.values()) + [ANCESTRY_MAP],
+    'violin_error_filtering_comparison2.R': list(FILTER_TABLES.values()) + [ANCESTRY_MAP],
+}
+
+
+def haplotype_values(row):
+    # SD counts and nonredundant bp before and after both filters
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+    errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+    struct = errors.subset(errors.structural)
+
+    values = {'SD_pairs': sd.n_pairs, 'SD_lines': len(sd),
+              'Nonredundant_bp': IntervalSet.from_sd(sd).length}
+    for name, table in (('structural', struct), ('all', errors)):
+        removed = sd_index.pairs_overlap_any(sd, sd_index.IntervalIndex(table.contig, table.start, table.end))
+        values[f'{name}_pairs_after'] = int((~removed).sum())
+        values[f'{name}_bp_after'] = IntervalSet.from_sd(sd, sd.pair_row[~removed]).length
+    return values
+
+
+def table_rows(row, values, superpopulation):
+    # {table: row dict} for one haplotype
+    base = {'Sample': row['Sample'], 'Haplotype': row['Haplotype']}
+    rows = {
+        'SD_info': dict(base, SD_pairs=values['SD_pairs'], Nonredundant_bp=values['Nonredundant_bp'],
+                        Superpopulation=superpopulation, SD_lines=values['SD_lines'],
+                        SD_nonredundant_bp=values['Nonredundant_bp']),
+        'SD_counts': dict(base, SD_pairs=values['SD_pairs'], Superpopulation=superpopulation),
+    }
+    for name in FILTER_TABLES:
+        rows[name] = dict(base, SD_pairs_before_filtering=values['SD_pairs'],
+                          SD_pairs_after_filtering=values[f'{name}_pairs_after'],
+                          Nonredundant_bp_before_filtering=values['Nonredundant_bp'],
+                          nonredundat_bp_after_filtering=values[f'{name}_bp_after'])
+    return rows
+
+
+def write_table(path, columns, rows):
+    with open(path, "w") as fOut:
+        fOut.write("\t".join(columns) + "\n")
+        for row in rows:
+            fOut.write("\t".join(str(row[c]) for c in columns) + "\n")
+
+
+def run_plots(output_dir):
+    # Each R script whose inputs are all present, run in output_dir
+    if shutil.which('Rscript') is None:
+        print("--plots: Rscript not found on PATH", file=sys.stderr)
+        return 1
+    szScriptDir = os.path.dirname(os.path.abspath(__file__))
+    nFailed = 0
+    for szScript, aInputs in R_SCRIPTS.items():
+        missing = [f for f in aInputs if not os.path.exists(os.path.join(output_dir, f))]
+        if missing:
+            print(f"Skipping {szScript}: no {', '.join(missing)}", file=sys.stderr)
+            continue
+        nReturn = subprocess.call(['Rscript', os.path.join(szScriptDir, szScript)], cwd=output_dir)
+        if nReturn:
+            nFailed += 1
+            print(f"{szScript} exited with {nReturn}", file=sys.stderr)
+    return nFailed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the cohort TSVs the R plotting scripts read')
+    parser.add_argument('--manifest', required=True)
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--ancestry-map', help='Headerless Sample<TAB>population map (PI_ancestry_map.tsv)')
+    parser.add_argument('--prefix', default='PI', help='Prefix of the SD_info / SD_counts tables (e.g. HPRC)')
+    parser.add_argument('--no-filter-tables', action='store_true',
+                        help='Only write the SD_info / SD_counts tables (e.g. for a reference cohort)')
+    parser.add_argument('--plots', action='store_true', help='Then run the R scripts whose inputs are present')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = sd_index.read_manifest(args.manifest)
+    ancestry = read_ancestry_map(args.ancestry_map) if args.ancestry_map else {}
+
+    tables = {name: [] for name in ['SD_info', 'SD_counts'] + list(FILTER_TABLES)}
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = [(row, pool.submit(haplotype_values, row)) for row in rows]
+        for row, future in futures:
+            try:
+                values = future.result()
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error processing {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            for name, table_row in table_rows(row, values, ancestry.get(row['Sample'], 'NA')).items():
+                tables[name].append(table_row)
+
+    written = [os.path.join(args.output_dir, f"{args.prefix}_SD_info.tsv"),
+               os.path.join(args.output_dir, f"{args.prefix}_SD_counts.tsv")]
+    write_table(written[0], SD_INFO_COLUMNS, tables['SD_info'])
+    write_table(written[1], SD_COUNTS_COLUMNS, tables['SD_counts'])
+    if not args.no_filter_tables:
+        for name, szFile in FILTER_TABLES.items():
+            written.append(os.path.join(args.output_dir, szFile))
+            write_table(written[-1], FILTER_COLUMNS, tables[name])
+        if args.ancestry_map:
+            szMap = os.path.join(args.output_dir, ANCESTRY_MAP)
+            if not os.path.exists(szMap) or not os.path.samefile(args.ancestry_map, szMap):
+                shutil.copyfile(args.ancestry_map, szMap)
+            written.append(szMap)
+
+    print(f"{len(tables['SD_info'])} of {len(rows)} haplotypes in {time.time() - t0:.1f}s:")
+    for path in written:
+        print(f"  {path}")
+
+    if args.plots:
+        return 1 if run_plots(args.output_dir) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
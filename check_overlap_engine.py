@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+
+# Differential correctness and speed check of the in-process overlap engine
+# (sd_index / sd_shards) against the legacy bedtools subprocess path.
+#
+# Every round writes a randomized edge-case dataset -- zero-length and 1 bp
+# intervals, book-ended and nested intervals, errors placed exactly at domain
+# boundaries, HaplotypeSwitch semicolon coordinates, comment lines inside the
+# SD table, unmirrored and duplicated SD lines, exact 50% reciprocal overlaps
+# -- and runs each case both ways.  Outputs are diffed line by line, and the
+# timings and speedup of each case go into the report.  Per-line annotations
+# that bedtools has no single call for are checked against a naive loop over
+# each line's own domains instead, which catches values computed once per
+# canonical pair landing on the wrong side of a mirrored line.
+#
+# The reference is bedtools when found on PATH (or given with --bedtools),
+# otherwise bedtools_standin.py.  Either way it is put first on PATH as
+# `bedtools` next to a no-op `module`, so the filter scripts' legacy
+# "module load bedtools/2.29.2 && bedtools ..." commands run unchanged.
+#
+# python check_overlap_engine.py --rounds 20 --seed 1 --report engine_check.tsv
+
+import argparse
+import difflib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import sd_index
+import sd_shards
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+REPORT_COLUMNS = ['Round', 'Seed', 'Case', 'Reference', 'Legacy_Lines', 'InProcess_Lines',
+                  'Differing_Lines', 'Legacy_Seconds', 'InProcess_Seconds', 'Speedup']
+
+
+# ---------------------------------------------------------------------------
+# randomized edge-case inputs
+
+def random_domain(rng, contigs, max_length):
+    contig = contigs[rng.integers(len(contigs))]
+    kind = rng.random()
+    if kind < 0.05:
+        length = 0
+    elif kind < 0.10:
+        length = 1
+    else:
+        length = int(rng.integers(2, max_length))
+    start = int(rng.integers(1, 2_000_000))
+    return contig, start, start + length
+
+
+def sd_line(k, c1, s1, e1, c2, s2, e2, frac):
+    words = [c1, s1, e1, 'n', 0, '+', c2, s2, e2, 0, 0, 0, 0, 0, 0, 0,
+             f'data/align/{k}', e1 - s1, 0, 0, 0, 0, 0, 0, 0, f'{frac:.6f}', f'{frac:.6f}', 0, 0]
+    return "\t".join(str(w) for w in words) + "\n"
+
+
+def write_genomic_superdup(path, sds, rng):
+    # Mirrored listing for most pairs, with a header, stray comment lines
+    # (they still count towards the 1-based line numbers), unmirrored lines
+    # and exact duplicates
+    with open(path, "w") as fSD:
+        fSD.write("#chrom\tchromStart\tchromEnd\tname\tscore\tstrand\totherChrom\totherStart\totherEnd\n")
+        for k, (a, b) in enumerate(sds):
+            frac = rng.uniform(0.9, 1.0)
+            if rng.random() < 0.03:
+                fSD.write("# interleaved comment\n")
+            fSD.write(sd_line(k, *a, *b, frac))
+            if rng.random() < 0.9:
+                fSD.write(sd_line(k, *b, *a, frac))
+            if rng.random() < 0.02:
+                fSD.write(sd_line(k, *a, *b, frac))
+
+
+def generate_dataset(rng, directory, n_sds, n_errors):
+    # Contig names sort differently as strings and numbers; the last ones
+    # carry only errors
+    contigs = [f"h1tg{c:d}l" for c in range(1, 13)]
+    sd_contigs = contigs[:10]
+
+    sds = []
+    for _ in range(n_sds):
+        a = random_domain(rng, sd_contigs, 5000)
+        if rng.random() < 0.1:
+            # intra-contig pair, sometimes with equal starts
+            b = (a[0], a[1], a[1] + int(rng.integers(0, 3000))) if rng.random() < 0.3 \
+                else (a[0], a[1] + int(rng.integers(0, 5000)), a[2] + int(rng.integers(0, 5000)))
+        else:
+            b = random_domain(rng, sd_contigs, 5000)
+        if b[2] < b[1]:
+            b = (b[0], b[1], b[1])
+        sds.append((a, b))
+        if rng.random() < 0.05:
+            # nested and identical domains
+            sds.append(((a[0], a[1], a[1] + (a[2] - a[1]) // 2), b))
+
+    # Callset B: copies of A shifted by fractions of their length, including
+    # exact 50% reciprocal overlaps, plus unrelated SDs
+    sds_b = []
+    for a, b in sds:
+        if rng.random() < 0.6:
+            shift = rng.choice([0.0, 0.25, 0.5, 0.5, 0.51, 0.75])
+            da = int(round((a[2] - a[1]) * shift))
+            db = int(round((b[2] - b[1]) * shift)) if rng.random() < 0.8 else da
+            sds_b.append(((a[0], a[1] + da, a[2] + da), (b[0], b[1] + db, b[2] + db)))
+    for _ in range(n_sds // 5):
+        sds_b.append((random_domain(rng, sd_contigs, 5000), random_domain(rng, sd_contigs, 5000)))
+
+    paths = {'sd': os.path.join(directory, "GenomicSuperDup.tab"),
+             'sd_b': os.path.join(directory, "GenomicSuperDup.B.tab"),
+             'small': os.path.join(directory, "small_scale_error.bed"),
+             'struct': os.path.join(directory, "structural_error.bed")}
+    write_genomic_superdup(paths['sd'], sds, rng)
+    write_genomic_superdup(paths['sd_b'], sds_b, rng)
+
+    # errors at random, and pinned to domain boundaries: book-ended on either
+    # side, zero-length exactly at the start, at the end, and one base outside
+    domains = [d for sd in sds for d in sd]
+    with open(paths['small'], "w") as fSmall:
+        fSmall.write("#Contig\tStart\tEnd\tRef\tAlt\tRead_support\tDepth\tType\tError_rate\n")
+        for _ in range(n_errors):
+            if rng.random() < 0.5:
+                contig, start, end = random_domain(rng, contigs, 30)
+            else:
+                contig, d_start, d_end = domains[rng.integers(len(domains))]
+                start = rng.choice([d_start, d_end, d_start - 1, d_end + 1, max(d_start - 5, 0)])
+                if start <= d_start:
+                    end = rng.choice([start, start, start + 1, d_start])
+                else:
+                    end = start + int(rng.integers(0, 3))
+            szType = 'BaseSubstitution' if end - start == 1 else rng.choice(['SmallCollapse', 'SmallExpansion'])
+            fSmall.write(f"{contig}\t{start}\t{end}\tA\tC\t5\t30\t{szType}\t0.001\n")
+
+    with open(paths['struct'], "w") as fStruct:
+        fStruct.write("#Contig\tStart\tEnd\tRead_support\tType\tSize\tDepth\n")
+        for _ in range(max(n_errors // 8, 1)):
+            contig, start, end = random_domain(rng, contigs, 20_000)
+            szType = rng.choice(['Expansion', 'Collapse', 'HaplotypeSwitch', 'Inversion'])
+            if szType == 'HaplotypeSwitch':
+                # only the first coordinate of each list is used
+                fStruct.write(f"{contig}\t{start};{start + 50_000}\t{end};{end + 50_000}\t5\t{szType}\t"
+                              f"Size={end - start};{end - start}\t.\n")
+            else:
+                fStruct.write(f"{contig}\t{start}\t{end}\t5\t{szType}\tSize={end - start}\t.\n")
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# helpers
+
+def read_bed_arrays(path, contigs, n_columns=3):
+    # (contig codes, starts, ends, raw lines) of a plain BED file
+    aContig, aStart, aEnd, aLines = [], [], [], []
+    with open(path, "r") as fBed:
+        for line in fBed:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.rstrip('\n').split('\t')
+            aContig.append(contigs.code(fields[0]))
+            aStart.append(int(fields[1]))
+            aEnd.append(int(fields[2]))
+            aLines.append("\t".join(fields[:n_columns]) if n_columns else line.rstrip('\n'))
+    return (np.array(aContig, dtype=np.int32), np.array(aStart, dtype=np.int64),
+            np.array(aEnd, dtype=np.int64), aLines)
+
+
+def read_lines(path):
+    with open(path, "r") as f:
+        return f.read().splitlines()
+
+
+def run(command, env):
+    result = subprocess.run(command, shell=True, env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{command} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def timed(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - t0
+
+
+def make_shim_dir(directory, bedtools):
+    # `bedtools` (the reference) and a no-op `module` for the legacy commands
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "module"), "w") as f:
+        f.write("#!/bin/sh\nexit 0\n")
+    with open(os.path.join(directory, "bedtools"), "w") as f:
+        if bedtools:
+            f.write(f'#!/bin/sh\nexec "{bedtools}" "$@"\n')
+        else:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(HERE, "bedtools_standin.py")}" "$@"\n')
+    for name in ("module", "bedtools"):
+        os.chmod(os.path.join(directory, name), 0o755)
+
+
+def write_domain_bed(path, sd):
+    # The filter scripts' domain BED: both domains of each canonical pair
+    names = sd.contigs.names
+    with open(path, "w") as fBed:
+        for nPair, nRow in enumerate(sd.pair_row):
+            fBed.write(f"{names[sd.chr1[nRow]]}\t{sd.start1[nRow]}\t{sd.end1[nRow]}\t{nPair}\t{sd.line[nRow]}\n")
+            fBed.write(f"{names[sd.chr2[nRow]]}\t{sd.start2[nRow]}\t{sd.end2[nRow]}\t{nPair}\t{sd.line[nRow]}\n")
+
+
+def write_combined_errors(path, small, struct):
+    # Error BED exactly as filter_sd_by_errors.py writes it (first
+    # coordinate of HaplotypeSwitch lists)
+    with open(path, "w") as fCombined:
+        for szPath in (small, struct):
+            with open(szPath, "r") as fErrors:
+                for line in fErrors:
+                    if line.startswith('#'):
+                        continue
+                    fields = line.strip().split('\t')
+                    if len(fields) >= 3:
+                        fCombined.write(f"{fields[0]}\t{fields[1].split(';')[0]}\t{fields[2].split(';')[0]}\n")
+
+
+def write_front_beds(szGenomicSuperDup, szFrontSmaller, szFrontLarger):
+    # filter_asm_qc.py's legacy per-callset BEDs: smaller domain first, then
+    # the same SD with the larger domain first; name(3) and line number(7)
+    with open(szGenomicSuperDup, "r") as fSD, open(szFrontSmaller, "w") as fA, open(szFrontLarger, "w") as fB:
+        n1Line = 0
+        for szLine in fSD:
+            n1Line += 1
+            if szLine.startswith('#'):
+                continue
+            aWords = szLine.split('\t')
+            szChr1, nStart1, nEnd1 = aWords[0], int(aWords[1]), int(aWords[2])
+            szChr2, nStart2, nEnd2 = aWords[6], int(aWords[7]), int(aWords[8])
+            if (szChr1 > szChr2) or (szChr1 == szChr2 and nStart1 > nStart2):
+                (szChr1, nStart1, nEnd1, szChr2, nStart2, nEnd2) = (szChr2, nStart2, nEnd2, szChr1, nStart1, nEnd1)
+            fA.write(f"{szChr1}\t{nStart1}\t{nEnd1}\t{aWords[16]}\t{szChr2}\t{nStart2}\t{nEnd2}\t{n1Line}\n")
+            fB.write(f"{szChr2}\t{nStart2}\t{nEnd2}\t{aWords[16]}\t{szChr1}\t{nStart1}\t{nEnd1}\t{n1Line}\n")
+
+
+def read_sd_domains(path):
+    # [(line, (contig, start, end), (contig, start, end))] of every SD line,
+    # domains in (contig name, start, end) order as sd_index documents
+    records = []
+    with open(path, "r") as fSD:
+        for n1Line, line in enumerate(fSD, 1):
+            if line.startswith('#'):
+                continue
+            w = line.split('\t')
+            records.append((n1Line,) + tuple(sorted([(w[0], int(w[1]), int(w[2])), (w[6], int(w[7]), int(w[8]))])))
+    return records
+
+
+def read_error_records(path):
+    # [(contig, start, end)] of one Inspector BED, first HaplotypeSwitch coordinate
+    records = []
+    with open(path, "r") as fErrors:
+        for line in fErrors:
+            if line.startswith('#'):
+                continue
+            fields = line.strip().split('\t')
+            if len(fields) >= 3:
+                records.append((fields[0], int(fields[1].split(';')[0]), int(fields[2].split(';')[0])))
+    return records
+
+
+def naive_covered_bp(domain, records):
+    # bp of domain covered by the union of records
+    contig, start, end = domain
+    pieces = sorted((max(s, start), min(e, end)) for c, s, e in records if c == contig and min(e, end) > max(s, start))
+    covered, reach = 0, start
+    for s, e in pieces:
+        if e > reach:
+            covered += e - max(s, reach)
+            reach = e
+    return covered
+
+
+def naive_signed_distance(domain, records):
+    # `bedtools closest -D ref` distance of domain to the nearest record,
+    # zero-length intervals widened; ties go upstream; None without records
+    contig, start, end = domain
+    if start == end:
+        start, end = start - 1, end + 1
+    best = None
+    for c, s, e in records:
+        if c != contig:
+            continue
+        if s == e:
+            s, e = s - 1, e + 1
+        if min(e, end) > max(s, start):
+            return 0
+        d = -(start - e + 1) if e <= start else s - end + 1
+        if best is None or abs(d) < abs(best) or (abs(d) == abs(best) and d < 0):
+            best = d
+    return best
+
+
+# ---------------------------------------------------------------------------
+# cases: each returns (legacy lines, in-process lines, legacy s, in-process s)
+
+def case_intersect_u(paths, work, env):
+    # bedtools intersect -u of the SD domains against all errors
+    sd = sd_index.load_genomic_superdup(paths['sd'])
+    szDomains = os.path.join(work, "domains.bed")
+    szErrors = os.path.join(work, "combined_errors.bed")
+    write_domain_bed(szDomains, sd)
+    write_combined_errors(szErrors, paths['small'], paths['struct'])
+
+    legacy, t_legacy = timed(lambda: run(f"bedtools intersect -u -a {szDomains} -b {szErrors}", env).splitlines())
+
+    def inprocess():
+        contigs = sd_index.ContigCodes()
+        d_contig, d_start, d_end, d_lines = read_bed_arrays(szDomains, contigs, n_columns=0)
+        errors = sd_index.load_inspector_errors(paths['small'], paths['struct'], contigs)
+        hit = sd_index.IntervalIndex(errors.contig, errors.start, errors.end).overlaps_any(d_contig, d_start, d_end)
+        return [d_lines[i] for i in np.nonzero(hit)[0]]
+    ours, t_ours = timed(inprocess)
+    return legacy, ours, t_legacy, t_ours
+
+
+def case_intersect_reciprocal(paths, work, env):
+    # bedtools intersect -f 0.5 -F 0.5 -wa -wb of callset A's front-smaller
+    # BED against callset B's; compared as sorted line sets, since bedtools
+    # does not promise an order for the -b hits of one -a record
+    szA = os.path.join(work, "a_front_smaller.bed")
+    szB = os.path.join(work, "b_front_smaller.bed")
+    write_front_beds(paths['sd'], szA, os.path.join(work, "a_front_larger.bed"))
+    write_front_beds(paths['sd_b'], szB, os.path.join(work, "b_front_larger.bed"))
+
+    legacy, t_legacy = timed(lambda: sorted(
+        run(f"bedtools intersect -f 0.5 -F 0.5 -wa -wb -a {szA} -b {szB}", env).splitlines()))
+
+    def inprocess():
+        contigs = sd_index.ContigCodes()
+        a_contig, a_start, a_end, a_lines = read_bed_arrays(szA, contigs, n_columns=0)
+        b_contig, b_start, b_end, b_lines = read_bed_arrays(szB, contigs, n_columns=0)
+        qa_start, qa_end = sd_index.to_axis(a_contig, a_start, a_end)
+        tb_start, tb_end = sd_index.to_axis(b_contig, b_start, b_end)
+        lines = []
+        for ai, bi in sd_index.iter_overlap_pairs(qa_start, qa_end, tb_start, tb_end):
+            keep = sd_shards.reciprocal_fraction(qa_start[ai], qa_end[ai], tb_start[bi], tb_end[bi]) >= 0.5
+            lines += [a_lines[i] + "\t" + b_lines[j] for i, j in zip(ai[keep], bi[keep])]
+        return sorted(lines)
+    ours, t_ours = timed(inprocess)
+    return legacy, ours, t_legacy, t_ours
+
+
+def case_merge(paths, work, env):
+    # bedtools merge of every SD domain, sorted as `sort -k1,1 -k2,2n` does
+    sd = sd_index.load_genomic_superdup(paths['sd'])
+    names = sd.contigs.names
+    records = sorted((names[c], s, e) for c, s, e in zip(
+        np.concatenate([sd.chr1, sd.chr2]).tolist(), np.concatenate([sd.start1, sd.start2]).tolist(),
+        np.concatenate([sd.end1, sd.end2]).tolist()))
+    szSorted = os.path.join(work, "domains_sorted.bed")
+    with open(szSorted, "w") as fBed:
+        fBed.writelines(f"{c}\t{s}\t{e}\n" for c, s, e in records)
+
+    legacy, t_legacy = timed(lambda: run(f"bedtools merge -i {szSorted}", env).splitlines())
+
+    def inprocess():
+        contigs = sd_index.ContigCodes()
+        contig, start, end, _ = read_bed_arrays(szSorted, contigs)
+        block_start, block_end = sd_index.merge_axis(*sd_index.to_axis(contig, start, end, bedtools_zero_length=False))
+        block_contig = block_start // sd_index.CONTIG_STRIDE
+        offset = block_contig * sd_index.CONTIG_STRIDE
+        return [f"{contigs.names[c]}\t{s}\t{e}" for c, s, e in
+                sorted(zip(block_contig.tolist(), (block_start - offset).tolist(), (block_end - offset).tolist()),
+                       key=lambda r: (contigs.names[r[0]], r[1]))]
+    ours, t_ours = timed(inprocess)
+    return legacy, ours, t_legacy, t_ours
+
+
+def run_filter_script(script, paths, out_dir, engine, env):
+    # Run one filter script and return the concatenated lines of its outputs
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = os.path.join(out_dir, "tmp")
+    os.makedirs(tmp, exist_ok=True)
+    szErrors = f"--szStructuralErrors {paths['struct']}"
+    if script == 'filter_sd_by_errors.py':
+        szErrors = f"--szSmallScaleErrors {paths['small']} " + szErrors
+    run(f"{sys.executable} {os.path.join(HERE, script)} --szGenomicSuperDup {paths['sd']} {szErrors} "
+        f"--szSampleName S --szHaplotype h1 --szEngine {engine} --szOutputDir {out_dir}",
+        dict(env, TMPDIR=tmp))
+    lines = []
+    for name in sorted(os.listdir(out_dir)):
+        path = os.path.join(out_dir, name)
+        if os.path.isfile(path):
+            lines += [f"{name}: {line}" for line in read_lines(path)]
+    return lines
+
+
+def make_filter_case(script):
+    def case(paths, work, env):
+        legacy, t_legacy = timed(run_filter_script, script, paths, os.path.join(work, "bedtools"), 'bedtools', env)
+        ours, t_ours = timed(run_filter_script, script, paths, os.path.join(work, "inprocess"), 'inprocess', env)
+        return legacy, ours, t_legacy, t_ours
+    return case
+
+
+def case_callset_match(paths, work, env):
+    # filter_asm_qc.py's legacy reciprocal matching (both halves through
+    # bedtools, joined on line-number pairs) against sd_shards.run_sharded
+    def legacy_path():
+        out_dir = os.path.join(work, "legacy")
+        tmp = os.path.join(out_dir, "tmp")
+        os.makedirs(tmp, exist_ok=True)
+        run(f"cd {out_dir} && {sys.executable} {os.path.join(HERE, 'filter_asm_qc.py')} "
+            f"--szWgacGenomicSuperDupA {paths['sd']} --szWgacGenomicSuperDupB {paths['sd_b']} "
+            f"--szSampleNameA A --szSampleNameB B --nSortThreads 1", dict(env, TMPDIR=tmp))
+        out = {'just_A': "just_A.bed", 'just_B': "just_B.bed", 'in_common': "A_vs_B_inCommon.bed"}
+        return [f"{name}: {l}" for name in ('just_A', 'just_B', 'in_common')
+                for l in read_lines(os.path.join(out_dir, out[name]))]
+
+    def inprocess():
+        out = {name: os.path.join(work, f"{name}.bed") for name in ('just_A', 'just_B', 'in_common')}
+        sd_shards.run_sharded(paths['sd'], paths['sd_b'], out['just_A'], out['just_B'], out['in_common'],
+                              os.path.join(work, "shards"), n_shards=3, n_workers=1)
+        return [f"{name}: {l}" for name in ('just_A', 'just_B', 'in_common') for l in read_lines(out[name])]
+
+    legacy, t_legacy = timed(legacy_path)
+    ours, t_ours = timed(inprocess)
+    return legacy, ours, t_legacy, t_ours
+
+
+def case_triage_full_read(paths, work, env):
+    # sd_triage.py's contig estimates with every contig read against the
+    # filters' summaries (pairs, percent removed, bp after filtering) and
+    # IntervalSet's nonredundant bp before filtering
+    import sd_triage
+    from interval_set import IntervalSet
+    szSorted = os.path.join(work, "sd_by_contig.tab")
+    with open(paths['sd'], "r") as f:
+        lines = f.read().splitlines()
+    with open(szSorted, "w") as f:
+        f.write("".join(f"{l}\n" for l in lines if l.startswith('#')))
+        f.write("".join(f"{l}\n" for l in sorted((l for l in lines if l and not l.startswith('#')),
+                                                  key=lambda l: l.split('\t', 1)[0])))
+    bp_before = IntervalSet.from_sd(sd_index.load_genomic_superdup(paths['sd'])).length
+    row = {'GenomicSuperDup': szSorted, 'SmallScaleErrors': paths['small'], 'StructuralErrors': paths['struct']}
+
+    def summaries():
+        out = []
+        for script, structural in (('filter_sd_by_errors.py', False), ('filter_sd_by_structural_errors.py', True)):
+            out_dir = os.path.join(work, f"filter_{int(structural)}")
+            run_filter_script(script, paths, out_dir, 'inprocess', env)
+            summary = [n for n in os.listdir(out_dir) if n.endswith("filtering_summary.txt")][0]
+            with open(os.path.join(out_dir, summary), "r") as f:
+                header, values = [l.split('\t') for l in f.read().splitlines()[:2]]
+            fields = dict(zip(header, values))
+            line = f"structural={structural} pairs={fields['SD_pairs']} removed={fields['Percent_Removed']}"
+            if structural:
+                line += f" bp_before={bp_before} bp_after={fields['Nonredundant_bp']}"
+            out.append(line)
+        return out
+
+    def triage():
+        out = []
+        for structural in (False, True):
+            per_contig, estimate, _, _ = sd_triage.triage_filter_contigs(
+                row, structural, None, 1.0, np.random.default_rng(0))
+            removed, _, pairs, before, after = estimate(per_contig.sum(axis=0))
+            line = f"structural={structural} pairs={int(pairs)} removed={removed:.2f}"
+            if structural:
+                line += f" bp_before={int(before)} bp_after={int(after)}"
+            out.append(line)
+        return out
+
+    legacy, t_legacy = timed(summaries)
+    ours, t_ours = timed(triage)
+    return legacy, ours, t_legacy, t_ours
+
+
+def case_annotate_error_tracks(paths, work, env):
+    # annotate_sd_tracks.py --error-tracks against a naive per-line loop: each
+    # line's bp1 / bp2 must belong to its own Chr1 / Chr2 domain
+    import annotate_sd_tracks
+
+    def naive():
+        tracks = [read_error_records(paths['small']), read_error_records(paths['struct'])]
+        return ["\t".join(map(str, (n1Line,) + d1 + d2 + tuple(naive_covered_bp(d, t) for t in tracks for d in (d1, d2))))
+                for n1Line, d1, d2 in read_sd_domains(paths['sd'])]
+
+    def inprocess():
+        row = {'GenomicSuperDup': paths['sd'], 'SmallScaleErrors': paths['small'], 'StructuralErrors': paths['struct']}
+        table, _ = annotate_sd_tracks.annotate(row, [], True)
+        columns = ['Line', 'Chr1', 'Start1', 'End1', 'Chr2', 'Start2', 'End2'] + \
+            [f'{name}_bp{d}' for name in annotate_sd_tracks.ERROR_TRACKS for d in (1, 2)]
+        return ["\t".join(map(str, values)) for values in table[columns].itertuples(index=False)]
+
+    legacy, t_legacy = timed(naive)
+    ours, t_ours = timed(inprocess)
+    return legacy, ours, t_legacy, t_ours
+
+
+def case_error_distance(paths, work, env):
+    # sd_error_distance.py against a naive per-line loop: each line's
+    # distance1 / distance2 must belong to its own Chr1 / Chr2 domain
+    import sd_error_distance as sed
+
+    def naive():
+        tracks = [read_error_records(paths['small']), read_error_records(paths['struct'])]
+        lines = []
+        for n1Line, d1, d2 in read_sd_domains(paths['sd']):
+            values = [naive_signed_distance(d, t) for d in (d1, d2) for t in tracks]
+            lines.append("\t".join(map(str, (n1Line,) + d1 + d2 + tuple('NA' if v is None else v for v in values))))
+        return lines
+
+    def inprocess():
+        d = sed.compute_distances({'GenomicSuperDup': paths['sd'], 'SmallScaleErrors': paths['small'],
+                                   'StructuralErrors': paths['struct']})
+        names = [str(c) for c in d['contig_names']]
+        lines = []
+        for i in range(len(d['line'])):
+            values = ['NA' if x == sed.MISSING else x for x in d['distance'][i].ravel().tolist()]
+            lines.append("\t".join(map(str, [d['line'][i], names[d['chr1'][i]], d['start1'][i], d['end1'][i],
+                                              names[d['chr2'][i]], d['start2'][i], d['end2'][i]] + values)))
+        return lines
+
+    legacy, t_legacy = timed(naive)
+    ours, t_ours = timed(inprocess)
+    return legacy, ours, t_legacy, t_ours
+
+
+CASES = {
+    'intersect_u': case_intersect_u,
+    'intersect_f0.5_F0.5': case_intersect_reciprocal,
+    'merge': case_merge,
+    'filter_sd_by_errors': make_filter_case('filter_sd_by_errors.py'),
+    'filter_sd_by_structural_errors': make_filter_case('filter_sd_by_structural_errors.py'),
+    'callset_match': case_callset_match,
+    'triage_full_read': case_triage_full_read,
+    'annotate_error_tracks': case_annotate_error_tracks,
+    'error_distance': case_error_distance,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff the in-process overlap engine against the bedtools path')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sds', type=int, default=2000, help='SD pairs per generated dataset')
+    parser.add_argument('--errors', type=int, default=800, help='Small-scale errors per generated dataset')
+    parser.add_argument('--cases', default=','.join(CASES), help='Comma-separated subset of: ' + ', '.join(CASES))
+    parser.add_argument('--bedtools', default=shutil.which('bedtools'),
+                        help='bedtools binary (default: from PATH; bedtools_standin.py if absent)')
+    parser.add_argument('--report', default='overlap_engine_check.tsv')
+    parser.add_argument('--work-dir', help='Keep generated inputs and diffs here (default: a temp dir, removed)')
+    args = parser.parse_args()
+
+    cases = args.cases.split(',')
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    root = args.work_dir or tempfile.mkdtemp(prefix='overlap_engine_')
+    os.makedirs(root, exist_ok=True)
+    make_shim_dir(os.path.join(root, "bin"), args.bedtools)
+    env = dict(os.environ, PATH=os.path.join(root, "bin") + os.pathsep + os.environ.get('PATH', ''), LC_ALL='C')
+    szReference = 'bedtools' if args.bedtools else 'bedtools_standin.py'
+    print(f"reference: {args.bedtools or szReference}")
+
+    nFailed = 0
+    with open(args.report, "w") as fReport:
+        fReport.write("\t".join(REPORT_COLUMNS) + "\n")
+        for nRound in range(args.rounds):
+            seed = args.seed + nRound
+            data_dir = os.path.join(root, f"round{nRound:03d}")
+            os.makedirs(data_dir, exist_ok=True)
+            paths = generate_dataset(np.random.default_rng(seed), data_dir, args.sds, args.errors)
+
+            for szCase in cases:
+                work = os.path.join(data_dir, szCase)
+                os.makedirs(work, exist_ok=True)
+                legacy, ours, t_legacy, t_ours = CASES[szCase](paths, work, env)
+
+                diff = list(difflib.unified_diff(legacy, ours, 'legacy', 'inprocess', lineterm=''))
+                nDiffering = sum(1 for d in diff[2:] if d[:1] in '+-')
+                if nDiffering:
+                    nFailed += 1
+                    szDiff = os.path.join(data_dir, f"{szCase}.diff")
+                    with open(szDiff, "w") as fDiff:
+                        fDiff.write("\n".join(diff) + "\n")
+                    print(f"round {nRound} seed {seed} {szCase}: {nDiffering} differing lines, see {szDiff}")
+                    print("\n".join(diff[:12]))
+
+                fReport.write(f"{nRound}\t{seed}\t{szCase}\t{szReference}\t{len(legacy)}\t{len(ours)}\t"
+                              f"{nDiffering}\t{t_legacy:.4f}\t{t_ours:.4f}\t{t_legacy / max(t_ours, 1e-9):.2f}\n")
+                print(f"round {nRound} {szCase}: {len(legacy)} lines, "
+                      f"{'OK' if not nDiffering else 'MISMATCH'}, {t_legacy / max(t_ours, 1e-9):.1f}x")
+
+    if not args.work_dir and not nFailed:
+        shutil.rmtree(root)
+    elif nFailed:
+        print(f"inputs and diffs kept under {root}")
+    print(f"{nFailed} mismatching case(s); report in {args.report}")
+    sys.exit(1 if nFailed else 0)
+
+
+if __name__ == "__main__":
+    main()
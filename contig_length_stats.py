@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+# Contig-length statistics per haplotype for the contig plots
+# (violin_pct_contigs_under1MB.R, scatter_contig_bp_filtering.R).
+#
+# Lengths come from the .fai index when one exists, otherwise from an mmap
+# scan of the FASTA.  With --filtered-dir, the SD table and Inspector error
+# BEDs are also rewritten without contigs shorter than --min-contig-length.
+#
+# python contig_length_stats.py --manifest cohort_manifest.tsv \
+#     --ancestry-map PI_ancestry_map.tsv --output PI_contig_length_info.tsv
+
+import argparse
+import gzip
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+
+OUTPUT_COLUMNS = ['Sample', 'Haplotype', 'Total_Contigs', 'Pct_Contigs_Under1MB', 'N50',
+                  'Superpopulation', 'total_bp', 'bp_after_filtering']
+
+
+def read_fai_lengths(path):
+    # {contig: length} from a samtools .fai index
+    lengths = {}
+    with open(path, "r") as fFai:
+        for line in fFai:
+            fields = line.split('\t')
+            if len(fields) >= 2:
+                lengths[fields[0]] = int(fields[1])
+    return lengths
+
+
+def scan_fasta_lengths(path):
+    # {contig: length} by scanning the FASTA; plain files are mmapped and
+    # each record's length is its byte span minus line breaks
+    lengths = {}
+    if path.endswith('.gz'):
+        szName = None
+        with gzip.open(path, "rb") as fFasta:
+            for line in fFasta:
+                if line.startswith(b'>'):
+                    szName = line[1:].split()[0].decode()
+                    lengths[szName] = 0
+                elif szName is not None:
+                    lengths[szName] += len(line.rstrip(b'\r\n'))
+        return lengths
+
+    with open(path, "rb") as fFasta:
+        if os.fstat(fFasta.fileno()).st_size == 0:
+            return lengths
+        with mmap.mmap(fFasta.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            nHeader = mm.find(b'>')
+            while nHeader != -1:
+                nSeqStart = mm.find(b'\n', nHeader)
+                if nSeqStart == -1:
+                    nSeqStart = len(mm)
+                szName = mm[nHeader + 1:nSeqStart].split()[0].decode()
+                nNext = mm.find(b'\n>', nSeqStart)
+                nSeqEnd = len(mm) if nNext == -1 else nNext
+                block = mm[nSeqStart:nSeqEnd]
+                lengths[szName] = len(block) - block.count(b'\n') - block.count(b'\r')
+                nHeader = -1 if nNext == -1 else nNext + 1
+    return lengths
+
+
+def contig_lengths_for(row):
+    # Prefer an explicit Fai column, then <Fasta>.fai, then scan the FASTA
+    fai = row.get('Fai')
+    fasta = row.get('Fasta')
+    if fai and os.path.exists(fai):
+        return read_fai_lengths(fai)
+    if fasta and os.path.exists(fasta + '.fai'):
+        return read_fai_lengths(fasta + '.fai')
+    if fasta and os.path.exists(fasta):
+        return scan_fasta_lengths(fasta)
+    raise FileNotFoundError(f"no .fai or FASTA for {row['Sample']} {row['Haplotype']}")
+
+
+def n50(lengths):
+    if len(lengths) == 0:
+        return 0
+    ordered = np.sort(lengths)[::-1]
+    cum = np.cumsum(ordered)
+    return int(ordered[np.searchsorted(cum, cum[-1] / 2)])
+
+
+def length_statistics(lengths, min_length):
+    aLengths = np.array(list(lengths.values()), dtype=np.int64)
+    nTotal = len(aLengths)
+    return {'Total_Contigs': nTotal,
+            'Pct_Contigs_Under1MB': round(100 * (aLengths < 1_000_000).sum() / nTotal, 2) if nTotal else 0,
+            'N50': n50(aLengths),
+            'total_bp': int(aLengths.sum()),
+            'bp_after_filtering': int(aLengths[aLengths >= min_length].sum())}
+
+
+def filter_by_contig(szInput, szOutput, keep_contigs, contig_columns):
+    # Copy lines whose contig columns are all in keep_contigs; returns
+    # (lines kept, lines dropped).  Comment lines are kept.
+    nKept = nDropped = 0
+    with open(szInput, "r") as fInput, open(szOutput, "w") as fOutput:
+        for szLine in fInput:
+            if szLine.startswith('#'):
+                fOutput.write(szLine)
+                continue
+            aWords = szLine.split('\t')
+            if all(aWords[n] in keep_contigs for n in contig_columns if n < len(aWords)):
+                fOutput.write(szLine)
+                nKept += 1
+            else:
+                nDropped += 1
+    return nKept, nDropped
+
+
+def process_row(row, min_length, filtered_dir):
+    lengths = contig_lengths_for(row)
+    stats = length_statistics(lengths, min_length)
+
+    if filtered_dir:
+        keep = {name for name, length in lengths.items() if length >= min_length}
+        szPrefix = os.path.join(filtered_dir, f"{row['Sample']}.{row['Haplotype']}")
+        for szColumn, szSuffix, aContigColumns in (
+                ('GenomicSuperDup', 'GenomicSuperDup.tab', (0, 6)),
+                ('SmallScaleErrors', 'small_scale_error.bed', (0,)),
+                ('StructuralErrors', 'structural_error.bed', (0,))):
+            if row.get(szColumn):
+                _, nDropped = filter_by_contig(row[szColumn], f"{szPrefix}.min{min_length}.{szSuffix}",
+                                               keep, aContigColumns)
+                stats[f'{szColumn}_lines_dropped'] = nDropped
+    return stats
+
+
+def read_ancestry_map(path):
+    # Headerless Sample<TAB>population map (PI_ancestry_map.tsv)
+    ancestry = {}
+    with open(path, "r") as fMap:
+        for line in fMap:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2:
+                ancestry[fields[0]] = fields[1]
+    return ancestry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Contig count, %<1 Mb, N50 and bp per haplotype')
+    parser.add_argument('--manifest', required=True,
+                        help='Cohort manifest TSV with Fai and/or Fasta columns')
+    parser.add_argument('--output', required=True, help='Output *_contig_length_info.tsv')
+    parser.add_argument('--ancestry-map', help='Sample -> population map for the Superpopulation column')
+    parser.add_argument('--min-contig-length', type=int, default=1_000_000,
+                        help='Contigs shorter than this are excluded from bp_after_filtering')
+    parser.add_argument('--filtered-dir',
+                        help='Also write SD and error tables without contigs below --min-contig-length here')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    rows = sd_index.read_manifest(args.manifest)
+    ancestry = read_ancestry_map(args.ancestry_map) if args.ancestry_map else {}
+    if args.filtered_dir:
+        os.makedirs(args.filtered_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = [(row, pool.submit(process_row, row, args.min_contig_length, args.filtered_dir))
+                   for row in rows]
+        with open(args.output, "w") as fOut:
+            fOut.write("\t".join(OUTPUT_COLUMNS) + "\n")
+            for row, future in futures:
+                try:
+                    stats = future.result()
+                except (OSError, ValueError, IndexError) as e:
+                    print(f"Error processing {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                    continue
+                stats['Sample'] = row['Sample']
+                stats['Haplotype'] = row['Haplotype']
+                stats['Superpopulation'] = ancestry.get(row['Sample'], 'NA')
+                fOut.write("\t".join(str(stats[c]) for c in OUTPUT_COLUMNS) + "\n")
+                szDropped = ", ".join(f"{k[:-len('_lines_dropped')]} -{v}" for k, v in stats.items()
+                                      if k.endswith('_lines_dropped'))
+                print(f"{row['Sample']} {row['Haplotype']}: {stats['Total_Contigs']} contigs, N50 {stats['N50']}"
+                      + (f" (lines dropped: {szDropped})" if szDropped else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,57 +5,88 @@
 #module load python3
 
 import argparse
+import contextlib
 import os
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import re
-
-parser = argparse.ArgumentParser()
-parser.add_argument("--szGenomicSuperDup", required=True)
-parser.add_argument("--szStructuralErrors", required=True)
-parser.add_argument("--szSampleName", required=True,
-                    help="Sample name (e.g., UPIS220008)")
-parser.add_argument("--szHaplotype", required=True,
-                    help="Haplotype (h1 or h2)")
-parser.add_argument("--szOutputDir", default="/projects/standard/hsiehph/shared/DIR_homes/hudso501/analysisPI/data/filter_by_structural_errors")
-args = parser.parse_args()
-
-# Create output directory if it doesn't exist
-os.makedirs(args.szOutputDir, exist_ok=True)
-
-# Output file names
-szFilteredSDs = os.path.join(args.szOutputDir, 
-                            f"{args.szSampleName}.{args.szHaplotype}.filtered_by_structural_errors_SDs.bed")
-szErrorOverlapSDs = os.path.join(args.szOutputDir, 
-                                f"{args.szSampleName}.{args.szHaplotype}.structural_error_overlap_SDs.bed")
-
-# Set up temporary directory
-if 'TMPDIR' in os.environ:
-    TMPDIR = os.environ['TMPDIR']
-else:
-    TMPDIR = "/tmp/" + os.environ['USER'] + "/" + str(os.getpid())
-    szCommand = "mkdir -p " + TMPDIR
-    subprocess.call(szCommand, shell=True)
 
-def calculate_nonredundant_bp(filtered_sd_file, temp_dir):
-    #Calculate non-redundant base pairs covered by filtered SDs
+import sd_contig_tables
+import sd_error_join
+import sd_index
+import sd_selection
+import sd_shared_index
+import sd_strata
+from interval_set import IntervalSet
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--szGenomicSuperDup", required=True, nargs="+",
+                        help="One or more SD callsets of the same assembly (e.g. WGAC, SEDEF, masked)")
+    parser.add_argument("--szCallsetName", nargs="+",
+                        help="Name per --szGenomicSuperDup, added to its output names (required for several)")
+    parser.add_argument("--nWorkers", type=int, default=0,
+                        help="Callsets filtered concurrently (0 = one per callset, up to the CPU count)")
+    parser.add_argument("--szStructuralErrors", required=True)
+    parser.add_argument("--szSampleName", required=True,
+                        help="Sample name (e.g., UPIS220008)")
+    parser.add_argument("--szHaplotype", required=True,
+                        help="Haplotype (h1 or h2)")
+    parser.add_argument("--szEngine", choices=["bedtools", "inprocess"], default="bedtools",
+                        help="Overlap engine: bedtools on temp files, or sd_index arrays in memory")
+    parser.add_argument("--szOutputFormat", choices=["bed", "selection"], default="bed",
+                        help="bed: copy the kept and removed lines; selection: write .sel.npz line bitmaps "
+                             "over the GenomicSuperDup.tab instead (read them with sd_selection.py)")
+    parser.add_argument("--bSharedMemory", action="store_true",
+                        help="inprocess: attach the parsed SD table and error index from shared memory "
+                             "(sd_shared_index.py), built once per node for all workers")
+    parser.add_argument("--bContigTables", action="store_true",
+                        help="inprocess: also write per-contig and contig-pair breakdowns "
+                             "(sd_contig_tables.py) from the parsed arrays")
+    parser.add_argument("--bErrorJoin", action="store_true",
+                        help="inprocess: also write which error records overlap which SD pairs, with overlap bp, "
+                             "as memory-mappable CSR arrays (sd_error_join.py)")
+    parser.add_argument("--bStrataTables", action="store_true",
+                        help="Also write SD pairs and nonredundant bp per identity x length bin, "
+                             "before and after filtering (sd_strata.py)")
+    parser.add_argument("--szIdentityBins", default=sd_strata.DEFAULT_IDENTITY_BINS,
+                        help="Comma-separated fracMatch bin edges for --bStrataTables")
+    parser.add_argument("--szLengthBins", default=sd_strata.DEFAULT_LENGTH_BINS,
+                        help="Comma-separated alignment length bin edges (bp) for --bStrataTables")
+    parser.add_argument("--szOutputDir", default="/projects/standard/hsiehph/shared/DIR_homes/hudso501/analysisPI/data/filter_by_structural_errors")
+    args = parser.parse_args(argv)
+    if args.bSharedMemory and args.szEngine != "inprocess":
+        parser.error("--bSharedMemory needs --szEngine inprocess")
+    if args.bContigTables and args.szEngine != "inprocess":
+        parser.error("--bContigTables needs --szEngine inprocess")
+    if args.bErrorJoin and args.szEngine != "inprocess":
+        parser.error("--bErrorJoin needs --szEngine inprocess")
+    try:
+        args.aIdentityEdges = sd_strata.parse_edges(args.szIdentityBins)
+        args.aLengthEdges = sd_strata.parse_edges(args.szLengthBins)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.szCallsetName is None:
+        if len(args.szGenomicSuperDup) > 1:
+            parser.error("--szCallsetName is required with several --szGenomicSuperDup")
+        args.szCallsetName = [None]
+    elif len(args.szCallsetName) != len(args.szGenomicSuperDup) or len(set(args.szCallsetName)) != len(args.szCallsetName):
+        parser.error("--szCallsetName needs one distinct name per --szGenomicSuperDup")
+    return args
+
+
+def calculate_nonredundant_bp(sd, aKeepPairs, temp_dir):
+    #Calculate non-redundant base pairs covered by the retained SD pairs
     
-    # Create temporary bed file with all SD regions
+    # Create temporary bed file with both domains of each retained pair
+    # (one listing per pair; the mirrored line covers the same sequence)
     temp_bed = os.path.join(temp_dir, "temp_all_regions.bed")
+    aContigNames = sd.contigs.names
     
-    with open(filtered_sd_file, "r") as fSD, open(temp_bed, "w") as fBed:
-        for line in fSD:
-            if line.startswith('#'):
-                continue
-            
-            fields = line.strip().split('\t')
-            if len(fields) >= 9:
-                # Extract both domains (chr, start, end)
-                chr1, start1, end1 = fields[0], fields[1], fields[2]
-                chr2, start2, end2 = fields[6], fields[7], fields[8]
-                
-                fBed.write(f"{chr1}\t{start1}\t{end1}\n")
-                fBed.write(f"{chr2}\t{start2}\t{end2}\n")
+    with open(temp_bed, "w") as fBed:
+        for nRow in sd.pair_row[aKeepPairs]:
+            fBed.write(f"{aContigNames[sd.chr1[nRow]]}\t{sd.start1[nRow]}\t{sd.end1[nRow]}\n")
+            fBed.write(f"{aContigNames[sd.chr2[nRow]]}\t{sd.start2[nRow]}\t{sd.end2[nRow]}\n")
     
     # Sort the bed file
     temp_bed_sorted = os.path.join(temp_dir, "temp_all_regions_sorted.bed")
@@ -80,163 +111,256 @@ def calculate_nonredundant_bp(filtered_sd_file, temp_dir):
     return total_bp
 
 
-# Process structural errors only
-szStructuralErrorsSorted = TMPDIR + "/structural_errors_sorted.bed"
-
-# Extract just the first 3 columns (chr, start, end) from structural error file
-# Skip header lines that start with '#'
-szStructuralErrorsExtracted = TMPDIR + "/structural_errors_extracted.bed"
-with open(szStructuralErrorsExtracted, "w") as fExtracted:
-    # Process structural errors
-    with open(args.szStructuralErrors, "r") as fStruct:
-        for line in fStruct:
-            if not line.startswith('#'):
-                fields = line.strip().split('\t')
-                if len(fields) >= 3:
-                    # Handle HaplotypeSwitch format (positions with semicolons)
-                    start_pos = fields[1].split(';')[0]
-                    end_pos = fields[2].split(';')[0]
-                    fExtracted.write(f"{fields[0]}\t{start_pos}\t{end_pos}\n")
-
-# Sort the structural error file
-szCommand = f"sort -k1,1 -k2,2n {szStructuralErrorsExtracted} > {szStructuralErrorsSorted}"
-subprocess.call(szCommand, shell=True)
-
-# process the segmental duplications file
-# Split into left and right domains
-szSDLeftDomain = TMPDIR + "/sd_left_domain.bed"
-szSDRightDomain = TMPDIR + "/sd_right_domain.bed"
-
-with open(args.szGenomicSuperDup, "r") as fSD, \
-     open(szSDLeftDomain, "w") as fLeftDomain, \
-     open(szSDRightDomain, "w") as fRightDomain:
-    
-    n1Line = 0
-    while True:
-        szLine = fSD.readline()
-        if szLine == "":
-            nNumberOfLinesInSD = n1Line
-            break
-        
-        n1Line += 1
-        
-        if szLine.startswith('#'):
-            continue
-        
-        aWords = re.split(r'\t|\n', szLine)
-        
-        # GenomicSuperDup.tab format:
-        # chr1(0) start1(1) end1(2) strand1(3) fracMatch(4) strand2(5) 
-        # chr2(6) start2(7) end2(8) ...
-        
-        szChr1 = aWords[0]
-        szChr2 = aWords[6]
-        nStart1 = int(aWords[1])
-        nEnd1 = int(aWords[2])
-        nStart2 = int(aWords[7])
-        nEnd2 = int(aWords[8])
-        
-        # Use line number as name for tracking
-        szName = str(n1Line)
-        
-        # Ensure consistent ordering
-        if (szChr1 > szChr2) or (szChr1 == szChr2 and nStart1 > nStart2):
-            # Swap
-            (szChr1, nStart1, nEnd1, szChr2, nStart2, nEnd2) = \
-                (szChr2, nStart2, nEnd2, szChr1, nStart1, nEnd1)
-        
-        # Write left domain (smaller coordinate)
-        fLeftDomain.write(f"{szChr1}\t{nStart1}\t{nEnd1}\t{szName}\t{n1Line}\n")
-        # Write right domain (larger coordinate)
-        fRightDomain.write(f"{szChr2}\t{nStart2}\t{nEnd2}\t{szName}\t{n1Line}\n")
-
-# Intersect left domains with structural errors
-szLeftOverlaps = TMPDIR + "/left_domain_structural_error_overlaps.txt"
-szCommand = f"module load bedtools/2.29.2 && bedtools intersect -u -a {szSDLeftDomain} -b {szStructuralErrorsSorted} > {szLeftOverlaps}"
-subprocess.call(szCommand, shell=True)
-
-# Intersect right domains with structural errors
-szRightOverlaps = TMPDIR + "/right_domain_structural_error_overlaps.txt"
-szCommand = f"module load bedtools/2.29.2 && bedtools intersect -u -a {szSDRightDomain} -b {szStructuralErrorsSorted} > {szRightOverlaps}"
-subprocess.call(szCommand, shell=True)
-
-# Collect line numbers of SDs that overlap with structural errors
-aSDsWithErrors = np.zeros(nNumberOfLinesInSD + 1, dtype=bool)
-
-# Process left domain overlaps
-with open(szLeftOverlaps, "r") as fLeft:
-    for line in fLeft:
-        if line.strip():
-            fields = line.strip().split('\t')
-            if len(fields) >= 5:
-                lineNumber = int(fields[4])
-                aSDsWithErrors[lineNumber] = True
-
-# Process right domain overlaps
-with open(szRightOverlaps, "r") as fRight:
-    for line in fRight:
-        if line.strip():
-            fields = line.strip().split('\t')
-            if len(fields) >= 5:
-                lineNumber = int(fields[4])
-                aSDsWithErrors[lineNumber] = True
-
-# Write filtered output
-nTotalSDs = 0
-nFilteredSDs = 0
-nRemovedSDs = 0
-
-with open(args.szGenomicSuperDup, "r") as fSD, \
-     open(szFilteredSDs, "w") as fFiltered, \
-     open(szErrorOverlapSDs, "w") as fErrorOverlap:
+def build_error_index(args, TMPDIR):
+    # The structural error side, built once per invocation and shared by
+    # every callset: (contig codes, interval index, error table) for the
+    # inprocess engine, or (None, the extracted and sorted error BED, None)
+    # for bedtools
+
+    if args.bSharedMemory:
+        # each callset attaches the shared bundles itself
+        return None, None, None
+
+    if args.szEngine == "inprocess":
+        contigs = sd_index.ContigCodes()
+        error_table = sd_index.load_inspector_errors(None, args.szStructuralErrors, contigs)
+        return contigs, sd_index.IntervalIndex(error_table.contig, error_table.start, error_table.end), error_table
+
+    # Process structural errors only
+    szStructuralErrorsSorted = TMPDIR + "/structural_errors_sorted.bed"
+
+    # Extract just the first 3 columns (chr, start, end) from structural error file
+    # Skip header lines that start with '#'
+    szStructuralErrorsExtracted = TMPDIR + "/structural_errors_extracted.bed"
+    with open(szStructuralErrorsExtracted, "w") as fExtracted:
+        # Process structural errors
+        with open(args.szStructuralErrors, "r") as fStruct:
+            for line in fStruct:
+                if not line.startswith('#'):
+                    fields = line.strip().split('\t')
+                    if len(fields) >= 3:
+                        # Handle HaplotypeSwitch format (positions with semicolons)
+                        start_pos = fields[1].split(';')[0]
+                        end_pos = fields[2].split(';')[0]
+                        fExtracted.write(f"{fields[0]}\t{start_pos}\t{end_pos}\n")
+
+    # Sort the structural error file
+    szCommand = f"sort -k1,1 -k2,2n {szStructuralErrorsExtracted} > {szStructuralErrorsSorted}"
+    subprocess.call(szCommand, shell=True)
+    return None, szStructuralErrorsSorted, None
+
+
+def filter_callset(args, szGenomicSuperDup, szCallsetName, contigs, errors, error_table, TMPDIR):
+    # Filter one SD callset against the shared structural error index;
+    # returns its summary row
+
+    if args.bSharedMemory:
+        # SD table and error index mapped from the node's shared copy
+        with sd_shared_index.shared_inputs(szGenomicSuperDup, None, args.szStructuralErrors) as shared:
+            return filter_loaded(args, shared.sd, szGenomicSuperDup, szCallsetName, shared.error_index,
+                                 shared.errors, TMPDIR)
+
+    # process the segmental duplications file
+    # Each SD pair is listed twice in GenomicSuperDup.tab (once from each side);
+    # load it into a canonical pair table
+    sd = sd_index.load_genomic_superdup(szGenomicSuperDup, contigs)
+    return filter_loaded(args, sd, szGenomicSuperDup, szCallsetName, errors, error_table, TMPDIR)
+
+
+def filter_loaded(args, sd, szGenomicSuperDup, szCallsetName, errors, error_table, TMPDIR):
+    # The filter proper, on a loaded SD table (error_table: the parsed
+    # structural errors, inprocess only)
+
+    # Output file names (the callset name, if any, follows the haplotype)
+    szPrefix = f"{args.szSampleName}.{args.szHaplotype}"
+    if szCallsetName:
+        szPrefix += f".{szCallsetName}"
+    szFilteredSDs = os.path.join(args.szOutputDir, f"{szPrefix}.filtered_by_structural_errors_SDs.bed")
+    szErrorOverlapSDs = os.path.join(args.szOutputDir, f"{szPrefix}.structural_error_overlap_SDs.bed")
+    os.makedirs(TMPDIR, exist_ok=True)
+
+    nNumberOfLinesInSD = sd.n_lines
+    aContigNames = sd.contigs.names
+
+    if args.szEngine == "inprocess":
+        # same decision as the bedtools path below, from sorted arrays and
+        # without temp files (checked against it by check_overlap_engine.py)
+        aPairsWithErrors = sd_index.pairs_overlap_any(sd, errors)
+    else:
+        szStructuralErrorsSorted = errors
+
+        # Write each pair's left and right domains once, named by pair id, so
+        # the intersects below do half the work.
+        szSDLeftDomain = TMPDIR + "/sd_left_domain.bed"
+        szSDRightDomain = TMPDIR + "/sd_right_domain.bed"
+
+        with open(szSDLeftDomain, "w") as fLeftDomain, \
+             open(szSDRightDomain, "w") as fRightDomain:
+            for nPair, nRow in enumerate(sd.pair_row):
+                # Write left domain (smaller coordinate)
+                fLeftDomain.write(f"{aContigNames[sd.chr1[nRow]]}\t{sd.start1[nRow]}\t{sd.end1[nRow]}\t{nPair}\t{sd.line[nRow]}\n")
+                # Write right domain (larger coordinate)
+                fRightDomain.write(f"{aContigNames[sd.chr2[nRow]]}\t{sd.start2[nRow]}\t{sd.end2[nRow]}\t{nPair}\t{sd.line[nRow]}\n")
+
+        # Intersect left domains with structural errors
+        szLeftOverlaps = TMPDIR + "/left_domain_structural_error_overlaps.txt"
+        szCommand = f"module load bedtools/2.29.2 && bedtools intersect -u -a {szSDLeftDomain} -b {szStructuralErrorsSorted} > {szLeftOverlaps}"
+        subprocess.call(szCommand, shell=True)
+
+        # Intersect right domains with structural errors
+        szRightOverlaps = TMPDIR + "/right_domain_structural_error_overlaps.txt"
+        szCommand = f"module load bedtools/2.29.2 && bedtools intersect -u -a {szSDRightDomain} -b {szStructuralErrorsSorted} > {szRightOverlaps}"
+        subprocess.call(szCommand, shell=True)
+
+        # Collect the SD pairs that overlap with structural errors
+        aPairsWithErrors = np.zeros(sd.n_pairs, dtype=bool)
+
+        for szOverlaps in (szLeftOverlaps, szRightOverlaps):
+            with open(szOverlaps, "r") as fOverlaps:
+                for line in fOverlaps:
+                    if line.strip():
+                        fields = line.strip().split('\t')
+                        if len(fields) >= 5:
+                            aPairsWithErrors[int(fields[3])] = True
+
+    # Expand back to file lines; not using [0] since the line numbers are 1-based
+    aSDsWithErrors = np.zeros(nNumberOfLinesInSD + 1, dtype=bool)
+    aSDsWithErrors[sd.line] = aPairsWithErrors[sd.pair]
+
+    if args.szOutputFormat == "selection":
+        # Bitmaps over the GenomicSuperDup.tab lines plus one byte-offset index
+        # of it, instead of two more copies of the table
+        szLineIndex = os.path.join(args.szOutputDir,
+                                   f"{szPrefix}.GenomicSuperDup{sd_selection.LINE_INDEX_SUFFIX}")
+        nRemovedSDs, nFilteredSDs = sd_selection.write_split(
+            szGenomicSuperDup, szLineIndex, aSDsWithErrors,
+            sd_selection.selection_path(szErrorOverlapSDs), sd_selection.selection_path(szFilteredSDs), True)
+    else:
+        # Write filtered output
+        nTotalSDs = 0
+        nFilteredSDs = 0
+        nRemovedSDs = 0
+
+        with open(szGenomicSuperDup, "r") as fSD, \
+             open(szFilteredSDs, "w") as fFiltered, \
+             open(szErrorOverlapSDs, "w") as fErrorOverlap:
     
-    n1Line = 0
-    while True:
-        szLine = fSD.readline()
-        if szLine == "":
-            break
+            n1Line = 0
+            while True:
+                szLine = fSD.readline()
+                if szLine == "":
+                    break
         
-        n1Line += 1
+                n1Line += 1
         
-        if szLine.startswith('#'):
-            continue
+                if szLine.startswith('#'):
+                    continue
         
-        nTotalSDs += 1
+                nTotalSDs += 1
         
-        if not aSDsWithErrors[n1Line]:
-            # This SD does not overlap with structural errors - keep it
-            fFiltered.write(szLine)
-            nFilteredSDs += 1
-        else:
-            # This SD overlaps with structural errors - write to separate file
-            fErrorOverlap.write(szLine)
-            nRemovedSDs += 1
-
-# Calculate non-redundant base pairs for filtered SDs
-nonredundant_bp = calculate_nonredundant_bp(szFilteredSDs, TMPDIR)
-
-# Calculate SD pairs (divide by 2 since each pair appears twice)
-nTotalPairs = nTotalSDs // 2
-nFilteredPairs = nFilteredSDs // 2
-nRemovedPairs = nRemovedSDs // 2
-
-# Print summary statistics
-print("\n=== STRUCTURAL ERROR FILTERING SUMMARY ===")
-print(f"Sample: {args.szSampleName} - {args.szHaplotype}")
-print(f"Total SD pairs in input: {nTotalPairs}")
-print(f"SD pairs overlapping with structural errors: {nRemovedPairs}")
-print(f"SD pairs retained after filtering: {nFilteredPairs}")
-print(f"Percentage removed: {(nRemovedPairs/nTotalPairs*100):.2f}%")
-print(f"Nonredundant bp after filtering: {nonredundant_bp}")
-
-# Create a summary file
-szSummaryFile = os.path.join(args.szOutputDir, 
-                            f"{args.szSampleName}.{args.szHaplotype}.structural_filtering_summary.txt")
-with open(szSummaryFile, "w") as fSummary:
-    fSummary.write(f"Sample\tHaplotype\tSD_pairs\tStructural_Error_Overlap_pairs\tFiltered_pairs\tPercent_Removed\tNonredundant_bp\n")
-    fSummary.write(f"{args.szSampleName}\t{args.szHaplotype}\t{nTotalPairs}\t{nRemovedPairs}\t{nFilteredPairs}\t{(nRemovedPairs/nTotalPairs*100):.2f}\t{nonredundant_bp}\n")
-
-# Clean up temporary files
-if 'TMPDIR' not in os.environ:
-    szCommand = f"rm -rf {TMPDIR}"
-    subprocess.call(szCommand, shell=True)
+                if not aSDsWithErrors[n1Line]:
+                    # This SD does not overlap with structural errors - keep it
+                    fFiltered.write(szLine)
+                    nFilteredSDs += 1
+                else:
+                    # This SD overlaps with structural errors - write to separate file
+                    fErrorOverlap.write(szLine)
+                    nRemovedSDs += 1
+
+    # Calculate non-redundant base pairs for filtered SDs
+    if args.szEngine == "inprocess":
+        nonredundant_bp = IntervalSet.from_sd(sd, sd.pair_row[~aPairsWithErrors]).length
+    else:
+        nonredundant_bp = calculate_nonredundant_bp(sd, ~aPairsWithErrors, TMPDIR)
+
+    # Exact SD pair counts from the canonical pair table
+    nTotalPairs = sd.n_pairs
+    nRemovedPairs = int(aPairsWithErrors.sum())
+    nFilteredPairs = nTotalPairs - nRemovedPairs
+
+    # Print summary statistics
+    print("\n=== STRUCTURAL ERROR FILTERING SUMMARY ===")
+    print(f"Sample: {args.szSampleName} - {args.szHaplotype}" + (f" ({szCallsetName})" if szCallsetName else ""))
+    print(f"Total SD pairs in input: {nTotalPairs}")
+    print(f"SD pairs overlapping with structural errors: {nRemovedPairs}")
+    print(f"SD pairs retained after filtering: {nFilteredPairs}")
+    print(f"Percentage removed: {(nRemovedPairs/nTotalPairs*100):.2f}%")
+    print(f"Nonredundant bp after filtering: {nonredundant_bp}")
+    if args.bContigTables:
+        # per-contig breakdowns from the arrays already in memory
+        szContigSummary, szContigPairs = sd_contig_tables.write_tables(
+            os.path.join(args.szOutputDir, szPrefix), sd, error_table, aPairsWithErrors)
+        print(f"Per-contig tables: {szContigSummary}, {szContigPairs}")
+    if args.bStrataTables:
+        szStrata = sd_strata.write_strata(os.path.join(args.szOutputDir, szPrefix), sd, aPairsWithErrors,
+                                          args.aIdentityEdges, args.aLengthEdges)
+        print(f"Identity/length strata: {szStrata}")
+    if args.bErrorJoin:
+        szJoin = os.path.join(args.szOutputDir, szPrefix + sd_error_join.JOIN_SUFFIX)
+        nEntries = sd_error_join.write_join(szJoin, sd, error_table)
+        print(f"SD/error join: {szJoin} ({nEntries} overlaps)")
+
+    # Create a summary file
+    szSummaryFile = os.path.join(args.szOutputDir, f"{szPrefix}.structural_filtering_summary.txt")
+    summary = {'Sample': args.szSampleName, 'Haplotype': args.szHaplotype}
+    if szCallsetName:
+        summary['Callset'] = szCallsetName
+    summary.update({'SD_pairs': nTotalPairs, 'Structural_Error_Overlap_pairs': nRemovedPairs,
+                    'Filtered_pairs': nFilteredPairs,
+                    'Percent_Removed': f"{(nRemovedPairs/nTotalPairs*100):.2f}",
+                    'Nonredundant_bp': nonredundant_bp})
+    with open(szSummaryFile, "w") as fSummary:
+        fSummary.write("\t".join(summary) + "\n")
+        fSummary.write("\t".join(str(v) for v in summary.values()) + "\n")
+
+    return summary
+
+
+def filter_sds(args):
+    # Filter each of one haplotype's SD callsets against its structural
+    # errors.  The error side is built once and shared; several callsets are
+    # filtered concurrently, each with its own outputs and summary.  Returns
+    # one summary row per callset.
+
+    # Create output directory if it doesn't exist
+    os.makedirs(args.szOutputDir, exist_ok=True)
+
+    # Set up temporary directory
+    if 'TMPDIR' in os.environ:
+        TMPDIR = os.environ['TMPDIR']
+    else:
+        TMPDIR = "/tmp/" + os.environ['USER'] + "/" + str(os.getpid())
+        szCommand = "mkdir -p " + TMPDIR
+        subprocess.call(szCommand, shell=True)
+
+    contigs, errors, error_table = build_error_index(args, TMPDIR)
+    aCallsets = list(zip(args.szGenomicSuperDup, args.szCallsetName))
+
+    if len(aCallsets) == 1:
+        aSummaries = [filter_callset(args, *aCallsets[0], contigs, errors, error_table, TMPDIR)]
+    else:
+        # bedtools temp files go to one subdirectory per callset
+        nWorkers = args.nWorkers or min(len(aCallsets), os.cpu_count())
+        with contextlib.ExitStack() as stack, ProcessPoolExecutor(max_workers=nWorkers) as pool:
+            if args.bSharedMemory:
+                # hold the errors bundle so the workers all attach to one copy
+                stack.enter_context(sd_shared_index.shared_inputs(None, None, args.szStructuralErrors))
+            futures = [pool.submit(filter_callset, args, szGenomicSuperDup, szCallsetName, contigs, errors,
+                                   error_table, os.path.join(TMPDIR, szCallsetName))
+                       for szGenomicSuperDup, szCallsetName in aCallsets]
+            aSummaries = [future.result() for future in futures]
+
+    # Clean up temporary files
+    if 'TMPDIR' not in os.environ:
+        szCommand = f"rm -rf {TMPDIR}"
+        subprocess.call(szCommand, shell=True)
+
+    return aSummaries
+
+
+def main(argv=None):
+    filter_sds(parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
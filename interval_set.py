@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# Array-backed, contig-aware interval sets with vectorized set algebra.
+#
+# An IntervalSet is a sorted array of disjoint, non-touching half-open blocks
+# on the sd_index combined axis (contig code * CONTIG_STRIDE + position),
+# with the ContigCodes that name the contigs.  Every operation is a sort and
+# a cumulative sum over block boundaries; nothing is written to disk.
+#
+#   import interval_set as iset
+#   contigs = sd_index.ContigCodes()
+#   sd = sd_index.load_genomic_superdup(path, contigs)
+#   errors = sd_index.load_inspector_errors(small, struct, contigs)
+#   sd_bp_error_free = (iset.IntervalSet.from_sd(sd) - iset.IntervalSet.from_errors(errors)).length
+#
+# Book-ended intervals merge, as with `bedtools merge`, and zero-length
+# intervals cover nothing.  Sets built on different ContigCodes are matched
+# by contig name.
+
+import numpy as np
+
+import sd_index
+
+
+class IntervalSet:
+    """Disjoint sorted blocks on the combined contig axis"""
+
+    def __init__(self, contigs, axis_start, axis_end, normalized=False):
+        self.contigs = contigs
+        if not normalized:
+            axis_start = np.asarray(axis_start, dtype=np.int64)
+            axis_end = np.asarray(axis_end, dtype=np.int64)
+            keep = axis_end > axis_start
+            axis_start, axis_end = sd_index.merge_axis(axis_start[keep], axis_end[keep])
+        self.start = axis_start
+        self.end = axis_end
+
+    # --- construction ----------------------------------------------------
+
+    @classmethod
+    def from_arrays(cls, contigs, contig, start, end):
+        # contig codes of `contigs` with start/end coordinates
+        return cls(contigs, *sd_index.to_axis(contig, start, end, bedtools_zero_length=False))
+
+    @classmethod
+    def from_named(cls, contig_names, start, end, contigs=None):
+        # contig names (any array-like of str) with start/end coordinates
+        if contigs is None:
+            contigs = sd_index.ContigCodes()
+        names, inverse = np.unique(np.asarray(contig_names, dtype=str), return_inverse=True)
+        codes = np.array([contigs.code(n) for n in names], dtype=np.int64)
+        return cls.from_arrays(contigs, codes[inverse] if len(names) else inverse, start, end)
+
+    @classmethod
+    def from_bed(cls, path, contigs=None):
+        if contigs is None:
+            contigs = sd_index.ContigCodes()
+        return cls.from_arrays(contigs, *sd_index.load_bed_intervals(path, contigs))
+
+    @classmethod
+    def from_sd(cls, sd, rows=None):
+        # Both domains of the given SD rows (default: one row per canonical pair)
+        return cls(sd.contigs, *sd_index.domain_axis(sd, rows))
+
+    @classmethod
+    def from_errors(cls, errors, mask=None):
+        if mask is not None:
+            errors = errors.subset(mask)
+        return cls.from_arrays(errors.contigs, errors.contig, errors.start, errors.end)
+
+    @classmethod
+    def from_lengths(cls, contigs, lengths):
+        # Whole contigs, lengths indexed by contig code (e.g. sd_index.read_fai)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        return cls.from_arrays(contigs, np.arange(len(lengths)), np.zeros(len(lengths), dtype=np.int64), lengths)
+
+    # --- inspection ------------------------------------------------------
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def length(self):
+        # Total bp
+        return int((self.end - self.start).sum())
+
+    def contig_codes(self):
+        return self.start // sd_index.CONTIG_STRIDE
+
+    def length_by_contig(self):
+        # bp per contig code, as an array over self.contigs
+        return np.bincount(self.contig_codes(), weights=self.end - self.start,
+                           minlength=len(self.contigs)).astype(np.int64)
+
+    def blocks(self):
+        # (contig codes, start, end) in contig coordinates
+        codes = self.contig_codes()
+        offset = codes * sd_index.CONTIG_STRIDE
+        return codes, self.start - offset, self.end - offset
+
+    def write_bed(self, path):
+        names = self.contigs.names
+        with open(path, "w") as fBed:
+            for code, start, end in zip(*(a.tolist() for a in self.blocks())):
+                fBed.write(f"{names[code]}\t{start}\t{end}\n")
+
+    # --- algebra ---------------------------------------------------------
+
+    def _aligned(self, other):
+        # other's blocks re-coded onto self.contigs
+        if other.contigs is self.contigs or len(other) == 0:
+            return other.start, other.end
+        codes, start, end = other.blocks()
+        remap = np.array([self.contigs.code(n) for n in other.contigs.names], dtype=np.int64)
+        offset = remap[codes] * sd_index.CONTIG_STRIDE
+        order = np.argsort(offset + start, kind='stable')
+        return (offset + start)[order], (offset + end)[order]
+
+    def _combine(self, other, keep):
+        # Blocks where keep(in self, in other) holds, from one sweep over both
+        # sets' boundaries
+        o_start, o_end = self._aligned(other)
+        pos = np.concatenate([self.start, self.end, o_start, o_end])
+        n_self, n_other = len(self.start), len(o_start)
+        d_self = np.concatenate([np.ones(n_self, dtype=np.int8), -np.ones(n_self, dtype=np.int8),
+                                 np.zeros(2 * n_other, dtype=np.int8)])
+        d_other = np.concatenate([np.zeros(2 * n_self, dtype=np.int8),
+                                  np.ones(n_other, dtype=np.int8), -np.ones(n_other, dtype=np.int8)])
+        if len(pos) == 0:
+            return IntervalSet(self.contigs, pos, pos, normalized=True)
+        order = np.argsort(pos, kind='stable')
+        pos = pos[order]
+        in_self = np.cumsum(d_self[order]) > 0
+        in_other = np.cumsum(d_other[order]) > 0
+        # state after the last event at each position covers the next segment
+        last = np.append(pos[1:] != pos[:-1], True)
+        points = pos[last]
+        inside = keep(in_self[last], in_other[last])[:-1]
+        return IntervalSet(self.contigs, points[:-1][inside], points[1:][inside])
+
+    def union(self, other):
+        o_start, o_end = self._aligned(other)
+        return IntervalSet(self.contigs, np.concatenate([self.start, o_start]), np.concatenate([self.end, o_end]))
+
+    def intersection(self, other):
+        return self._combine(other, lambda a, b: a & b)
+
+    def difference(self, other):
+        return self._combine(other, lambda a, b: a & ~b)
+
+    def symmetric_difference(self, other):
+        return self._combine(other, lambda a, b: a ^ b)
+
+    def complement(self, lengths):
+        # Sequence of the contigs (lengths indexed by contig code) not in the set
+        return IntervalSet.from_lengths(self.contigs, lengths).difference(self)
+
+    def jaccard(self, other):
+        union = self.union(other).length
+        return self.intersection(other).length / union if union else 0.0
+
+    # --- per-interval queries ---------------------------------------------
+    # Queries are (contig codes, start, end) arrays on self.contigs, e.g. SD
+    # domains; they may overlap each other.
+
+    def overlap_bp(self, contig, start, end):
+        # bp of each query interval covered by the set
+        q_start, q_end = sd_index.to_axis(contig, start, end, bedtools_zero_length=False)
+        return (sd_index.covered_before(self.start, self.end, np.maximum(q_end, q_start))
+                - sd_index.covered_before(self.start, self.end, q_start))
+
+    def uncovered_pieces(self, contig, start, end):
+        # Each query interval minus the set: (query index, start, end) of the
+        # non-empty pieces left, in query order
+        q_start, q_end = sd_index.to_axis(contig, start, end, bedtools_zero_length=False)
+        offset = np.asarray(contig, dtype=np.int64) * sd_index.CONTIG_STRIDE
+        if len(self) == 0:
+            qi = np.flatnonzero(q_end > q_start)
+            return qi, q_start[qi] - offset[qi], q_end[qi] - offset[qi]
+
+        # blocks first..last-1 overlap the query and cut it into n + 1 pieces
+        first = np.searchsorted(self.end, q_start, side='right')
+        n = np.maximum(np.searchsorted(self.start, q_end, side='left') - first, 0)
+        qi = np.repeat(np.arange(len(q_start)), n + 1)
+        j = np.arange(len(qi)) - np.repeat(np.cumsum(n + 1) - (n + 1), n + 1)
+        k = first[qi] + j
+        piece_start = np.where(j == 0, q_start[qi], self.end[np.clip(k - 1, 0, len(self) - 1)])
+        piece_end = np.where(j == n[qi], q_end[qi], self.start[np.clip(k, 0, len(self) - 1)])
+        piece_start = np.maximum(piece_start, q_start[qi])
+        piece_end = np.minimum(piece_end, q_end[qi])
+        keep = piece_end > piece_start
+        qi = qi[keep]
+        return qi, piece_start[keep] - offset[qi], piece_end[keep] - offset[qi]
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
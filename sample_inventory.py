@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+# Sample inventory: one os.scandir pass over the WGAC and Inspector roots,
+# cached as a manifest of every (sample, haplotype) with the paths, sizes and
+# mtimes of its inputs.
+#
+#   {error_base}/{NN}_{sample}/{hap}/small_scale_error.bed
+#                                    structural_error.bed
+#                                    summary_statistics
+#   {wgac_base}/{sample}/{hap}/data/GenomicSuperDup.tab
+#
+# The cache is a manifest (sd_index.read_manifest reads it; '#' lines record
+# the roots and the mtime of every directory listed).  It is reused while none
+# of those directories changed and every recorded input still has its cached
+# size and mtime (a file rewritten in place leaves its directory's mtime
+# alone), so a rerun costs one stat per directory and input instead of a
+# listing; --refresh forces a rescan.  Missing inputs are left empty.
+# --output writes the rows of the chosen samples that have the --require'd
+# inputs, for the runners and sd_analysis.py:
+#
+#   python sample_inventory.py --wgac-base /scratch/wgac --error-base /data/assembly_qc_files \
+#       --cache sample_inventory.tsv --samples PI_sample_names.txt \
+#       --require GenomicSuperDup SmallScaleErrors StructuralErrors --output manifest.tsv
+
+import argparse
+import os
+import sys
+
+import sd_index
+
+HAPLOTYPES = ('hap1', 'hap2')
+WGAC_FILE = os.path.join('data', 'GenomicSuperDup.tab')
+ERROR_FILES = {
+    'SmallScaleErrors': 'small_scale_error.bed',
+    'StructuralErrors': 'structural_error.bed',
+    'SummaryStatistics': 'summary_statistics',
+}
+FILE_COLUMNS = ('GenomicSuperDup',) + tuple(ERROR_FILES)
+COLUMNS = (('Sample', 'Haplotype') + FILE_COLUMNS
+           + tuple(f'{c}{suffix}' for c in FILE_COLUMNS for suffix in ('Size', 'MtimeNs')))
+
+
+def sample_from_error_dir(name):
+    # Inspector output directories are named {NN}_{sample}
+    return name.split('_', 1)[1] if '_' in name else None
+
+
+def _subdirs(path, dirs):
+    # {name: path} of the subdirectories of path, recording path's mtime
+    entries = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                entries[entry.name] = entry.path
+    dirs[path] = os.stat(path).st_mtime_ns
+    return entries
+
+
+def _record(row, column, path, st):
+    row[column] = path
+    row[f'{column}Size'] = st.st_size
+    row[f'{column}MtimeNs'] = st.st_mtime_ns
+
+
+def scan(wgac_base, error_base):
+    # (rows, dirs): one row per (sample, haplotype) seen under either root,
+    # sorted, and {directory: mtime_ns} of every directory listed
+    rows = {}
+    dirs = {}
+
+    def row_for(sample, hap):
+        if (sample, hap) not in rows:
+            rows[(sample, hap)] = dict({c: '' for c in COLUMNS}, Sample=sample, Haplotype=hap)
+        return rows[(sample, hap)]
+
+    if error_base:
+        for name, sample_dir in sorted(_subdirs(error_base, dirs).items()):
+            sample = sample_from_error_dir(name)
+            if sample is None:
+                continue
+            haps = _subdirs(sample_dir, dirs)
+            for hap in HAPLOTYPES:
+                if hap not in haps:
+                    continue
+                row = row_for(sample, hap)
+                if row['SmallScaleErrors'] or row['StructuralErrors'] or row['SummaryStatistics']:
+                    print(f"WARNING: several error directories for {sample}; keeping the first", file=sys.stderr)
+                    continue
+                dirs[haps[hap]] = os.stat(haps[hap]).st_mtime_ns
+                with os.scandir(haps[hap]) as it:
+                    files = {entry.name: entry for entry in it if entry.is_file()}
+                for column, filename in ERROR_FILES.items():
+                    if filename in files:
+                        _record(row, column, files[filename].path, files[filename].stat())
+
+    if wgac_base:
+        for sample, sample_dir in sorted(_subdirs(wgac_base, dirs).items()):
+            haps = _subdirs(sample_dir, dirs)
+            for hap in HAPLOTYPES:
+                if hap not in haps:
+                    continue
+                dirs[haps[hap]] = os.stat(haps[hap]).st_mtime_ns
+                path = os.path.join(haps[hap], WGAC_FILE)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    row_for(sample, hap)
+                    continue
+                dirs[os.path.dirname(path)] = os.stat(os.path.dirname(path)).st_mtime_ns
+                _record(row_for(sample, hap), 'GenomicSuperDup', path, st)
+
+    return [rows[key] for key in sorted(rows)], dirs
+
+
+def write_inventory(path, rows, dirs, wgac_base, error_base):
+    szTemp = f"{path}.tmp{os.getpid()}"
+    with open(szTemp, "w") as fInventory:
+        fInventory.write("\t".join(COLUMNS) + "\n")
+        fInventory.write(f"#roots\t{wgac_base or ''}\t{error_base or ''}\n")
+        for szDir, nMtime in dirs.items():
+            fInventory.write(f"#dir\t{szDir}\t{nMtime}\n")
+        for row in rows:
+            fInventory.write("\t".join(str(row[c]) for c in COLUMNS) + "\n")
+    os.replace(szTemp, path)
+
+
+def read_inventory(path):
+    # (rows, dirs, (wgac_base, error_base))
+    dirs = {}
+    roots = (None, None)
+    with open(path, "r") as fInventory:
+        fInventory.readline()
+        for line in fInventory:
+            fields = line.rstrip('\n').split('\t')
+            if fields[0] == '#roots':
+                roots = tuple(f or None for f in fields[1:3])
+            elif fields[0] == '#dir':
+                dirs[fields[1]] = int(fields[2])
+    return sd_index.read_manifest(path), dirs, roots
+
+
+def is_fresh(dirs, rows):
+    # Every listed directory and every recorded input unchanged since the scan
+    try:
+        for szDir, nMtime in dirs.items():
+            if os.stat(szDir).st_mtime_ns != nMtime:
+                return False
+        for row in rows:
+            for column in FILE_COLUMNS:
+                if not row[column]:
+                    continue
+                st = os.stat(row[column])
+                if (str(st.st_size), str(st.st_mtime_ns)) != (row[f'{column}Size'], row[f'{column}MtimeNs']):
+                    return False
+    except OSError:
+        return False
+    return True
+
+
+def load_inventory(cache, wgac_base=None, error_base=None, refresh=False):
+    # Rows of the cached inventory, rescanning (and rewriting the cache) when
+    # it is missing, stale, or was built for other roots.  Roots left as None
+    # are taken from the cache.
+    if os.path.exists(cache) and not refresh:
+        rows, dirs, roots = read_inventory(cache)
+        wgac_base = wgac_base or roots[0]
+        error_base = error_base or roots[1]
+        if roots == (wgac_base, error_base) and is_fresh(dirs, rows):
+            return rows
+    if not wgac_base and not error_base:
+        raise ValueError(f"{cache}: no inventory yet; give --wgac-base and/or --error-base")
+    rows, dirs = scan(wgac_base, error_base)
+    write_inventory(cache, rows, dirs, wgac_base, error_base)
+    return [{c: str(row[c]) for c in COLUMNS} for row in rows]
+
+
+def select(rows, samples=None, require=()):
+    # Rows of the given samples (in that order) that have every required
+    # input; the reasons for leaving anything out are returned alongside
+    warnings = []
+    if samples is not None:
+        by_sample = {}
+        for row in rows:
+            by_sample.setdefault(row['Sample'], []).append(row)
+        ordered = []
+        for sample in samples:
+            if sample not in by_sample:
+                warnings.append(f"ERROR: no inputs found for {sample}")
+            ordered += by_sample.get(sample, [])
+        rows = ordered
+    selected = []
+    for row in rows:
+        missing = [c for c in require if not row[c]]
+        if missing:
+            warnings.append(f"WARNING: {row['Sample']} {row['Haplotype']}: no {', '.join(missing)}")
+            continue
+        selected.append(row)
+    return selected, warnings
+
+
+def write_manifest(path, rows):
+    with open(path, "w") as fManifest:
+        fManifest.write("\t".join(COLUMNS) + "\n")
+        for row in rows:
+            fManifest.write("\t".join(str(row[c]) for c in COLUMNS) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan the WGAC/Inspector roots once into a cached sample manifest')
+    parser.add_argument('--wgac-base', help='Directory of {sample}/{hap}/data/GenomicSuperDup.tab')
+    parser.add_argument('--error-base', help='Directory of {NN}_{sample}/{hap}/ Inspector outputs')
+    parser.add_argument('--cache', required=True, help='Inventory file, reused while the scanned directories are unchanged')
+    parser.add_argument('--refresh', action='store_true', help='Rescan even if the cache is fresh')
+    parser.add_argument('--samples', help='File of sample names, one per line, to select (in that order)')
+    parser.add_argument('--sample', action='append', help='Select this sample (overrides --samples); repeatable')
+    parser.add_argument('--require', nargs='+', default=[], choices=FILE_COLUMNS,
+                        help='Leave out haplotypes missing any of these inputs')
+    parser.add_argument('--output', help='Write the selected rows as a manifest here')
+    args = parser.parse_args(argv)
+
+    try:
+        rows = load_inventory(args.cache, args.wgac_base, args.error_base, args.refresh)
+    except (OSError, ValueError) as e:
+        sys.exit(f"sample_inventory.py: {e}")
+
+    samples = args.sample
+    if samples is None and args.samples:
+        with open(args.samples, "r") as fSamples:
+            samples = [line.strip() for line in fSamples if line.strip()]
+    selected, warnings = select(rows, samples, args.require)
+    for warning in warnings:
+        print(warning, file=sys.stderr)
+
+    if args.output:
+        write_manifest(args.output, selected)
+    print(f"{len(selected)} of {len(rows)} haplotypes selected" + (f" -> {args.output}" if args.output else ""))
+
+
+if __name__ == "__main__":
+    main()
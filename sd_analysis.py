@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Single entry point for the SD / assembly-error pipeline.  Each subcommand
+# imports its module only when chosen, so startup stays cheap, and the
+# options after the subcommand are those of the underlying script:
+#
+#   sd_analysis.py filter       ...   filter_sd_by_errors.py
+#   sd_analysis.py filter --structural ...  filter_sd_by_structural_errors.py
+#   sd_analysis.py compare      ...   filter_asm_qc.py
+#   sd_analysis.py analyze      ...   analyze_inspector_error.py
+#   sd_analysis.py visualize    ...   visualize_inspector_results.py
+#   sd_analysis.py triage       ...   sd_triage.py (sampled filter/analyze estimates)
+#   sd_analysis.py inventory    ...   sample_inventory.py (cached sample manifest)
+#   sd_analysis.py permute      ...   sd_error_permutation.py (SD/error enrichment test)
+#   sd_analysis.py combinations ...   sd_error_combinations.py (removal per error-type combination)
+#   sd_analysis.py families     ...   sd_families.py (duplication families)
+#   sd_analysis.py tables       ...   build_cohort_tables.py (R plotting inputs)
+#   sd_analysis.py join         ...   sd_error_join.py (sparse SD x error join)
+#   sd_analysis.py shared       ...   sd_shared_index.py (shared-memory index bundles)
+#
+# filter also takes --manifest to run every row of a cohort manifest in this
+# one interpreter (paths, sample and haplotype come from the manifest; other
+# options such as --szEngine and --szOutputDir apply to every row):
+#
+#   sd_analysis.py filter --manifest cohort_manifest.tsv --szEngine inprocess \
+#       --summary filtering_errors_summary.tsv
+
+import argparse
+import importlib
+import sys
+import time
+
+COMMANDS = {
+    'filter': ('filter_sd_by_errors', 'remove SDs overlapping Inspector errors (--structural: structural only)'),
+    'compare': ('filter_asm_qc', 'split two SD callsets into just-A, just-B and in-common'),
+    'analyze': ('analyze_inspector_error', 'summarize Inspector error statistics per haplotype'),
+    'visualize': ('visualize_inspector_results', 'plot the analyze output'),
+    'triage': ('sd_triage', 'estimate filter/analyze results from sampled contigs, with bootstrap CIs'),
+    'inventory': ('sample_inventory', 'scan the WGAC/Inspector roots once into a cached manifest'),
+    'permute': ('sd_error_permutation', 'permutation test for SD / error overlap enrichment'),
+    'combinations': ('sd_error_combinations', 'pairs removed / bp retained for every combination of error types'),
+    'families': ('sd_families', 'cluster SD pairs into duplication families through overlapping domains'),
+    'tables': ('build_cohort_tables', 'build the cohort TSVs the R plotting scripts read (--plots runs them)'),
+    'join': ('sd_error_join', 'export / query which error records overlap which SDs (sparse CSR arrays)'),
+    'shared': ('sd_shared_index', 'list or purge the shared-memory SD/error index bundles'),
+}
+
+
+def usage():
+    lines = ["usage: sd_analysis.py <command> [options]", "", "commands:"]
+    lines += [f"  {name:<12} {text}" for name, (_, text) in COMMANDS.items()]
+    lines += ["", "Run `sd_analysis.py <command> -h` for the options of one command."]
+    return "\n".join(lines)
+
+
+def manifest_argv(row, structural):
+    # The per-job options one manifest row stands for
+    argv = ['--szGenomicSuperDup', row['GenomicSuperDup'],
+            '--szStructuralErrors', row['StructuralErrors'],
+            '--szSampleName', row['Sample'],
+            '--szHaplotype', row['Haplotype']]
+    if not structural:
+        argv += ['--szSmallScaleErrors', row['SmallScaleErrors']]
+    return argv
+
+
+def run_filter_batch(module, manifest, structural, szSummary, argv):
+    # Filter every manifest row in-process; one failed row does not stop the rest
+    import sd_index
+
+    rows = sd_index.read_manifest(manifest)
+    summaries = []
+    nFailed = 0
+    t0 = time.time()
+    for row in rows:
+        t1 = time.time()
+        try:
+            summaries.extend(module.filter_sds(module.parse_args(manifest_argv(row, structural) + argv)))
+        except (OSError, ValueError, IndexError, ZeroDivisionError) as e:
+            nFailed += 1
+            print(f"Error filtering {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+            continue
+        print(f"{row['Sample']} {row['Haplotype']}: {time.time() - t1:.2f}s")
+
+    if szSummary and summaries:
+        with open(szSummary, "w") as fSummary:
+            fSummary.write("\t".join(summaries[0]) + "\n")
+            for summary in summaries:
+                fSummary.write("\t".join(str(v) for v in summary.values()) + "\n")
+
+    print(f"\n{len(summaries)} of {len(rows)} haplotypes filtered in {time.time() - t0:.1f}s")
+    return 1 if nFailed else 0
+
+
+def run_filter(argv):
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--structural', action='store_true')
+    parser.add_argument('--manifest')
+    parser.add_argument('--summary')
+    opts, rest = parser.parse_known_args(argv)
+
+    module = importlib.import_module('filter_sd_by_structural_errors' if opts.structural
+                                     else 'filter_sd_by_errors')
+    if opts.manifest:
+        return run_filter_batch(module, opts.manifest, opts.structural, opts.summary, rest)
+    if opts.summary:
+        sys.exit("sd_analysis.py filter: --summary needs --manifest")
+    module.main(rest)
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        sys.exit(f"sd_analysis.py: unknown command '{command}'\n\n{usage()}")
+
+    if command == 'filter':
+        return run_filter(rest)
+    importlib.import_module(COMMANDS[command][0]).main(rest)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
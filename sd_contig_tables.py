@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Per-contig and contig-pair breakdowns of one filter run, as group-by
+# reductions (bincount / unique over contig codes) on the arrays the filter
+# already parsed.  The filter scripts write them with --bContigTables:
+#
+#   {prefix}.contig_summary.tsv  one row per contig with SDs or errors:
+#       SD pairs (intra- and inter-contig), domains, nonredundant SD bp before
+#       and after filtering, pairs removed, and errors and merged error bp,
+#       in total and per error type
+#   {prefix}.contig_pairs.tsv    the intra/inter-contig SD pair matrix in
+#       sparse form: one row per contig pair with at least one SD pair
+#       (Contig1 == Contig2 rows are intra-contig)
+#
+# Rows are sorted by contig name, so tables from different runs line up and
+# stay compact with tens of thousands of contigs.
+#
+#   import sd_contig_tables
+#   sd_contig_tables.write_tables(prefix, sd, errors, aPairsWithErrors)
+
+import numpy as np
+
+from interval_set import IntervalSet
+
+CONTIG_SUFFIX = '.contig_summary.tsv'
+CONTIG_PAIR_SUFFIX = '.contig_pairs.tsv'
+
+
+def _counts(codes, n, weights=None):
+    return np.bincount(codes, weights=weights, minlength=n)[:n].astype(np.int64)
+
+
+def _bp_by_contig(interval_set, n):
+    bp = interval_set.length_by_contig()
+    return np.pad(bp, (0, max(n - len(bp), 0)))[:n]
+
+
+def contig_summary(sd, errors, removed_pairs):
+    # {column: array over contig codes} and the codes of the rows to write
+    n = len(sd.contigs)
+    r = sd.pair_row
+    c1, c2 = sd.chr1[r], sd.chr2[r]
+    intra = c1 == c2
+    removed = np.asarray(removed_pairs, dtype=bool)
+
+    table = {
+        'SD_pairs': _counts(c1, n) + _counts(c2[~intra], n),
+        'Intra_contig_pairs': _counts(c1[intra], n),
+    }
+    table['Inter_contig_pairs'] = table['SD_pairs'] - table['Intra_contig_pairs']
+    table['SD_domains'] = _counts(c1, n) + _counts(c2, n)
+    table['Removed_pairs'] = _counts(c1[removed], n) + _counts(c2[removed & ~intra], n)
+    table['Filtered_pairs'] = table['SD_pairs'] - table['Removed_pairs']
+    table['Nonredundant_bp'] = _bp_by_contig(IntervalSet.from_sd(sd), n)
+    table['Filtered_nonredundant_bp'] = _bp_by_contig(IntervalSet.from_sd(sd, r[~removed]), n)
+    table['Errors'] = _counts(errors.contig, n)
+    table['Error_bp'] = _bp_by_contig(IntervalSet.from_errors(errors), n)
+    for t, name in enumerate(errors.type_names):
+        mask = errors.type_code == t
+        table[f'{name}_errors'] = _counts(errors.contig[mask], n)
+        table[f'{name}_bp'] = _bp_by_contig(IntervalSet.from_errors(errors, mask), n)
+
+    rows = np.flatnonzero((table['SD_pairs'] > 0) | (table['Errors'] > 0))
+    names = np.array(sd.contigs.names, dtype=object)
+    rows = rows[np.argsort(names[rows], kind='stable')]
+    return table, rows
+
+
+def contig_pair_table(sd, removed_pairs):
+    # (contig1 codes, contig2 codes, {column: array}) with one entry per
+    # contig pair carrying SD pairs; contig1 sorts before contig2 by name
+    n = len(sd.contigs)
+    r = sd.pair_row
+    rank = np.argsort(np.argsort(np.array(sd.contigs.names, dtype=object), kind='stable'))
+    rank1, rank2 = rank[sd.chr1[r]], rank[sd.chr2[r]]
+    key = np.minimum(rank1, rank2).astype(np.int64) * n + np.maximum(rank1, rank2)
+    keys, inverse = np.unique(key, return_inverse=True)
+    by_rank = np.argsort(rank)
+    removed = np.asarray(removed_pairs, dtype=bool)
+    table = {
+        'SD_pairs': _counts(inverse, len(keys)),
+        'Removed_pairs': _counts(inverse[removed], len(keys)),
+        'Domain_bp': _counts(inverse, len(keys), (sd.end1[r] - sd.start1[r]) + (sd.end2[r] - sd.start2[r])),
+    }
+    table['Filtered_pairs'] = table['SD_pairs'] - table['Removed_pairs']
+    return by_rank[keys // n], by_rank[keys % n], table
+
+
+def write_tables(szPrefix, sd, errors, removed_pairs):
+    # Both tables next to the filter's other outputs; returns their paths
+    names = sd.contigs.names
+
+    table, rows = contig_summary(sd, errors, removed_pairs)
+    columns = list(table)
+    with open(szPrefix + CONTIG_SUFFIX, "w") as fOut:
+        fOut.write("\t".join(['Contig'] + columns) + "\n")
+        values = [table[c][rows].tolist() for c in columns]
+        for i, nCode in enumerate(rows.tolist()):
+            fOut.write("\t".join([names[nCode]] + [str(v[i]) for v in values]) + "\n")
+
+    contig1, contig2, table = contig_pair_table(sd, removed_pairs)
+    columns = ['SD_pairs', 'Removed_pairs', 'Filtered_pairs', 'Domain_bp']
+    with open(szPrefix + CONTIG_PAIR_SUFFIX, "w") as fOut:
+        fOut.write("\t".join(['Contig1', 'Contig2'] + columns) + "\n")
+        values = [table[c].tolist() for c in columns]
+        for i, (nCode1, nCode2) in enumerate(zip(contig1.tolist(), contig2.tolist())):
+            fOut.write("\t".join([names[nCode1], names[nCode2]] + [str(v[i]) for v in values]) + "\n")
+
+    return szPrefix + CONTIG_SUFFIX, szPrefix + CONTIG_PAIR_SUFFIX
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# Genome-wide binned SD and Inspector error density tracks.
+#
+# For every sample/haplotype in the manifest, writes one compressed .npz with
+# fixed-window arrays of SD bp, error bp by category and type, error counts,
+# and SD bp removed by the all-errors and structural-errors filters.  Window
+# coverage comes from prefix sums over merged intervals, so each track costs
+# one sort plus a searchsorted per window boundary.  Coarser zoom levels are
+# summed from the base windows with np.bincount.
+#
+# python sd_density_tracks.py --manifest cohort_manifest.tsv --window 100000 \
+#     --output-dir tracks/ --zoom-factor 4 --zoom-levels 3
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+
+MIN_WINDOW = 10_000
+MAX_WINDOW = 1_000_000
+
+
+def contig_lengths(contigs, tables, fai_path=None):
+    # Contig lengths from the .fai when given, extended to the furthest
+    # coordinate seen on each contig in any of the tables
+    fai = sd_index.read_fai(fai_path, contigs) if fai_path else np.zeros(0, dtype=np.int64)
+    lengths = np.zeros(len(contigs), dtype=np.int64)
+    lengths[:len(fai)] = fai
+    for contig, end in tables:
+        if len(end):
+            np.maximum.at(lengths, contig, end)
+    return lengths
+
+
+def window_grid(lengths, window):
+    # Per-contig window offsets and the axis position of every window boundary
+    n_windows = (lengths + window - 1) // window
+    offsets = np.concatenate([[0], np.cumsum(n_windows)])
+    contig_of_window = np.repeat(np.arange(len(lengths)), n_windows)
+    local = np.arange(offsets[-1]) - offsets[contig_of_window]
+    base = contig_of_window.astype(np.int64) * sd_index.CONTIG_STRIDE
+    win_start = base + local * window
+    win_end = base + np.minimum((local + 1) * window, lengths[contig_of_window])
+    return offsets, win_start, win_end
+
+
+def binned_coverage(axis_start, axis_end, win_start, win_end):
+    # Merged bp of the intervals falling in each window
+    block_start, block_end = sd_index.merge_axis(axis_start, axis_end)
+    return (sd_index.covered_before(block_start, block_end, win_end) -
+            sd_index.covered_before(block_start, block_end, win_start))
+
+
+def binned_counts(axis_start, win_start):
+    # Number of intervals starting in each window
+    window_id = np.searchsorted(win_start, axis_start, side='right') - 1
+    window_id = window_id[window_id >= 0]
+    return np.bincount(window_id, minlength=len(win_start))
+
+
+def zoom_out(offsets, tracks, factor):
+    # Sum groups of `factor` adjacent windows within each contig
+    n_windows = np.diff(offsets)
+    coarse_windows = (n_windows + factor - 1) // factor
+    coarse_offsets = np.concatenate([[0], np.cumsum(coarse_windows)])
+    contig_of_window = np.repeat(np.arange(len(n_windows)), n_windows)
+    local = np.arange(offsets[-1]) - offsets[contig_of_window]
+    coarse_id = coarse_offsets[contig_of_window] + local // factor
+    coarse = np.vstack([np.bincount(coarse_id, weights=t, minlength=coarse_offsets[-1])
+                        for t in tracks]) if len(tracks) else np.zeros((0, coarse_offsets[-1]))
+    return coarse_offsets, coarse.astype(tracks.dtype)
+
+
+def compute_tracks(row, window):
+    # All tracks for one manifest row; returns (names, lengths, track names,
+    # offsets, base-level track matrix)
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+    errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+    lengths = contig_lengths(contigs, [(sd.chr1, sd.end1), (sd.chr2, sd.end2),
+                                       (errors.contig, errors.end)], row.get('Fai'))
+
+    offsets, win_start, win_end = window_grid(lengths, window)
+
+    error_index = sd_index.IntervalIndex(errors.contig, errors.start, errors.end)
+    struct = errors.subset(errors.structural)
+    struct_index = sd_index.IntervalIndex(struct.contig, struct.start, struct.end)
+    removed = {'all_errors': sd_index.pairs_overlap_any(sd, error_index),
+               'structural_errors': sd_index.pairs_overlap_any(sd, struct_index)}
+
+    names = []
+    tracks = []
+
+    sd_start, sd_end = sd_index.domain_axis(sd)
+    sd_bp = binned_coverage(sd_start, sd_end, win_start, win_end)
+    names.append('sd_bp')
+    tracks.append(sd_bp)
+
+    for filter_name, mask in removed.items():
+        kept_start, kept_end = sd_index.domain_axis(sd, sd.pair_row[~mask])
+        names.append(f'sd_bp_removed_{filter_name}')
+        tracks.append(sd_bp - binned_coverage(kept_start, kept_end, win_start, win_end))
+
+    err_start, err_end = sd_index.to_axis(errors.contig, errors.start, errors.end, bedtools_zero_length=False)
+    for category, mask in (('small_scale', ~errors.structural), ('structural', errors.structural)):
+        names.append(f'error_bp_{category}')
+        tracks.append(binned_coverage(err_start[mask], err_end[mask], win_start, win_end))
+        names.append(f'error_count_{category}')
+        tracks.append(binned_counts(err_start[mask], win_start))
+
+    for nType, szType in enumerate(errors.type_names):
+        mask = errors.type_code == nType
+        names.append(f'error_bp_{szType}')
+        tracks.append(binned_coverage(err_start[mask], err_end[mask], win_start, win_end))
+
+    return contigs.names, lengths, names, offsets, np.vstack(tracks).astype(np.uint32)
+
+
+def write_tracks(path, window, contig_names, lengths, track_names, offsets, tracks,
+                 zoom_factor, zoom_levels):
+    # One .npz: zoom level z has offsets_z (per-contig window offsets) and
+    # tracks_z (n_tracks x n_windows) at window * zoom_factor**z
+    arrays = {'window': np.int64(window),
+              'zoom_factor': np.int64(zoom_factor),
+              'contig_names': np.array(contig_names),
+              'contig_lengths': lengths,
+              'track_names': np.array(track_names),
+              'offsets_0': offsets,
+              'tracks_0': tracks}
+    for z in range(1, zoom_levels + 1):
+        offsets, tracks = zoom_out(offsets, tracks, zoom_factor)
+        arrays[f'offsets_{z}'] = offsets
+        arrays[f'tracks_{z}'] = tracks
+    np.savez_compressed(path, **arrays)
+
+
+def load_tracks(path, zoom=0):
+    # Read one zoom level back as {track name: {contig: window array}}
+    with np.load(path) as data:
+        offsets = data[f'offsets_{zoom}']
+        tracks = data[f'tracks_{zoom}']
+        names = [str(c) for c in data['contig_names']]
+        result = {}
+        for n, track in enumerate(data['track_names']):
+            result[str(track)] = {names[c]: tracks[n, offsets[c]:offsets[c + 1]]
+                                  for c in range(len(names))}
+    return result
+
+
+def process_row(row, window, output_dir, zoom_factor, zoom_levels):
+    t0 = time.time()
+    contig_names, lengths, track_names, offsets, tracks = compute_tracks(row, window)
+    path = os.path.join(output_dir, f"{row['Sample']}.{row['Haplotype']}.density_{window}.npz")
+    write_tracks(path, window, contig_names, lengths, track_names, offsets, tracks,
+                 zoom_factor, zoom_levels)
+    return path, time.time() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Binned SD and error density tracks per haplotype')
+    parser.add_argument('--manifest', required=True,
+                        help='Cohort manifest TSV (optional Fai column gives contig lengths)')
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--window', type=int, default=100_000,
+                        help=f'Window size in bp ({MIN_WINDOW}-{MAX_WINDOW})')
+    parser.add_argument('--zoom-factor', type=int, default=4,
+                        help='Windows merged per step when building coarser zoom levels')
+    parser.add_argument('--zoom-levels', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if not MIN_WINDOW <= args.window <= MAX_WINDOW:
+        parser.error(f"--window must be between {MIN_WINDOW} and {MAX_WINDOW}")
+    if args.zoom_factor < 2:
+        parser.error("--zoom-factor must be at least 2")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = sd_index.read_manifest(args.manifest)
+
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(process_row, row, args.window, args.output_dir,
+                               args.zoom_factor, args.zoom_levels): row for row in rows}
+        for future, row in futures.items():
+            try:
+                path, seconds = future.result()
+                print(f"{row['Sample']} {row['Haplotype']}: {path} ({seconds:.2f}s)")
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error processing {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
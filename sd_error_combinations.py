@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+# Filter outcome for every combination of Inspector error types, from one
+# overlap sweep per haplotype.
+#
+# Each canonical SD pair gets a bitmask with bit t set when an error of type t
+# overlaps either of its domains (the filters' overlap test, zero-length
+# widening included).  Filtering by a set of types S removes exactly the pairs
+# with mask & S != 0, so the pair counts of all 2^T subsets come from a
+# group-by over the distinct masks, and the nonredundant bp retained from one
+# merge of the pre-sorted domains per distinct removal set.
+#
+# Bits are assigned per haplotype; rows are written for every subset of the
+# cohort's types (or of --types), so haplotypes lacking a type still get every
+# row.  Pairs_Exactly with --mask-table counts pairs per exact type set:
+#
+#   python sd_error_combinations.py --manifest cohort_manifest.tsv --output error_type_combinations.tsv
+#   python sd_error_combinations.py --manifest cohort_manifest.tsv --output collapse_expansion.tsv \
+#       --types Collapse Expansion HaplotypeSwitch --mask-table pair_type_masks.tsv
+#
+# The row for all structural types matches filter_sd_by_structural_errors.py
+# and the row for all types matches filter_sd_by_errors.py.
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+
+MAX_TYPES = 16
+COLUMNS = ['Sample', 'Haplotype', 'Error_Types', 'N_Types', 'SD_pairs', 'Error_Overlap_pairs',
+           'Filtered_pairs', 'Percent_Removed', 'Nonredundant_bp', 'Filtered_nonredundant_bp',
+           'Percent_bp_Retained']
+
+
+def pair_type_masks(sd, errors, bits):
+    # uint64 mask per canonical pair; bits[type_code] is the bit of each error
+    # type (0 leaves the type out)
+    r = sd.pair_row
+    n = len(r)
+    masks = np.zeros(n, dtype=np.uint64)
+    q_start, q_end = sd_index.to_axis(np.concatenate([sd.chr1[r], sd.chr2[r]]),
+                                      np.concatenate([sd.start1[r], sd.start2[r]]),
+                                      np.concatenate([sd.end1[r], sd.end2[r]]))
+    error_bits = np.asarray(bits, dtype=np.uint64)[errors.type_code]
+    keep = error_bits != 0
+    t_start, t_end = sd_index.to_axis(errors.contig[keep], errors.start[keep], errors.end[keep])
+    error_bits = error_bits[keep]
+    for qi, ti in sd_index.iter_overlap_pairs(q_start, q_end, t_start, t_end):
+        np.bitwise_or.at(masks, qi % n, error_bits[ti])
+    return masks
+
+
+def subset_table(sd, masks, n_types):
+    # (removed pairs, retained nonredundant bp) for every subset S of the
+    # n_types bits, indexed by S
+    values, counts = np.unique(masks, return_counts=True)
+    subsets = np.arange(1 << n_types, dtype=np.uint64)
+    hit = (subsets[:, None] & values[None, :]) != 0
+    removed = hit.astype(np.int64) @ counts
+
+    # domains sorted once; every removal set merges a sorted subsequence
+    axis_start, axis_end = sd_index.domain_axis(sd)
+    pair = np.tile(np.arange(sd.n_pairs), 2)
+    order = np.argsort(axis_start, kind='stable')
+    axis_start, axis_end = axis_start[order], axis_end[order]
+    domain_mask = masks[pair[order]]
+
+    retained = np.zeros(len(subsets), dtype=np.int64)
+    cache = {}
+    for s in range(len(subsets)):
+        key = hit[s].tobytes()
+        if key not in cache:
+            kept = (domain_mask & subsets[s]) == 0
+            block_start, block_end = sd_index.merge_axis(axis_start[kept], axis_end[kept])
+            cache[key] = int((block_end - block_start).sum())
+        retained[s] = cache[key]
+    return removed, retained
+
+
+def process_row(row, types):
+    # Type names (bit order), per-subset removed pairs and retained bp, the
+    # pair count and the distinct masks with their pair counts
+    t0 = time.time()
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+    errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+
+    names = sorted(set(errors.type_names) & set(types) if types else errors.type_names)
+    if len(names) > MAX_TYPES:
+        raise ValueError(f"{len(names)} error types; give at most {MAX_TYPES} with --types")
+    bit = {name: 1 << i for i, name in enumerate(names)}
+    bits = [bit.get(name, 0) for name in errors.type_names]
+
+    masks = pair_type_masks(sd, errors, bits)
+    removed, retained = subset_table(sd, masks, len(names))
+    values, counts = np.unique(masks, return_counts=True)
+    return names, removed, retained, sd.n_pairs, values, counts, time.time() - t0
+
+
+def type_label(names):
+    return ",".join(names) if names else "none"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pairs removed and bp retained for every combination of error types')
+    parser.add_argument('--manifest', required=True)
+    parser.add_argument('--output', required=True, help='TSV with one row per haplotype and type combination')
+    parser.add_argument('--types', nargs='+', help='Error types to combine (default: every type in the cohort)')
+    parser.add_argument('--mask-table', help='Also write the number of pairs per exact set of overlapping types')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    if args.types and len(set(args.types)) > MAX_TYPES:
+        parser.error(f"--types: at most {MAX_TYPES} types")
+
+    rows = sd_index.read_manifest(args.manifest)
+    results = []
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(process_row, row, args.types): row for row in rows}
+        for future, row in futures.items():
+            try:
+                result = future.result()
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error combining {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            results.append((row, result))
+            print(f"{row['Sample']} {row['Haplotype']}: {result[3]} pairs, {len(result[0])} types, "
+                  f"{len(result[4])} distinct masks ({result[6]:.2f}s)")
+
+    # every subset of the cohort's types, fewest types first
+    if args.types:
+        all_types = sorted(set(args.types))
+    else:
+        all_types = sorted({name for _, result in results for name in result[0]})
+    if len(all_types) > MAX_TYPES:
+        sys.exit(f"sd_error_combinations.py: {len(all_types)} error types in the cohort; "
+                 f"give at most {MAX_TYPES} with --types")
+    subsets = sorted(range(1 << len(all_types)), key=lambda s: (bin(s).count('1'), s))
+
+    with open(args.output, "w") as fOut:
+        fOut.write("\t".join(COLUMNS) + "\n")
+        for row, (names, removed, retained, nPairs, _, _, _) in results:
+            local = {name: 1 << i for i, name in enumerate(names)}
+            nBp = int(retained[0])
+            for s in subsets:
+                chosen = [t for i, t in enumerate(all_types) if s >> i & 1]
+                k = sum(local.get(t, 0) for t in chosen)
+                nRemoved = int(removed[k])
+                summary = {'Sample': row['Sample'], 'Haplotype': row['Haplotype'],
+                           'Error_Types': type_label(chosen), 'N_Types': len(chosen),
+                           'SD_pairs': nPairs, 'Error_Overlap_pairs': nRemoved,
+                           'Filtered_pairs': nPairs - nRemoved,
+                           'Percent_Removed': f"{(nRemoved / nPairs * 100):.2f}" if nPairs else "0.00",
+                           'Nonredundant_bp': nBp, 'Filtered_nonredundant_bp': int(retained[k]),
+                           'Percent_bp_Retained': f"{(retained[k] / nBp * 100):.2f}" if nBp else "0.00"}
+                fOut.write("\t".join(str(summary[c]) for c in COLUMNS) + "\n")
+
+    if args.mask_table:
+        with open(args.mask_table, "w") as fMasks:
+            fMasks.write("Sample\tHaplotype\tError_Types\tN_Types\tPairs_Exactly\n")
+            for row, (names, _, _, _, values, counts, _) in results:
+                for value, count in zip(values.tolist(), counts.tolist()):
+                    chosen = [name for i, name in enumerate(names) if value >> i & 1]
+                    fMasks.write(f"{row['Sample']}\t{row['Haplotype']}\t{type_label(chosen)}\t{len(chosen)}\t{count}\n")
+
+    print(f"\n{len(results)} haplotypes x {len(subsets)} type combinations in {time.time() - t0:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+# Signed distance from every SD domain to the nearest small-scale and the
+# nearest structural Inspector error, with that error's type.
+#
+# Distances follow `bedtools closest -D ref` on the forward strand: 0 when the
+# domain overlaps an error (exactly the filter scripts' removal test,
+# zero-length widening included), otherwise the gap + 1, negative when the
+# error lies at smaller coordinates and positive when it lies at larger ones,
+# so a book-ended error is -1 or +1.  Contigs without errors of a category get
+# MISSING.  Ties between an upstream and a downstream error go upstream.
+#
+# Per haplotype one sidecar .npz is written (and optionally a TSV with one
+# row per GenomicSuperDup.tab line), so distance filters and histograms are
+# array lookups with no re-intersecting:
+#
+#   python sd_error_distance.py --manifest cohort_manifest.tsv --output-dir distances/ --tsv
+#
+#   import sd_error_distance as sed
+#   d = sed.load_distances('distances/UPIS220008.hap1.error_distance.npz')
+#   lines = sed.lines_within(d, 5000, 'structural')
+#   counts, edges = sed.distance_histogram(d, np.arange(-50000, 50001, 1000))
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+
+MISSING = np.iinfo(np.int64).min
+CATEGORIES = ('small_scale', 'structural')
+
+
+def nearest_errors(q_contig, q_start, q_end, errors):
+    # (signed distance, error row) of the nearest error to each query
+    # interval; row -1 and MISSING when its contig has no errors
+    n = len(q_start)
+    distance = np.full(n, MISSING, dtype=np.int64)
+    row = np.full(n, -1, dtype=np.int64)
+    if n == 0 or len(errors) == 0:
+        return distance, row
+
+    qa_start, qa_end = sd_index.to_axis(q_contig, q_start, q_end)
+    ea_start, ea_end = sd_index.to_axis(errors.contig, errors.start, errors.end)
+    q_contig = np.asarray(q_contig, dtype=np.int64)
+    e_contig = errors.contig.astype(np.int64)
+
+    # upstream: the error with the largest end at or before the query start
+    by_end = np.argsort(ea_end, kind='stable')
+    k = np.searchsorted(ea_end[by_end], qa_start, side='right') - 1
+    up = by_end[np.maximum(k, 0)]
+    has_up = (k >= 0) & (e_contig[up] == q_contig)
+    up_gap = qa_start - ea_end[up] + 1
+
+    # downstream: the error with the smallest start at or after the query end
+    by_start = np.argsort(ea_start, kind='stable')
+    k = np.searchsorted(ea_start[by_start], qa_end, side='left')
+    down = by_start[np.minimum(k, len(by_start) - 1)]
+    has_down = (k < len(by_start)) & (e_contig[down] == q_contig)
+    down_gap = ea_start[down] - qa_end + 1
+
+    use_up = has_up & (~has_down | (up_gap <= down_gap))
+    use_down = has_down & ~use_up
+    distance[use_up] = -up_gap[use_up]
+    row[use_up] = up[use_up]
+    distance[use_down] = down_gap[use_down]
+    row[use_down] = down[use_down]
+
+    # overlapping errors win with distance 0; report the one overlapping most
+    best_overlap = np.zeros(n, dtype=np.int64)
+    for qi, ei in sd_index.iter_overlap_pairs(qa_start, qa_end, ea_start, ea_end):
+        overlap = np.minimum(qa_end[qi], ea_end[ei]) - np.maximum(qa_start[qi], ea_start[ei])
+        order = np.lexsort((-overlap, qi))
+        qi, ei, overlap = qi[order], ei[order], overlap[order]
+        first = np.ones(len(qi), dtype=bool)
+        first[1:] = qi[1:] != qi[:-1]
+        better = first & (overlap > best_overlap[qi])
+        best_overlap[qi[better]] = overlap[better]
+        distance[qi[better]] = 0
+        row[qi[better]] = ei[better]
+    return distance, row
+
+
+def compute_distances(row):
+    # distance[line row, domain, category] and type[...] for one manifest row;
+    # computed once per canonical pair and expanded to both of its lines,
+    # which share their pair_row's domain order
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+    errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+    r = sd.pair_row
+
+    n_pairs = len(r)
+    distance = np.full((n_pairs, 2, 2), MISSING, dtype=np.int64)
+    error_type = np.full((n_pairs, 2, 2), -1, dtype=np.int16)
+    for c, mask in enumerate((~errors.structural, errors.structural)):
+        category = errors.subset(mask)
+        for d, (chrom, start, end) in enumerate(((sd.chr1, sd.start1, sd.end1), (sd.chr2, sd.start2, sd.end2))):
+            dist, err_row = nearest_errors(chrom[r], start[r], end[r], category)
+            distance[:, d, c] = dist
+            found = err_row >= 0
+            error_type[found, d, c] = category.type_code[err_row[found]]
+
+    return {'line': sd.line,
+            'distance': distance[sd.pair],
+            'error_type': error_type[sd.pair],
+            'type_names': np.array(errors.type_names, dtype=str),
+            'contig_names': np.array(contigs.names),
+            'chr1': sd.chr1, 'start1': sd.start1, 'end1': sd.end1,
+            'chr2': sd.chr2, 'start2': sd.start2, 'end2': sd.end2}
+
+
+def write_tsv(path, d):
+    names = [str(c) for c in d['contig_names']]
+    types = [str(t) for t in d['type_names']]
+
+    def fmt_distance(x):
+        return "NA" if x == MISSING else str(x)
+
+    def fmt_type(x):
+        return "NA" if x < 0 else types[x]
+
+    header = ['Line', 'Chr1', 'Start1', 'End1', 'Chr2', 'Start2', 'End2']
+    for domain in (1, 2):
+        for category in CATEGORIES:
+            header += [f'{category}_distance{domain}', f'{category}_type{domain}']
+    with open(path, "w") as fOut:
+        fOut.write("\t".join(header) + "\n")
+        for i in range(len(d['line'])):
+            fields = [str(d['line'][i]), names[d['chr1'][i]], str(d['start1'][i]), str(d['end1'][i]),
+                      names[d['chr2'][i]], str(d['start2'][i]), str(d['end2'][i])]
+            for domain in range(2):
+                for c in range(2):
+                    fields += [fmt_distance(d['distance'][i, domain, c]), fmt_type(d['error_type'][i, domain, c])]
+            fOut.write("\t".join(fields) + "\n")
+
+
+def load_distances(path):
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+def _category_columns(category):
+    if category == 'any':
+        return [0, 1]
+    return [CATEGORIES.index(category)]
+
+
+def nearest_distance(d, category='any'):
+    # Per SD line: the signed distance of the nearest error over both domains
+    # (and both categories for 'any'); MISSING when there is none
+    dist = d['distance'][:, :, _category_columns(category)].reshape(len(d['line']), -1)
+    magnitude = np.where(dist == MISSING, np.iinfo(np.int64).max, np.abs(dist))
+    pick = np.argmin(magnitude, axis=1)
+    return dist[np.arange(len(dist)), pick]
+
+
+def lines_within(d, max_distance, category='any'):
+    # 1-based GenomicSuperDup.tab lines with an error within max_distance bp
+    # of either domain (0 = only overlapping errors, as the filters remove)
+    dist = nearest_distance(d, category)
+    return d['line'][(dist != MISSING) & (np.abs(dist) <= max_distance)]
+
+
+def distance_histogram(d, bins, category='any', domain_level=False):
+    # np.histogram of signed nearest distances, per SD line by default or
+    # per domain with domain_level=True
+    if domain_level:
+        dist = d['distance'][:, :, _category_columns(category)].ravel()
+    else:
+        dist = nearest_distance(d, category)
+    return np.histogram(dist[dist != MISSING], bins=bins)
+
+
+def process_row(row, output_dir, write_text):
+    t0 = time.time()
+    d = compute_distances(row)
+    szPrefix = os.path.join(output_dir, f"{row['Sample']}.{row['Haplotype']}.error_distance")
+    np.savez_compressed(szPrefix + ".npz", **d)
+    if write_text:
+        write_tsv(szPrefix + ".tsv", d)
+    nWithin = len(lines_within(d, 5000))
+    return szPrefix + ".npz", len(d['line']), nWithin, time.time() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Signed distance from each SD domain to the nearest Inspector errors')
+    parser.add_argument('--manifest', required=True)
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--tsv', action='store_true', help='Also write a per-line TSV next to each .npz')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = sd_index.read_manifest(args.manifest)
+
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(process_row, row, args.output_dir, args.tsv): row for row in rows}
+        for future, row in futures.items():
+            try:
+                path, nLines, nWithin, seconds = future.result()
+                print(f"{row['Sample']} {row['Haplotype']}: {path} "
+                      f"({nWithin}/{nLines} SD lines within 5 kb of an error, {seconds:.2f}s)")
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error processing {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# The full many-to-many join between SD pairs and Inspector error records,
+# as sparse arrays instead of `bedtools intersect -wa -wb` text.
+#
+# One entry per (canonical pair, domain side, error) that overlaps under the
+# filters' test (zero-length errors widened as bedtools does), sorted by
+# pair, side and error, with the overlap bp (0 for zero-length errors):
+#
+#   pair_indptr[p]:pair_indptr[p+1]   entries of pair p (CSR)
+#   entry_error, entry_side, entry_bp parallel entry arrays; side 1 is the
+#                                     left domain (Chr1/Start1 of SDTable),
+#                                     which every line of a pair shares with
+#                                     its pair_row, so sides hold per line
+#   error_indptr, error_entries       the same entries by error (CSC)
+#   line_pair                         pair of each GenomicSuperDup.tab line
+#                                     (-1 for comment lines)
+#   pair_row_line                     representative line of each pair
+#   error_contig/start/end/type       the error records, in load order
+#                                     (small-scale file, then structural)
+#
+# Pair ids depend on contig coding, so they are only meaningful within one
+# join; compare joins by line number or error index.
+#
+# Each array is its own .npy under one directory with a meta.json of names,
+# so readers np.load(mmap_mode='r') and touch only the slices they query.
+# The filter scripts write {prefix}.error_join/ with --bErrorJoin; standalone:
+#
+#   python sd_error_join.py build --manifest cohort_manifest.tsv --output-dir joins/
+#   python sd_error_join.py query joins/UPIS220008.hap1.error_join --line 1234
+#   python sd_error_join.py query joins/UPIS220008.hap1.error_join --error 17
+#
+#   join = sd_error_join.ErrorJoin('joins/UPIS220008.hap1.error_join')
+#   errors, sides, bp = join.errors_for_line(1234)
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+
+JOIN_SUFFIX = '.error_join'
+
+
+def _index_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+def compute_join(sd, errors):
+    # ({name: array}, metadata) of the join between sd and errors
+    n = sd.n_pairs
+    r = sd.pair_row
+    domain_contig = np.concatenate([sd.chr1[r], sd.chr2[r]])
+    domain_start = np.concatenate([sd.start1[r], sd.start2[r]])
+    domain_end = np.concatenate([sd.end1[r], sd.end2[r]])
+    q_start, q_end = sd_index.to_axis(domain_contig, domain_start, domain_end)
+    t_start, t_end = sd_index.to_axis(errors.contig, errors.start, errors.end)
+
+    hits = list(sd_index.iter_overlap_pairs(q_start, q_end, t_start, t_end))
+    qi = np.concatenate([h[0] for h in hits]) if hits else np.zeros(0, dtype=np.int64)
+    ti = np.concatenate([h[1] for h in hits]) if hits else np.zeros(0, dtype=np.int64)
+    pair = qi % n if n else qi
+    side = (qi // max(n, 1) + 1).astype(np.int8)
+    bp = np.maximum(np.minimum(domain_end[qi], errors.end[ti]) - np.maximum(domain_start[qi], errors.start[ti]), 0)
+
+    order = np.lexsort((ti, side, pair))
+    pair, side, ti, bp = pair[order], side[order], ti[order], bp[order]
+    pair_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair, minlength=n), out=pair_indptr[1:])
+    error_entries = np.argsort(ti, kind='stable')
+    error_indptr = np.zeros(len(errors) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ti, minlength=len(errors)), out=error_indptr[1:])
+
+    line_pair = np.full(sd.n_lines + 1, -1, dtype=_index_dtype(n))
+    line_pair[sd.line] = sd.pair
+    arrays = {
+        'pair_indptr': pair_indptr,
+        'entry_error': ti.astype(_index_dtype(len(errors))),
+        'entry_side': side,
+        'entry_bp': bp.astype(np.int64),
+        'error_indptr': error_indptr,
+        'error_entries': error_entries.astype(_index_dtype(len(order))),
+        'line_pair': line_pair,
+        'pair_row_line': sd.line[r],
+        'error_contig': errors.contig,
+        'error_start': errors.start,
+        'error_end': errors.end,
+        'error_type': errors.type_code,
+    }
+    meta = {'sd_path': sd.path, 'n_lines': int(sd.n_lines), 'n_pairs': int(n), 'n_errors': len(errors),
+            'n_entries': len(order), 'contigs': sd.contigs.names, 'type_names': list(errors.type_names)}
+    return arrays, meta
+
+
+def write_join(path, sd, errors):
+    # Write the join of sd and errors as a directory of .npy files; returns
+    # the number of entries
+    arrays, meta = compute_join(sd, errors)
+    szTemp = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(szTemp, ignore_errors=True)
+    os.makedirs(szTemp)
+    for name, array in arrays.items():
+        np.save(os.path.join(szTemp, f"{name}.npy"), array)
+    with open(os.path.join(szTemp, 'meta.json'), 'w') as fMeta:
+        json.dump(meta, fMeta)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(szTemp, path)
+    return meta['n_entries']
+
+
+class ErrorJoin:
+    """Read-only, memory-mapped view of a join written by write_join"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as fMeta:
+            self.meta = json.load(fMeta)
+        self._arrays = {}
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    def errors_for_pair(self, pair):
+        # (error indices, sides, overlap bp) of one canonical pair
+        lo, hi = self['pair_indptr'][pair], self['pair_indptr'][pair + 1]
+        return (np.asarray(self['entry_error'][lo:hi]), np.asarray(self['entry_side'][lo:hi]),
+                np.asarray(self['entry_bp'][lo:hi]))
+
+    def errors_for_line(self, line):
+        # The same for a 1-based GenomicSuperDup.tab line
+        pair = int(self['line_pair'][line])
+        if pair < 0:
+            raise ValueError(f"line {line} of {self.meta['sd_path']} is not an SD record")
+        return self.errors_for_pair(pair)
+
+    def pairs_for_error(self, error):
+        # (pairs, sides, overlap bp) hit by one error record
+        lo, hi = self['error_indptr'][error], self['error_indptr'][error + 1]
+        entries = np.asarray(self['error_entries'][lo:hi])
+        pair = np.searchsorted(self['pair_indptr'], entries, side='right') - 1
+        return pair, np.asarray(self['entry_side'][entries]), np.asarray(self['entry_bp'][entries])
+
+    def error_record(self, error):
+        # (contig, start, end, type) of one error
+        return (self.meta['contigs'][int(self['error_contig'][error])], int(self['error_start'][error]),
+                int(self['error_end'][error]), self.meta['type_names'][int(self['error_type'][error])])
+
+
+def process_row(row, output_dir):
+    t0 = time.time()
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+    errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+    szPath = os.path.join(output_dir, f"{row['Sample']}.{row['Haplotype']}{JOIN_SUFFIX}")
+    nEntries = write_join(szPath, sd, errors)
+    return szPath, sd.n_pairs, nEntries, time.time() - t0
+
+
+def build(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = sd_index.read_manifest(args.manifest)
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(process_row, row, args.output_dir): row for row in rows}
+        for future, row in futures.items():
+            try:
+                path, nPairs, nEntries, seconds = future.result()
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error joining {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            print(f"{row['Sample']} {row['Haplotype']}: {path} ({nEntries} entries over {nPairs} pairs, "
+                  f"{seconds:.2f}s)")
+
+
+def query(args):
+    join = ErrorJoin(args.join)
+    print("Line\tPair\tSide\tOverlap_bp\tError\tError_contig\tError_start\tError_end\tError_type")
+    if args.line is not None:
+        pair = int(join['line_pair'][args.line])
+        if pair < 0:
+            sys.exit(f"sd_error_join.py: line {args.line} is not an SD record")
+        for error, side, bp in zip(*(a.tolist() for a in join.errors_for_pair(pair))):
+            print("\t".join(map(str, (args.line, pair, side, bp, error) + join.error_record(error))))
+    else:
+        record = join.error_record(args.error)
+        for pair, side, bp in zip(*(a.tolist() for a in join.pairs_for_error(args.error))):
+            line = int(join['pair_row_line'][pair])
+            print("\t".join(map(str, (line, pair, side, bp, args.error) + record)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sparse SD pair x Inspector error join (CSR/CSC .npy arrays)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('build', help='Write one join directory per manifest row')
+    p.add_argument('--manifest', required=True)
+    p.add_argument('--output-dir', required=True)
+    p.add_argument('--threads', type=int, default=os.cpu_count())
+    p = commands.add_parser('query', help='List the entries of one SD line or one error')
+    p.add_argument('join', help='A *.error_join directory')
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument('--line', type=int, help='1-based GenomicSuperDup.tab line')
+    group.add_argument('--error', type=int, help='Error index (load order)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        build(args)
+    else:
+        query(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# Permutation test for SD / Inspector error enrichment.
+#
+# For every sample/haplotype in the manifest, the errors are shuffled within
+# their own contigs (lengths kept, start drawn uniformly so the error fits in
+# the contig) and each shuffle is scored against the SD domains exactly as the
+# observed errors are:
+#
+#   Errors_In_SD  errors overlapping any SD domain (the filters' overlap
+#                 test, sd_index.IntervalIndex.overlaps_any)
+#   bp_In_SD      error bp inside merged SD domains, summed over errors
+#
+# per error type, per category (small_scale / structural) and for all errors.
+# With --gaps, shuffled errors are redrawn until they avoid the gap BED.
+# Shuffles run in batches across a process pool; each sample/haplotype and
+# each batch gets its own RNG stream from one SeedSequence, so results depend
+# only on --seed and --batch-size, not on --threads.  Empirical p-values are
+# (1 + #shuffles at least as extreme) / (1 + #shuffles).  With --shared-memory
+# the workers map one copy of each haplotype's parsed inputs
+# (sd_shared_index.py) instead of parsing their own.
+#
+#   python sd_error_permutation.py --manifest cohort_manifest.tsv --permutations 10000 \
+#       --gaps /data/{Sample}.{Haplotype}.gaps.bed --output sd_error_enrichment.tsv
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+import sd_shared_index
+from interval_set import IntervalSet
+from sd_density_tracks import contig_lengths
+
+STATISTICS = ('Errors_In_SD', 'bp_In_SD')
+MAX_REDRAWS = 100
+
+# prepared inputs per process, so batches of the same haplotype load them once
+_PREPARED = {}
+
+
+def prepare(row, gaps_template, shared=None):
+    # Inputs of one haplotype, parsed here or wrapped around the node's
+    # shared copy (sd_shared_index.SharedInputs)
+    key = (row['GenomicSuperDup'], row['SmallScaleErrors'], row['StructuralErrors'], row.get('Fai'), gaps_template)
+    if shared is None and key in _PREPARED:
+        return _PREPARED[key]
+
+    if shared is not None:
+        contigs, sd, errors = shared.contigs, shared.sd, shared.errors
+    else:
+        contigs = sd_index.ContigCodes()
+        sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+        errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+    gaps = None
+    if gaps_template:
+        gap_contig, gap_start, gap_end = sd_index.load_bed_intervals(gaps_template.format(**row), contigs)
+        gaps = sd_index.IntervalIndex(gap_contig, gap_start, gap_end, bedtools_zero_length=False)
+    lengths = contig_lengths(contigs, [(sd.chr1, sd.end1), (sd.chr2, sd.end2),
+                                       (errors.contig, errors.end)], row.get('Fai'))
+
+    if shared is not None:
+        domain_index, domain_set = shared.domain_index, shared.domain_set
+    else:
+        # both domains of each canonical pair
+        r = sd.pair_row
+        domain_contig = np.concatenate([sd.chr1[r], sd.chr2[r]])
+        domain_start = np.concatenate([sd.start1[r], sd.start2[r]])
+        domain_end = np.concatenate([sd.end1[r], sd.end2[r]])
+        domain_index = sd_index.IntervalIndex(domain_contig, domain_start, domain_end)
+        domain_set = IntervalSet.from_arrays(contigs, domain_contig, domain_start, domain_end)
+
+    # group membership of each error: all, categories, then types
+    names = ['all', 'small_scale', 'structural'] + list(errors.type_names)
+    groups = np.vstack([np.ones(len(errors), dtype=bool), ~errors.structural, errors.structural]
+                       + [errors.type_code == t for t in range(len(errors.type_names))])
+
+    prepared = {
+        'errors': errors,
+        'lengths': lengths,
+        'gaps': gaps,
+        'sd_index': domain_index,
+        'sd_set': domain_set,
+        'group_names': names,
+        'groups': groups.astype(np.int64),
+    }
+    if shared is None:
+        _PREPARED[key] = prepared
+    return prepared
+
+
+def score(prepared, contig, start, end):
+    # (n_groups, len(STATISTICS)) for one placement of the errors
+    hit = prepared['sd_index'].overlaps_any(contig, start, end)
+    bp = prepared['sd_set'].overlap_bp(contig, start, end)
+    return np.column_stack([prepared['groups'] @ hit.astype(np.int64), prepared['groups'] @ bp])
+
+
+def shuffle(prepared, rng):
+    # New starts for every error within its contig, avoiding gaps if given;
+    # returns (start, end, number of errors that never avoided a gap)
+    errors = prepared['errors']
+    size = errors.end - errors.start
+    span = np.maximum(prepared['lengths'][errors.contig] - size, 0) + 1
+    start = (rng.random(len(size)) * span).astype(np.int64)
+    nUnplaced = 0
+    if prepared['gaps'] is not None and len(prepared['gaps']):
+        redraw = prepared['gaps'].overlaps_any(errors.contig, start, start + size)
+        for _ in range(MAX_REDRAWS):
+            if not redraw.any():
+                break
+            idx = np.flatnonzero(redraw)
+            start[idx] = (rng.random(len(idx)) * span[idx]).astype(np.int64)
+            redraw[idx] = prepared['gaps'].overlaps_any(errors.contig[idx], start[idx], start[idx] + size[idx])
+        nUnplaced = int(redraw.sum())
+    return start, start + size, nUnplaced
+
+
+def run_batch(row, gaps_template, seed, n_permutations, shared_memory=False):
+    # Group names and sizes, the observed scores and the scores of
+    # n_permutations shuffles (n_permutations, n_groups, len(STATISTICS)),
+    # with the gap misses
+    if shared_memory:
+        with sd_shared_index.shared_inputs(row['GenomicSuperDup'], row['SmallScaleErrors'],
+                                           row['StructuralErrors']) as shared:
+            return permute(prepare(row, gaps_template, shared), seed, n_permutations)
+    return permute(prepare(row, gaps_template), seed, n_permutations)
+
+
+def permute(prepared, seed, n_permutations):
+    t0 = time.time()
+    errors = prepared['errors']
+    observed = score(prepared, errors.contig, errors.start, errors.end)
+    rng = np.random.default_rng(seed)
+    null = np.zeros((n_permutations,) + observed.shape, dtype=np.int64)
+    nUnplaced = 0
+    for i in range(n_permutations):
+        start, end, nMissed = shuffle(prepared, rng)
+        null[i] = score(prepared, errors.contig, start, end)
+        nUnplaced += nMissed
+    return (prepared['group_names'], prepared['groups'].sum(axis=1), observed, null, nUnplaced,
+            time.time() - t0)
+
+
+def summarize(names, sizes, observed, null):
+    # One output row per error group
+    n = len(null)
+    rows = []
+    for g, name in enumerate(names):
+        row = {'Error_Type': name, 'Errors': int(sizes[g])}
+        for s, statistic in enumerate(STATISTICS):
+            obs = observed[g, s]
+            values = null[:, g, s]
+            expected = values.mean()
+            row[f'Observed_{statistic}'] = int(obs)
+            row[f'Expected_{statistic}'] = f"{expected:.2f}"
+            row[f'Fold_{statistic}'] = f"{obs / expected:.4f}" if expected > 0 else "NA"
+            row[f'P_Enrichment_{statistic}'] = f"{(1 + (values >= obs).sum()) / (n + 1):.6g}"
+            row[f'P_Depletion_{statistic}'] = f"{(1 + (values <= obs).sum()) / (n + 1):.6g}"
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Permutation test for SD / Inspector error overlap')
+    parser.add_argument('--manifest', required=True,
+                        help='Cohort manifest TSV (optional Fai column gives contig lengths)')
+    parser.add_argument('--output', required=True, help='TSV of observed vs expected overlap and p-values')
+    parser.add_argument('--permutations', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=100, help='Shuffles per pool task')
+    parser.add_argument('--gaps', help='Gap BED to keep shuffled errors out of; may use {Sample}/{Haplotype}')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    parser.add_argument('--shared-memory', action='store_true',
+                        help='Workers attach one shared copy of each haplotype\'s parsed inputs (sd_shared_index.py)')
+    args = parser.parse_args(argv)
+
+    if args.permutations < 1 or args.batch_size < 1:
+        parser.error("--permutations and --batch-size must be positive")
+
+    rows = sd_index.read_manifest(args.manifest)
+    batches = [args.batch_size] * (args.permutations // args.batch_size)
+    if args.permutations % args.batch_size:
+        batches.append(args.permutations % args.batch_size)
+    seeds = [seed.spawn(len(batches)) for seed in np.random.SeedSequence(args.seed).spawn(len(rows))]
+
+    header = ['Sample', 'Haplotype', 'Error_Type', 'Errors', 'Permutations']
+    for statistic in STATISTICS:
+        header += [f'{prefix}_{statistic}' for prefix in ('Observed', 'Expected', 'Fold', 'P_Enrichment', 'P_Depletion')]
+    out_rows = []
+    t0 = time.time()
+    with contextlib.ExitStack() as stack, ProcessPoolExecutor(max_workers=args.threads) as pool:
+        if args.shared_memory:
+            # published once here and held for the whole run; workers attach
+            for row in rows:
+                try:
+                    stack.enter_context(sd_shared_index.shared_inputs(
+                        row['GenomicSuperDup'], row['SmallScaleErrors'], row['StructuralErrors']))
+                except (OSError, ValueError, IndexError) as e:
+                    print(f"Error sharing {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+        futures = [[pool.submit(run_batch, row, args.gaps, seed, n, args.shared_memory)
+                    for seed, n in zip(row_seeds, batches)]
+                   for row, row_seeds in zip(rows, seeds)]
+        for row, row_futures in zip(rows, futures):
+            try:
+                results = [future.result() for future in row_futures]
+            except (OSError, ValueError, IndexError, KeyError) as e:
+                print(f"Error permuting {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            names, sizes, observed = results[0][:3]
+            null = np.concatenate([result[3] for result in results])
+            nUnplaced = sum(result[4] for result in results)
+            seconds = sum(result[5] for result in results)
+            for summary in summarize(names, sizes, observed, null):
+                summary.update({'Sample': row['Sample'], 'Haplotype': row['Haplotype'], 'Permutations': len(null)})
+                out_rows.append(summary)
+            szUnplaced = f", {nUnplaced} shuffled errors could not avoid gaps" if nUnplaced else ""
+            print(f"{row['Sample']} {row['Haplotype']}: {len(null)} shuffles in {seconds:.1f} CPU s{szUnplaced}")
+
+    with open(args.output, "w") as fOut:
+        fOut.write("\t".join(header) + "\n")
+        for summary in out_rows:
+            fOut.write("\t".join(str(summary[c]) for c in header) + "\n")
+    print(f"\n{len(out_rows)} rows for {len(rows)} haplotypes in {time.time() - t0:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+# Duplication families: SD pairs linked through overlapping domains.
+#
+# Each canonical SD pair is a node; its two domains are one node by
+# definition, and two pairs are linked when a domain of one overlaps a domain
+# of the other by at least 1 bp (book-ended domains share no sequence and do
+# not link).  Families are the connected components.
+#
+# Links come from one sweep over the domains sorted on the sd_index combined
+# axis: a domain that starts before the running maximum end overlaps the
+# domain holding that maximum, so every overlap cluster is a run of the sorted
+# array and each domain only needs linking to the first domain of its run.
+# The runs are also the merged blocks of the domains, which gives each
+# family's nonredundant bp without another merge.  Components are found with
+# an array union-find (min-label hooking plus pointer jumping, O(log n)
+# rounds of vectorized passes), so a million pairs take seconds.
+#
+# A family touches an error when any member pair overlaps an Inspector error
+# (the filters' test).  Per haplotype {Sample}.{Haplotype}.sd_families.tsv has
+# one row per family, largest first, numbered from 1; --lines adds the family
+# of every GenomicSuperDup.tab line:
+#
+#   python sd_families.py --manifest cohort_manifest.tsv --output-dir families/ \
+#       --summary sd_family_summary.tsv --lines
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+
+FAMILY_COLUMNS = ['Family', 'Pairs', 'Contigs', 'Nonredundant_bp', 'Error_pairs', 'Structural_error_pairs',
+                  'Touches_error']
+SUMMARY_COLUMNS = ['Sample', 'Haplotype', 'SD_pairs', 'Families', 'Singleton_families', 'Largest_family_pairs',
+                   'Nonredundant_bp', 'Families_touching_error', 'Pairs_in_families_touching_error',
+                   'Nonredundant_bp_in_families_touching_error']
+
+
+def connected_components(n, u, v):
+    # Component label (smallest member) of each of n nodes given edges u-v
+    parent = np.arange(n, dtype=np.int64)
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    while True:
+        # every parent is a root here; hook each larger root under the
+        # smallest root it shares an edge with
+        pu, pv = parent[u], parent[v]
+        cross = pu != pv
+        if not cross.any():
+            return parent
+        u, v = u[cross], v[cross]
+        lo, hi = np.minimum(pu[cross], pv[cross]), np.maximum(pu[cross], pv[cross])
+        np.minimum.at(parent, hi, lo)
+        # compress every path to its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+
+def domain_runs(axis_start, axis_end):
+    # Sort order of the domains, the run (overlap cluster) of each sorted
+    # domain and the first sorted position and bp of every run
+    order = np.argsort(axis_start, kind='stable')
+    start = axis_start[order]
+    end = axis_end[order]
+    new_run = np.ones(len(start), dtype=bool)
+    if len(start):
+        new_run[1:] = start[1:] >= np.maximum.accumulate(end)[:-1]
+    first = np.flatnonzero(new_run)
+    run = np.cumsum(new_run) - 1
+    run_bp = (np.maximum.reduceat(end, first) - start[first]) if len(first) else np.zeros(0, dtype=np.int64)
+    return order, run, first, run_bp
+
+
+def build_families(sd, errors):
+    # Family number (1 = most pairs) of every canonical pair, and the
+    # per-family table
+    n = sd.n_pairs
+    r = sd.pair_row
+    axis_start, axis_end = sd_index.domain_axis(sd)
+    domain_pair = np.tile(np.arange(n), 2)
+    domain_contig = np.concatenate([sd.chr1[r], sd.chr2[r]])
+
+    order, run, first, run_bp = domain_runs(axis_start, axis_end)
+    sorted_pair = domain_pair[order]
+    root = connected_components(n, sorted_pair, sorted_pair[first][run])
+
+    # number families by size, ties by their smallest pair
+    roots, label, sizes = np.unique(root, return_inverse=True, return_counts=True)
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[np.lexsort((roots, -sizes))] = np.arange(len(roots))
+    family = rank[label]
+    n_families = len(roots)
+
+    error_pair = sd_index.pairs_overlap_any(sd, sd_index.IntervalIndex(errors.contig, errors.start, errors.end))
+    struct = errors.subset(errors.structural)
+    struct_pair = sd_index.pairs_overlap_any(sd, sd_index.IntervalIndex(struct.contig, struct.start, struct.end))
+
+    nContigs = len(sd.contigs)
+    family_contig = np.unique(family[domain_pair] * nContigs + domain_contig)
+    error_pairs = np.bincount(family, weights=error_pair, minlength=n_families).astype(np.int64)
+    table = {
+        'Family': np.arange(1, n_families + 1),
+        'Pairs': np.bincount(family, minlength=n_families),
+        'Contigs': np.bincount(family_contig // nContigs, minlength=n_families),
+        'Nonredundant_bp': np.bincount(family[sorted_pair[first]], weights=run_bp,
+                                       minlength=n_families).astype(np.int64),
+        'Error_pairs': error_pairs,
+        'Structural_error_pairs': np.bincount(family, weights=struct_pair, minlength=n_families).astype(np.int64),
+        'Touches_error': (error_pairs > 0).astype(np.int8),
+    }
+    return family + 1, table
+
+
+def summarize(row, n_pairs, table):
+    touched = table['Touches_error'] == 1
+    return {'Sample': row['Sample'], 'Haplotype': row['Haplotype'], 'SD_pairs': n_pairs,
+            'Families': len(table['Family']),
+            'Singleton_families': int((table['Pairs'] == 1).sum()),
+            'Largest_family_pairs': int(table['Pairs'].max()) if len(table['Pairs']) else 0,
+            'Nonredundant_bp': int(table['Nonredundant_bp'].sum()),
+            'Families_touching_error': int(touched.sum()),
+            'Pairs_in_families_touching_error': int(table['Pairs'][touched].sum()),
+            'Nonredundant_bp_in_families_touching_error': int(table['Nonredundant_bp'][touched].sum())}
+
+
+def process_row(row, output_dir, write_lines):
+    t0 = time.time()
+    contigs = sd_index.ContigCodes()
+    sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+    errors = sd_index.load_inspector_errors(row['SmallScaleErrors'], row['StructuralErrors'], contigs)
+    family, table = build_families(sd, errors)
+
+    szPrefix = os.path.join(output_dir, f"{row['Sample']}.{row['Haplotype']}")
+    with open(f"{szPrefix}.sd_families.tsv", "w") as fOut:
+        fOut.write("\t".join(FAMILY_COLUMNS) + "\n")
+        for values in zip(*(table[c].tolist() for c in FAMILY_COLUMNS)):
+            fOut.write("\t".join(map(str, values)) + "\n")
+    if write_lines:
+        with open(f"{szPrefix}.sd_family_lines.tsv", "w") as fOut:
+            fOut.write("Line\tFamily\n")
+            for nLine, nFamily in zip(sd.line.tolist(), family[sd.pair].tolist()):
+                fOut.write(f"{nLine}\t{nFamily}\n")
+    return summarize(row, sd.n_pairs, table), time.time() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cluster SD pairs into duplication families through overlapping domains')
+    parser.add_argument('--manifest', required=True)
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--summary', help='Cohort TSV with one row of family statistics per haplotype')
+    parser.add_argument('--lines', action='store_true', help='Also write the family of every SD line')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = sd_index.read_manifest(args.manifest)
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(process_row, row, args.output_dir, args.lines): row for row in rows}
+        for future, row in futures.items():
+            try:
+                summary, seconds = future.result()
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error clustering {row['Sample']} {row['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            summaries.append(summary)
+            print(f"{row['Sample']} {row['Haplotype']}: {summary['Families']} families from "
+                  f"{summary['SD_pairs']} pairs, largest {summary['Largest_family_pairs']}, "
+                  f"{summary['Families_touching_error']} touching errors ({seconds:.2f}s)")
+
+    if args.summary:
+        with open(args.summary, "w") as fSummary:
+            fSummary.write("\t".join(SUMMARY_COLUMNS) + "\n")
+            for summary in summaries:
+                fSummary.write("\t".join(str(summary[c]) for c in SUMMARY_COLUMNS) + "\n")
+
+
+if __name__ == "__main__":
+    main()
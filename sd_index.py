@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+
+# In-memory interval indexes for GenomicSuperDup.tab SD tables and Inspector
+# error BEDs.  The parsing rules mirror filter_sd_by_errors.py: 1-based line
+# numbers that count comment lines, left/right domain ordering, and the
+# HaplotypeSwitch "first coordinate" truncation of structural errors.
+
+import os
+import re
+import numpy as np
+
+# Intervals on different contigs are laid out on one axis by offsetting each
+# contig code by CONTIG_STRIDE, so a single sorted array covers an assembly.
+CONTIG_STRIDE = np.int64(1) << np.int64(40)
+
+MANIFEST_COLUMNS = ['Sample', 'Haplotype', 'GenomicSuperDup',
+                    'SmallScaleErrors', 'StructuralErrors']
+
+# 0-based GenomicSuperDup.tab fields read alongside the domains
+ALIGN_LENGTH_COLUMN = 17    # alignL
+FRAC_MATCH_COLUMN = 25      # fracMatch
+
+
+class ContigCodes:
+    """Dense integer codes for contig names, shared by every table of one assembly"""
+
+    def __init__(self):
+        self.names = []
+        self.codes = {}
+
+    def code(self, name):
+        n = self.codes.get(name)
+        if n is None:
+            n = len(self.names)
+            self.codes[name] = n
+            self.names.append(name)
+        return n
+
+    def lookup(self, name):
+        # -1 for contigs that never appeared; it matches nothing in an index
+        return self.codes.get(name, -1)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class SDTable:
+    """Parsed GenomicSuperDup.tab with left/right domains ordered like the filter scripts
+
+    Every physical SD pair is listed twice (once from each side).  `pair` maps
+    each row to its canonical pair id and `pair_row` holds one representative
+    row per pair, so overlap tests and merges can run once per pair and be
+    expanded back to rows with `per_pair[sd.pair]`.  `identity` (fracMatch,
+    NaN where absent) and `align_length` (alignL, -1 where absent) are per row.
+    """
+
+    def __init__(self, path, n_lines, line, chr1, start1, end1, chr2, start2, end2, contigs,
+                 pair=None, pair_row=None, identity=None, align_length=None):
+        self.path = path
+        self.n_lines = n_lines
+        self.line = line
+        self.chr1 = chr1
+        self.start1 = start1
+        self.end1 = end1
+        self.chr2 = chr2
+        self.start2 = start2
+        self.end2 = end2
+        self.contigs = contigs
+        if identity is None:
+            identity = np.full(len(line), np.nan)
+        if align_length is None:
+            align_length = np.full(len(line), -1, dtype=np.int64)
+        self.identity = identity
+        self.align_length = align_length
+        if pair is None:
+            pair, pair_row = canonical_pairs(chr1, start1, end1, chr2, start2, end2)
+        self.pair, self.pair_row = pair, pair_row
+
+    def __len__(self):
+        return len(self.line)
+
+    @property
+    def n_pairs(self):
+        return len(self.pair_row)
+
+    def pair_lines(self, pair_mask):
+        # Count of rows (file lines) whose pair is selected
+        return int(pair_mask[self.pair].sum())
+
+
+class ErrorTable:
+    """Inspector small-scale and structural errors as parallel arrays"""
+
+    def __init__(self, contig, start, end, type_code, structural, type_names, contigs):
+        self.contig = contig
+        self.start = start
+        self.end = end
+        self.type_code = type_code
+        self.structural = structural
+        self.type_names = type_names
+        self.contigs = contigs
+
+    def __len__(self):
+        return len(self.start)
+
+    def subset(self, mask):
+        return ErrorTable(self.contig[mask], self.start[mask], self.end[mask],
+                          self.type_code[mask], self.structural[mask],
+                          self.type_names, self.contigs)
+
+
+def canonical_pairs(chr1, start1, end1, chr2, start2, end2):
+    # Assign a pair id shared by both listings of the same SD pair.  Domains
+    # are put in (contig, start, end) order first so mirrored lines, including
+    # intra-contig pairs with equal starts, produce the same key.
+    swap = (chr1 > chr2) | ((chr1 == chr2) & ((start1 > start2) | ((start1 == start2) & (end1 > end2))))
+    keys = (np.where(swap, end1, end2), np.where(swap, start1, start2), np.where(swap, chr1, chr2),
+            np.where(swap, end2, end1), np.where(swap, start2, start1), np.where(swap, chr2, chr1))
+    order = np.lexsort(keys)
+    new_pair = np.ones(len(order), dtype=bool)
+    if len(order):
+        new_pair[1:] = np.any([k[order][1:] != k[order][:-1] for k in keys], axis=0)
+    pair = np.empty(len(order), dtype=np.int64)
+    pair[order] = np.cumsum(new_pair) - 1
+    # representative = first row (file order) of each pair
+    pair_row = np.full(int(new_pair.sum()), len(order), dtype=np.int64)
+    np.minimum.at(pair_row, pair, np.arange(len(order)))
+    return pair, pair_row
+
+
+def load_genomic_superdup(path, contigs=None, identity_column=FRAC_MATCH_COLUMN,
+                          length_column=ALIGN_LENGTH_COLUMN):
+    # Parse GenomicSuperDup.tab into domain arrays.
+    # chr1(0) start1(1) end1(2) ... chr2(6) start2(7) end2(8) ... alignL(17)
+    # ... fracMatch(25); lines too short for the last two get NaN / -1
+    if contigs is None:
+        contigs = ContigCodes()
+
+    aLine, aChr1, aStart1, aEnd1, aChr2, aStart2, aEnd2 = [], [], [], [], [], [], []
+    aIdentity, aAlignLength = [], []
+
+    with open(path, "r") as fSD:
+        n1Line = 0
+        for szLine in fSD:
+            n1Line += 1
+            if szLine.startswith('#'):
+                continue
+
+            aWords = re.split(r'\t|\n', szLine)
+            szChr1, szChr2 = aWords[0], aWords[6]
+            nStart1, nEnd1 = int(aWords[1]), int(aWords[2])
+            nStart2, nEnd2 = int(aWords[7]), int(aWords[8])
+
+            # ties on start are broken on end as in canonical_pairs, so both
+            # listings of a pair (and its pair_row) share one domain order
+            if (szChr1 > szChr2) or (szChr1 == szChr2 and (nStart1, nEnd1) > (nStart2, nEnd2)):
+                (szChr1, nStart1, nEnd1, szChr2, nStart2, nEnd2) = \
+                    (szChr2, nStart2, nEnd2, szChr1, nStart1, nEnd1)
+
+            aLine.append(n1Line)
+            aChr1.append(contigs.code(szChr1))
+            aStart1.append(nStart1)
+            aEnd1.append(nEnd1)
+            aChr2.append(contigs.code(szChr2))
+            aStart2.append(nStart2)
+            aEnd2.append(nEnd2)
+            szIdentity = aWords[identity_column] if len(aWords) > identity_column else ''
+            szLength = aWords[length_column] if len(aWords) > length_column else ''
+            aIdentity.append(float(szIdentity) if szIdentity else np.nan)
+            aAlignLength.append(int(szLength) if szLength else -1)
+
+    return SDTable(path, n1Line,
+                   np.array(aLine, dtype=np.int64),
+                   np.array(aChr1, dtype=np.int32),
+                   np.array(aStart1, dtype=np.int64),
+                   np.array(aEnd1, dtype=np.int64),
+                   np.array(aChr2, dtype=np.int32),
+                   np.array(aStart2, dtype=np.int64),
+                   np.array(aEnd2, dtype=np.int64),
+                   contigs,
+                   identity=np.array(aIdentity, dtype=np.float64),
+                   align_length=np.array(aAlignLength, dtype=np.int64))
+
+
+def load_inspector_errors(small_path, struct_path, contigs=None):
+    # Parse Inspector's small_scale_error.bed and structural_error.bed.
+    # Either path may be None to load only one category.
+    if contigs is None:
+        contigs = ContigCodes()
+
+    type_names = []
+    type_codes = {}
+    aContig, aStart, aEnd, aType, aStructural = [], [], [], [], []
+
+    for path, bStructural, nTypeColumn in ((small_path, False, 7), (struct_path, True, 4)):
+        if path is None:
+            continue
+        with open(path, "r") as fErrors:
+            for line in fErrors:
+                if line.startswith('#'):
+                    continue
+                fields = line.strip().split('\t')
+                if len(fields) < 3:
+                    continue
+
+                # HaplotypeSwitch positions are semicolon lists; keep the first
+                start_pos = int(fields[1].split(';')[0])
+                end_pos = int(fields[2].split(';')[0])
+
+                szType = fields[nTypeColumn] if len(fields) > nTypeColumn else 'Unknown'
+                nType = type_codes.get(szType)
+                if nType is None:
+                    nType = len(type_names)
+                    type_codes[szType] = nType
+                    type_names.append(szType)
+
+                aContig.append(contigs.code(fields[0]))
+                aStart.append(start_pos)
+                aEnd.append(end_pos)
+                aType.append(nType)
+                aStructural.append(bStructural)
+
+    return ErrorTable(np.array(aContig, dtype=np.int32),
+                      np.array(aStart, dtype=np.int64),
+                      np.array(aEnd, dtype=np.int64),
+                      np.array(aType, dtype=np.int16),
+                      np.array(aStructural, dtype=bool),
+                      type_names, contigs)
+
+
+def load_bed_intervals(path, contigs):
+    # (contig, start, end) arrays of any BED3+ file, skipping comment,
+    # track and browser lines
+    aContig, aStart, aEnd = [], [], []
+    with open(path, "r") as fBed:
+        for line in fBed:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.split('\t', 3)
+            aContig.append(contigs.code(fields[0]))
+            aStart.append(int(fields[1]))
+            aEnd.append(int(fields[2]))
+    return (np.array(aContig, dtype=np.int32),
+            np.array(aStart, dtype=np.int64),
+            np.array(aEnd, dtype=np.int64))
+
+
+def to_axis(contig, start, end, bedtools_zero_length=True):
+    # Map (contig, start, end) onto the single combined coordinate axis.
+    # bedtools widens zero-length records to [start-1, end+1) before testing
+    # overlap; do the same so results match `bedtools intersect`.
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    if bedtools_zero_length:
+        zero = start == end
+        if zero.any():
+            start = np.where(zero, start - 1, start)
+            end = np.where(zero, end + 1, end)
+    offset = np.asarray(contig, dtype=np.int64) * CONTIG_STRIDE
+    return offset + start, offset + end
+
+
+class IntervalIndex:
+    """Sorted intervals with a running maximum end for searchsorted overlap queries"""
+
+    def __init__(self, contig, start, end, bedtools_zero_length=True):
+        axis_start, axis_end = to_axis(contig, start, end, bedtools_zero_length)
+        self.order = np.argsort(axis_start, kind='stable')
+        self.starts = axis_start[self.order]
+        self.ends = axis_end[self.order]
+        self.max_end = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+        self.bedtools_zero_length = bedtools_zero_length
+
+    @classmethod
+    def from_sorted(cls, order, starts, ends, max_end, bedtools_zero_length=True):
+        # Wrap arrays of an index built earlier (e.g. shared memory) as-is
+        index = cls.__new__(cls)
+        index.order, index.starts, index.ends, index.max_end = order, starts, ends, max_end
+        index.bedtools_zero_length = bedtools_zero_length
+        return index
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps_any(self, contig, start, end):
+        # Boolean per query: does it overlap at least one indexed interval
+        # (`bedtools intersect -u` semantics, half-open coordinates)
+        q_start, q_end = to_axis(contig, start, end, self.bedtools_zero_length)
+        if len(self.starts) == 0:
+            return np.zeros(len(q_start), dtype=bool)
+        n_before = np.searchsorted(self.starts, q_end, side='left')
+        has_candidate = n_before > 0
+        result = np.zeros(len(q_start), dtype=bool)
+        result[has_candidate] = self.max_end[n_before[has_candidate] - 1] > q_start[has_candidate]
+        return result
+
+    def query(self, contig, start, end):
+        # Original row indices of every interval overlapping one region
+        q_start, q_end = to_axis([contig], [start], [end], self.bedtools_zero_length)
+        hi = np.searchsorted(self.starts, q_end[0], side='left')
+        lo = np.searchsorted(self.max_end, q_start[0], side='right')
+        if lo >= hi:
+            return np.zeros(0, dtype=np.int64)
+        hits = lo + np.nonzero(self.ends[lo:hi] > q_start[0])[0]
+        return np.sort(self.order[hits])
+
+
+def iter_overlap_pairs(q_start, q_end, t_start, t_end, max_pairs=1 << 24):
+    # All (query, target) index pairs whose axis intervals overlap, yielded in
+    # chunks of at most ~max_pairs candidates so memory stays bounded.
+    # Targets are bucketed by length (powers of two) so a few very long
+    # intervals do not widen the search window for every query.
+    if len(q_start) == 0 or len(t_start) == 0:
+        return
+    t_len = np.maximum(t_end - t_start, 1)
+    bucket = np.floor(np.log2(t_len)).astype(np.int64)
+    for b in np.unique(bucket):
+        members = np.nonzero(bucket == b)[0]
+        order = members[np.argsort(t_start[members], kind='stable')]
+        starts = t_start[order]
+        ends = t_end[order]
+        max_len = int((ends - starts).max())
+        lo = np.searchsorted(starts, q_start - max_len, side='right')
+        hi = np.searchsorted(starts, q_end, side='left')
+        counts = np.maximum(hi - lo, 0)
+        cum = np.cumsum(counts)
+        first = 0
+        while first < len(q_start):
+            # take queries until the candidate budget is used up
+            base = cum[first - 1] if first else 0
+            last = int(np.searchsorted(cum, base + max_pairs, side='right'))
+            last = min(max(last, first + 1), len(q_start))
+            qi = np.repeat(np.arange(first, last), counts[first:last])
+            if len(qi):
+                offsets = np.concatenate([[0], np.cumsum(counts[first:last])])[:-1]
+                within = np.arange(len(qi)) - np.repeat(offsets, counts[first:last])
+                ti = lo[qi] + within
+                keep = (ends[ti] > q_start[qi]) & (starts[ti] < q_end[qi])
+                yield qi[keep], order[ti[keep]]
+            first = last
+
+
+def merge_axis(axis_start, axis_end):
+    # Merge intervals already on the combined axis into sorted disjoint blocks
+    # (overlapping and book-ended intervals are merged, as `bedtools merge` does)
+    if len(axis_start) == 0:
+        return axis_start, axis_end
+    order = np.argsort(axis_start, kind='stable')
+    axis_start = axis_start[order]
+    axis_end = np.maximum.accumulate(axis_end[order])
+    # a new merged block starts wherever the start passes every earlier end
+    new_block = np.ones(len(axis_start), dtype=bool)
+    new_block[1:] = axis_start[1:] > axis_end[:-1]
+    return axis_start[new_block], axis_end[np.append(new_block[1:], True)]
+
+
+def merged_length(contig, start, end):
+    # Non-redundant bp of a set of intervals
+    axis_start, axis_end = to_axis(contig, start, end, bedtools_zero_length=False)
+    block_start, block_end = merge_axis(axis_start, axis_end)
+    return int((block_end - block_start).sum())
+
+
+def covered_before(block_start, block_end, x):
+    # Prefix sum of merged coverage: bp of the disjoint sorted blocks lying
+    # below each axis position x
+    x = np.asarray(x, dtype=np.int64)
+    if len(block_start) == 0:
+        return np.zeros(x.shape, dtype=np.int64)
+    lengths = block_end - block_start
+    cum = np.concatenate([[0], np.cumsum(lengths)])
+    k = np.searchsorted(block_start, x, side='right')
+    last = np.maximum(k - 1, 0)
+    partial = np.where(k > 0, np.minimum(x - block_start[last], lengths[last]), 0)
+    return cum[last] + np.maximum(partial, 0)
+
+
+def pairs_overlap_any(sd, index):
+    # Per canonical SD pair: does either domain overlap the index
+    r = sd.pair_row
+    return (index.overlaps_any(sd.chr1[r], sd.start1[r], sd.end1[r]) |
+            index.overlaps_any(sd.chr2[r], sd.start2[r], sd.end2[r]))
+
+
+def domains_overlap_any(sd, index):
+    # Per SD line: does either domain overlap the index (filter decision),
+    # computed once per pair and expanded to both of its lines
+    return pairs_overlap_any(sd, index)[sd.pair]
+
+
+def domain_axis(sd, rows=None):
+    # Both domains of the selected SD rows on the combined axis; by default
+    # one row per canonical pair, which covers the same sequence
+    if rows is None:
+        rows = sd.pair_row
+    start1, end1 = to_axis(sd.chr1[rows], sd.start1[rows], sd.end1[rows], bedtools_zero_length=False)
+    start2, end2 = to_axis(sd.chr2[rows], sd.start2[rows], sd.end2[rows], bedtools_zero_length=False)
+    return np.concatenate([start1, start2]), np.concatenate([end1, end2])
+
+
+def read_fai(path, contigs):
+    # Contig lengths from a samtools .fai index, as an array indexed by
+    # contig code (contigs missing from the index get length 0)
+    lengths = {}
+    with open(path, "r") as fFai:
+        for line in fFai:
+            fields = line.split('\t')
+            if len(fields) >= 2:
+                lengths[contigs.code(fields[0])] = int(fields[1])
+    aLengths = np.zeros(len(contigs), dtype=np.int64)
+    for nCode, nLength in lengths.items():
+        aLengths[nCode] = nLength
+    return aLengths
+
+
+def read_manifest(path):
+    # Cohort manifest: tab-separated with a header naming at least
+    # MANIFEST_COLUMNS.  Extra columns are passed through.
+    rows = []
+    with open(path, "r") as fManifest:
+        header = fManifest.readline().rstrip('\n').split('\t')
+        missing = [c for c in MANIFEST_COLUMNS if c not in header]
+        if missing:
+            raise ValueError(f"{path}: manifest is missing columns {', '.join(missing)}")
+        for line in fManifest:
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            rows.append(dict(zip(header, fields)))
+    return rows
+
+
+def file_signature(*paths):
+    # (size, mtime) for each existing path; used to detect changed inputs
+    signature = []
+    for path in paths:
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            signature.append((path, st.st_size, st.st_mtime_ns))
+        else:
+            signature.append((path, None, None))
+    return tuple(signature)
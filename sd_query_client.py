@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Small client for sd_query_server.py, usable from notebooks and from R.
+#
+# Python:
+#   import sd_query_client as sdq
+#   sdq.region('UPIS220008', 'hap1', 'h1tg000001l', 1000000, 2000000)
+#
+# R (TSV straight from the server, or through this script):
+#   read_tsv("http://127.0.0.1:8765/sample?sample=UPIS220008&format=tsv")
+#   read_tsv(pipe("python sd_query_client.py sample --sample UPIS220008"))
+#
+# region returns two tables (sds and errors); its TSV needs table=sds or
+# table=errors (--table here).
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+from urllib.parse import urlencode
+
+DEFAULT_ADDRESS = os.environ.get('SD_QUERY_SERVER', '127.0.0.1:8765')
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connect(address):
+    # "host:port" for TCP, anything containing '/' is a Unix socket path
+    if '/' in address:
+        return UnixHTTPConnection(address)
+    host, _, port = address.partition(':')
+    return http.client.HTTPConnection(host, int(port or 8765), timeout=60)
+
+
+def query(endpoint, address=None, fmt='json', **params):
+    # Send one query; returns the decoded JSON or the raw TSV text
+    params = {k: v for k, v in params.items() if v is not None}
+    params['format'] = fmt
+    conn = _connect(address or DEFAULT_ADDRESS)
+    try:
+        conn.request('GET', f"/{endpoint}?{urlencode(params)}")
+        response = conn.getresponse()
+        body = response.read().decode()
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise RuntimeError(f"{endpoint} query failed ({response.status}): {body}")
+    return json.loads(body) if fmt == 'json' else body
+
+
+def samples(address=None):
+    return query('samples', address)['haplotypes']
+
+
+def sample(name, address=None):
+    return query('sample', address, sample=name)['haplotypes']
+
+
+def region(sample, haplotype, contig, start, end, status=None, address=None):
+    # SD lines with a domain in the region, plus the errors in it.
+    # status='removed' or 'retained' restricts to the all-errors filter outcome.
+    return query('region', address, sample=sample, haplotype=haplotype,
+                 contig=contig, start=start, end=end, status=status)
+
+
+def contig(sample, haplotype, contig, address=None):
+    return query('contig', address, sample=sample, haplotype=haplotype, contig=contig)
+
+
+def filter_status(sample, haplotype, lines, address=None):
+    lines = ','.join(str(n) for n in lines)
+    return query('filter_status', address, sample=sample, haplotype=haplotype, line=lines)['sds']
+
+
+def as_frame(result, key=None):
+    # Convert a list-valued result field to a pandas DataFrame
+    import pandas as pd
+    if key is None:
+        key = next(k for k, v in result.items() if isinstance(v, list))
+    return pd.DataFrame(result[key])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a running sd_query_server.py; prints TSV')
+    parser.add_argument('query', choices=['samples', 'sample', 'region', 'contig', 'filter_status'])
+    parser.add_argument('--address', default=None,
+                        help='host:port or Unix socket path (default $SD_QUERY_SERVER or 127.0.0.1:8765)')
+    parser.add_argument('--sample')
+    parser.add_argument('--haplotype')
+    parser.add_argument('--contig')
+    parser.add_argument('--start', type=int)
+    parser.add_argument('--end', type=int)
+    parser.add_argument('--status', choices=['removed', 'retained'])
+    parser.add_argument('--line', help='Comma-separated 1-based SD line numbers')
+    parser.add_argument('--table', help='List field to print when the result has several (region: sds, errors)')
+    args = parser.parse_args()
+
+    sys.stdout.write(query(args.query, args.address, fmt='tsv',
+                           sample=args.sample, haplotype=args.haplotype, contig=args.contig,
+                           start=args.start, end=args.end, status=args.status, line=args.line,
+                           table=args.table))
+
+
+if __name__ == "__main__":
+    main()
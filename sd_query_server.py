@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+
+# Long-running local query service over the cohort's SD tables and Inspector
+# errors.  Every (sample, haplotype) in the manifest is parsed once into
+# sd_index arrays; region, sample, contig and filter-status queries are then
+# answered from memory.  Inputs are polled and re-indexed when they change.
+#
+# python sd_query_server.py --manifest cohort_manifest.tsv --port 8765
+# python sd_query_server.py --manifest cohort_manifest.tsv --socket /tmp/sdq.sock
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import sd_index
+
+
+class HaplotypeIndex:
+    """All indexes for one sample/haplotype, built once per input signature"""
+
+    def __init__(self, row):
+        self.sample = row['Sample']
+        self.haplotype = row['Haplotype']
+        self.paths = (row['GenomicSuperDup'], row['SmallScaleErrors'], row['StructuralErrors'])
+        self.signature = sd_index.file_signature(*self.paths)
+
+        contigs = sd_index.ContigCodes()
+        self.sd = sd_index.load_genomic_superdup(row['GenomicSuperDup'], contigs)
+        self.errors = sd_index.load_inspector_errors(row['SmallScaleErrors'],
+                                                     row['StructuralErrors'], contigs)
+        self.contigs = contigs
+
+        sd = self.sd
+        self.error_index = sd_index.IntervalIndex(self.errors.contig, self.errors.start, self.errors.end)
+        struct = self.errors.subset(self.errors.structural)
+        struct_index = sd_index.IntervalIndex(struct.contig, struct.start, struct.end)
+
+        # filter status per SD line, same decision as the two filter scripts
+        self.pair_removed_all = sd_index.pairs_overlap_any(sd, self.error_index)
+        self.pair_removed_structural = sd_index.pairs_overlap_any(sd, struct_index)
+        self.removed_all = self.pair_removed_all[sd.pair]
+        self.removed_structural = self.pair_removed_structural[sd.pair]
+
+        # one index over both domains; row i and i + len(sd) are the same SD line
+        self.domain_index = sd_index.IntervalIndex(np.concatenate([sd.chr1, sd.chr2]),
+                                                   np.concatenate([sd.start1, sd.start2]),
+                                                   np.concatenate([sd.end1, sd.end2]))
+        self.row_of_line = np.full(sd.n_lines + 1, -1, dtype=np.int64)
+        self.row_of_line[sd.line] = np.arange(len(sd))
+
+    def sd_rows(self, rows):
+        sd = self.sd
+        names = self.contigs.names
+        return [{'line': int(sd.line[i]),
+                 'chr1': names[sd.chr1[i]], 'start1': int(sd.start1[i]), 'end1': int(sd.end1[i]),
+                 'chr2': names[sd.chr2[i]], 'start2': int(sd.start2[i]), 'end2': int(sd.end2[i]),
+                 'removed_all_errors': bool(self.removed_all[i]),
+                 'removed_structural_errors': bool(self.removed_structural[i])}
+                for i in rows]
+
+    def error_rows(self, rows):
+        err = self.errors
+        names = self.contigs.names
+        return [{'contig': names[err.contig[i]], 'start': int(err.start[i]), 'end': int(err.end[i]),
+                 'type': err.type_names[err.type_code[i]],
+                 'category': 'structural' if err.structural[i] else 'small_scale'}
+                for i in rows]
+
+    def summary(self):
+        return {'sample': self.sample, 'haplotype': self.haplotype,
+                'SD_lines': len(self.sd),
+                'SD_pairs': self.sd.n_pairs,
+                'pairs_removed_all_errors': int(self.pair_removed_all.sum()),
+                'pairs_removed_structural_errors': int(self.pair_removed_structural.sum()),
+                'errors': len(self.errors),
+                'structural_errors': int(self.errors.structural.sum())}
+
+
+class Cohort:
+    """Manifest-backed map of (sample, haplotype) -> HaplotypeIndex with hot reload"""
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.reload()
+
+    def reload(self):
+        # Rebuild only entries whose input files changed; swap the dict whole so
+        # readers never see a half-built cohort.
+        rows = sd_index.read_manifest(self.manifest_path)
+        current = self.indexes
+        updated = {}
+        for row in rows:
+            key = (row['Sample'], row['Haplotype'])
+            paths = (row['GenomicSuperDup'], row['SmallScaleErrors'], row['StructuralErrors'])
+            old = current.get(key)
+            if old is not None and old.paths == paths and old.signature == sd_index.file_signature(*paths):
+                updated[key] = old
+                continue
+            try:
+                t0 = time.time()
+                updated[key] = HaplotypeIndex(row)
+                print(f"indexed {key[0]} {key[1]} in {time.time() - t0:.2f}s", file=sys.stderr)
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error indexing {key[0]} {key[1]}: {e}", file=sys.stderr)
+                if old is not None:
+                    updated[key] = old
+        with self.lock:
+            self.indexes = updated
+
+    def watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                print(f"Error reloading manifest: {e}", file=sys.stderr)
+
+    def get(self, sample, haplotype):
+        with self.lock:
+            return self.indexes.get((sample, haplotype))
+
+    def haplotypes(self, sample=None):
+        with self.lock:
+            entries = list(self.indexes.values())
+        return [h for h in entries if sample is None or h.sample == sample]
+
+
+def query_region(cohort, params):
+    hap = _haplotype(cohort, params)
+    contig = hap.contigs.lookup(params['contig'])
+    start, end = int(params['start']), int(params['end'])
+    hits = hap.domain_index.query(contig, start, end)
+    rows = np.unique(hits % len(hap.sd)) if len(hap.sd) else hits
+    status = params.get('status')
+    if status == 'removed':
+        rows = rows[hap.removed_all[rows]]
+    elif status == 'retained':
+        rows = rows[~hap.removed_all[rows]]
+    return {'sds': hap.sd_rows(rows),
+            'errors': hap.error_rows(hap.error_index.query(contig, start, end))}
+
+
+def query_sample(cohort, params):
+    return {'haplotypes': [h.summary() for h in cohort.haplotypes(params['sample'])]}
+
+
+def query_contig(cohort, params):
+    hap = _haplotype(cohort, params)
+    contig = hap.contigs.lookup(params['contig'])
+    sd, err = hap.sd, hap.errors
+    on_contig = (sd.chr1 == contig) | (sd.chr2 == contig)
+    err_on_contig = err.contig == contig
+    types = np.bincount(err.type_code[err_on_contig], minlength=len(err.type_names))
+    return {'contig': params['contig'],
+            'SD_lines': int(on_contig.sum()),
+            'SD_lines_removed_all_errors': int((on_contig & hap.removed_all).sum()),
+            'SD_lines_removed_structural_errors': int((on_contig & hap.removed_structural).sum()),
+            'errors': int(err_on_contig.sum()),
+            'errors_by_type': {name: int(n) for name, n in zip(err.type_names, types) if n}}
+
+
+def query_filter_status(cohort, params):
+    hap = _haplotype(cohort, params)
+    lines = np.array([int(x) for x in params['line'].split(',')], dtype=np.int64)
+    valid = (lines > 0) & (lines <= hap.sd.n_lines)
+    rows = np.full(len(lines), -1, dtype=np.int64)
+    rows[valid] = hap.row_of_line[lines[valid]]
+    return {'sds': hap.sd_rows(rows[rows >= 0])}
+
+
+def query_samples(cohort, params):
+    return {'haplotypes': [h.summary() for h in cohort.haplotypes()]}
+
+
+QUERIES = {
+    '/samples': query_samples,
+    '/sample': query_sample,
+    '/region': query_region,
+    '/contig': query_contig,
+    '/filter_status': query_filter_status,
+}
+
+
+def _haplotype(cohort, params):
+    hap = cohort.get(params['sample'], params['haplotype'])
+    if hap is None:
+        raise KeyError(f"{params['sample']} {params['haplotype']} is not indexed")
+    return hap
+
+
+def to_tsv(result, table=None):
+    # Flatten one list-valued field of a result into TSV for R's read_tsv.
+    # Results with several lists (region: sds and errors) need table= to pick
+    # one, since a single TSV cannot hold both.
+    lists = [k for k, v in result.items() if isinstance(v, list)]
+    if table is not None:
+        if table not in lists:
+            raise ValueError(f"table={table}: expected one of {', '.join(lists) or 'none'}")
+        lists = [table]
+    elif len(lists) > 1:
+        raise ValueError(f"format=tsv needs table= for this query: one of {', '.join(lists)}")
+    if lists:
+        value = result[lists[0]]
+        if not value:
+            return ""
+        header = list(value[0].keys())
+        lines = ["\t".join(header)]
+        lines += ["\t".join(str(row[c]) for c in header) for row in value]
+        return "\n".join(lines) + "\n"
+    return "\n".join(f"{k}\t{v}" for k, v in result.items()) + "\n"
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        handler = QUERIES.get(url.path)
+        if handler is None:
+            self._send(404, {'error': f"unknown query {url.path}"}, 'json')
+            return
+        fmt = params.pop('format', 'json')
+        table = params.pop('table', None)
+        try:
+            result = handler(self.server.cohort, params)
+            if fmt == 'tsv':
+                result = to_tsv(result, table)
+        except KeyError as e:
+            self._send(400, {'error': f"missing or unknown parameter: {e}"}, 'json')
+            return
+        except ValueError as e:
+            self._send(400, {'error': str(e)}, 'json')
+            return
+        self._send(200, result, fmt)
+
+    def _send(self, status, result, fmt):
+        # result is already TSV text for fmt == 'tsv'
+        if fmt == 'tsv':
+            body = result.encode()
+            content_type = 'text/tab-separated-values'
+        else:
+            body = json.dumps(result).encode()
+            content_type = 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix sockets have no peer address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+
+class UnixQueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve SD/error queries from in-memory indexes')
+    parser.add_argument('--manifest', required=True,
+                        help='TSV with Sample, Haplotype, GenomicSuperDup, SmallScaleErrors, StructuralErrors')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help='Serve on this Unix socket instead of TCP')
+    parser.add_argument('--reload-interval', type=float, default=30.0,
+                        help='Seconds between checks for changed input files (0 disables)')
+    args = parser.parse_args()
+
+    cohort = Cohort(args.manifest)
+    print(f"Indexed {len(cohort.haplotypes())} haplotypes", file=sys.stderr)
+
+    if args.reload_interval > 0:
+        threading.Thread(target=cohort.watch, args=(args.reload_interval,), daemon=True).start()
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = UnixQueryServer(args.socket, QueryHandler)
+        print(f"Listening on {args.socket}", file=sys.stderr)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+        print(f"Listening on http://{args.host}:{args.port}", file=sys.stderr)
+    server.cohort = cohort
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+# Selection vectors: compact stand-ins for BED files that are line subsets
+# of a GenomicSuperDup.tab.
+#
+# A selection (.sel.npz) holds a packed bitmap over the source's 1-based
+# line numbers plus the source path and its size/mtime.  A line index
+# (.lineidx.npz, one per source) holds the byte offset of every line and
+# which lines are comments, so selected lines can be read back with mmap
+# slices instead of rescanning the table.  Text is only produced when asked:
+#
+#   import sd_selection
+#   sel = sd_selection.Selection('UPIS220008.hap1.filtered_SDs.sel.npz')
+#   sel.lines()                      # 1-based line numbers
+#   for line in sel.iter_lines(): ...
+#   sel.write_text('UPIS220008.hap1.filtered_SDs.bed')
+#
+#   python sd_selection.py UPIS220008.hap1.filtered_SDs.sel.npz > filtered.bed
+#   python sd_selection.py --count *.sel.npz
+
+import argparse
+import mmap
+import os
+import sys
+
+import numpy as np
+
+SELECTION_SUFFIX = '.sel.npz'
+LINE_INDEX_SUFFIX = '.lineidx.npz'
+
+
+def selection_path(szBed):
+    # X.bed -> X.sel.npz
+    return (szBed[:-len('.bed')] if szBed.endswith('.bed') else szBed) + SELECTION_SUFFIX
+
+
+def _signature(path):
+    st = os.stat(path)
+    return np.int64(st.st_size), np.int64(st.st_mtime_ns)
+
+
+def build_line_index(path, chunk_size=1 << 26):
+    # (offsets, comment): offsets[i] is the byte where line i + 1 starts and
+    # offsets[-1] is the file size; comment[i] is True for '#' lines
+    size = os.path.getsize(path)
+    parts = [np.zeros(1, dtype=np.int64)]
+    comment = np.zeros(0, dtype=bool)
+    if size:
+        with open(path, "rb") as fSource, mmap.mmap(fSource.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for nOffset in range(0, size, chunk_size):
+                buf = np.frombuffer(mm, dtype=np.uint8, count=min(chunk_size, size - nOffset), offset=nOffset)
+                parts.append(np.flatnonzero(buf == ord('\n')).astype(np.int64) + nOffset + 1)
+                del buf
+            offsets = np.concatenate(parts)
+            if offsets[-1] != size:
+                # last line without a trailing newline
+                offsets = np.append(offsets, size)
+            first_bytes = np.frombuffer(mm, dtype=np.uint8)
+            comment = first_bytes[offsets[:-1]] == ord('#')
+            del first_bytes
+    else:
+        offsets = parts[0]
+    return offsets, comment
+
+
+def ensure_line_index(szSource, szIndex):
+    # Write szIndex for szSource unless an up-to-date one exists
+    size, mtime = _signature(szSource)
+    if os.path.exists(szIndex):
+        with np.load(szIndex) as index:
+            if index['source_size'] == size and index['source_mtime_ns'] == mtime:
+                return szIndex
+    offsets, comment = build_line_index(szSource)
+    np.savez_compressed(szIndex, offsets=offsets, comment=np.packbits(comment), n_lines=np.int64(len(comment)),
+                        source=np.array(os.path.abspath(szSource)), source_size=size, source_mtime_ns=mtime)
+    return szIndex
+
+
+def load_line_index(szIndex):
+    # (offsets, comment mask) of a line index
+    with np.load(szIndex) as index:
+        n = int(index['n_lines'])
+        return index['offsets'], np.unpackbits(index['comment'], count=n).astype(bool)
+
+
+def write_selection(szPath, szSource, szIndex, mask, name=None):
+    # mask is indexed by 1-based line number (mask[0] is ignored), as the
+    # filter scripts' np.zeros(n + 1) masks are
+    mask = np.asarray(mask, dtype=bool)
+    size, mtime = _signature(szSource)
+    np.savez(szPath, bits=np.packbits(mask[1:]), n_lines=np.int64(len(mask) - 1),
+             n_selected=np.int64(mask[1:].sum()),
+             source=np.array(os.path.abspath(szSource)), line_index=np.array(os.path.abspath(szIndex)),
+             source_size=size, source_mtime_ns=mtime,
+             name=np.array(name or os.path.basename(szPath)[:-len(SELECTION_SUFFIX)]))
+    return szPath
+
+
+def write_split(szSource, szIndex, matched, szMatched, szUnmatched, skip_comments):
+    # Selection counterpart of copying szSource's lines into a matched and an
+    # unmatched BED: matched is a mask by 1-based line number, szMatched may
+    # be None, and comment lines go to neither side when skip_comments is set
+    ensure_line_index(szSource, szIndex)
+    _, comment = load_line_index(szIndex)
+    aMatched = np.zeros(len(comment) + 1, dtype=bool)
+    aMatched[:len(matched)] = np.asarray(matched, dtype=bool)[:len(aMatched)]
+    aUnmatched = ~aMatched
+    aUnmatched[0] = False
+    if skip_comments:
+        aUnmatched[1:] &= ~comment
+    if szMatched:
+        write_selection(szMatched, szSource, szIndex, aMatched)
+    write_selection(szUnmatched, szSource, szIndex, aUnmatched)
+    return int(aMatched.sum()), int(aUnmatched.sum())
+
+
+class Selection:
+    """A line subset of a GenomicSuperDup.tab, read back lazily"""
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as data:
+            self._bits = data['bits']
+            self.n_lines = int(data['n_lines'])
+            self.n_selected = int(data['n_selected'])
+            self.source = str(data['source'])
+            self.line_index = str(data['line_index'])
+            self.name = str(data['name'])
+            self._signature = (int(data['source_size']), int(data['source_mtime_ns']))
+        self._mask = None
+
+    def __len__(self):
+        return self.n_selected
+
+    @property
+    def mask(self):
+        # Boolean per 1-based line number; index 0 is always False
+        if self._mask is None:
+            self._mask = np.zeros(self.n_lines + 1, dtype=bool)
+            self._mask[1:] = np.unpackbits(self._bits, count=self.n_lines).astype(bool)
+        return self._mask
+
+    def lines(self):
+        return np.flatnonzero(self.mask)
+
+    def check_source(self):
+        if tuple(int(x) for x in _signature(self.source)) != self._signature:
+            raise ValueError(f"{self.source} changed since {self.path} was written")
+
+    def iter_chunks(self):
+        # Raw bytes of each run of consecutive selected lines, in file order
+        self.check_source()
+        offsets, _ = load_line_index(self.line_index)
+        lines = self.lines()
+        if len(lines) == 0:
+            return
+        run_start = np.concatenate([[True], np.diff(lines) != 1])
+        firsts = lines[run_start]
+        lasts = lines[np.append(run_start[1:], True)]
+        with open(self.source, "rb") as fSource, mmap.mmap(fSource.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for nFirst, nLast in zip(firsts.tolist(), lasts.tolist()):
+                yield mm[offsets[nFirst - 1]:offsets[nLast]]
+
+    def iter_lines(self):
+        # Selected lines as text, newline included, without reading the rest
+        for chunk in self.iter_chunks():
+            yield from chunk.decode().splitlines(keepends=True)
+
+    def write_text(self, szOutput):
+        # Materialize the BED copy the filters used to write
+        with open(szOutput, "wb") as fOut:
+            for chunk in self.iter_chunks():
+                fOut.write(chunk)
+        return szOutput
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the lines a selection vector stands for')
+    parser.add_argument('selections', nargs='+', help='.sel.npz files')
+    parser.add_argument('--count', action='store_true', help='Only print selected/total line counts')
+    parser.add_argument('--output', help='Write the (single) selection here instead of stdout')
+    args = parser.parse_args()
+
+    if args.output and len(args.selections) != 1:
+        parser.error("--output takes exactly one selection")
+
+    for path in args.selections:
+        sel = Selection(path)
+        if args.count:
+            print(f"{path}\t{len(sel)}\t{sel.n_lines}\t{sel.source}")
+            continue
+        try:
+            sel.check_source()
+        except (OSError, ValueError) as e:
+            sys.exit(f"sd_selection.py: {e}")
+        if args.output:
+            sel.write_text(args.output)
+        else:
+            for chunk in sel.iter_chunks():
+                sys.stdout.buffer.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+# Out-of-core, contig-pair sharded matching of two SD callsets for
+# filter_asm_qc.py.
+#
+# Two SDs can only match (reciprocal overlap of both domains) when their
+# ordered (chr1, chr2) contig pairs are identical, so each callset is split
+# by contig pair into spill files in one streaming pass.  Shards are matched
+# independently in worker processes, each under its own memory budget.
+# Matching keeps, for every SD, the partner with the best minimum reciprocal
+# overlap across both domains, so any threshold (or a whole grid of them)
+# can be applied afterwards.  The sorted per-shard line numbers are
+# stream-merged back into the three output BEDs.
+
+import heapq
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sd_index
+import sd_selection
+
+# rough bytes of working memory per candidate pair while matching
+BYTES_PER_CANDIDATE = 96
+
+
+def shard_path(shard_dir, tag, n_shard):
+    return os.path.join(shard_dir, f"{tag}.{n_shard:04d}.tsv")
+
+
+def partition_callset(szGenomicSuperDup, shard_dir, tag, n_shards):
+    # Stream one callset into per-contig-pair spill files.  Each spill line is
+    # chr1 start1 end1 chr2 start2 end2 line with the domains ordered as in
+    # the legacy path.  Returns the number of lines read.
+    aFiles = [open(shard_path(shard_dir, tag, n), "w") for n in range(n_shards)]
+    try:
+        with open(szGenomicSuperDup, "r") as fSD:
+            n1Line = 0
+            for szLine in fSD:
+                n1Line += 1
+                if szLine.startswith('#'):
+                    continue
+
+                aWords = szLine.split('\t')
+                szChr1, szChr2 = aWords[0], aWords[6]
+                nStart1, nEnd1 = int(aWords[1]), int(aWords[2])
+                nStart2, nEnd2 = int(aWords[7]), int(aWords[8])
+
+                if (szChr1 > szChr2) or (szChr1 == szChr2 and nStart1 > nStart2):
+                    (szChr1, nStart1, nEnd1, szChr2, nStart2, nEnd2) = \
+                        (szChr2, nStart2, nEnd2, szChr1, nStart1, nEnd1)
+
+                szPair = szChr1 + "\t" + szChr2
+                nShard = zlib.crc32(szPair.encode()) % n_shards
+                aFiles[nShard].write(f"{szChr1}\t{nStart1}\t{nEnd1}\t{szChr2}\t{nStart2}\t{nEnd2}\t{n1Line}\n")
+    finally:
+        for f in aFiles:
+            f.close()
+    return n1Line
+
+
+def load_shard(path, pair_codes):
+    # Read a spill file into arrays; contig pairs are coded through the
+    # shard-wide pair_codes dict so both callsets share codes
+    aPair, aStart1, aEnd1, aStart2, aEnd2, aLine = [], [], [], [], [], []
+    with open(path, "r") as fShard:
+        for szLine in fShard:
+            aWords = szLine.rstrip('\n').split('\t')
+            szPair = aWords[0] + "\t" + aWords[3]
+            nCode = pair_codes.get(szPair)
+            if nCode is None:
+                nCode = len(pair_codes)
+                pair_codes[szPair] = nCode
+            aPair.append(nCode)
+            aStart1.append(int(aWords[1]))
+            aEnd1.append(int(aWords[2]))
+            aStart2.append(int(aWords[4]))
+            aEnd2.append(int(aWords[5]))
+            aLine.append(int(aWords[6]))
+    return {'pair': np.array(aPair, dtype=np.int64),
+            'start1': np.array(aStart1, dtype=np.int64),
+            'end1': np.array(aEnd1, dtype=np.int64),
+            'start2': np.array(aStart2, dtype=np.int64),
+            'end2': np.array(aEnd2, dtype=np.int64),
+            'line': np.array(aLine, dtype=np.int64)}
+
+
+def reciprocal_fraction(a_start, a_end, b_start, b_end):
+    # Overlap as a fraction of the longer of the two intervals, i.e. the
+    # largest f for which `bedtools intersect -f f -F f` reports the pair
+    overlap = np.minimum(a_end, b_end) - np.maximum(a_start, b_start)
+    longer = np.maximum(np.maximum(a_end - a_start, b_end - b_start), 1)
+    return np.maximum(overlap, 0) / longer
+
+
+def iter_candidate_matches(a, b, max_pairs):
+    # (a row, b row, score) for every pair whose first domains overlap; the
+    # score is the minimum reciprocal overlap fraction across both domains.
+    # Domains go through sd_index.to_axis, so zero-length ones are widened as
+    # bedtools does before both the overlap test and the fraction.
+    a1_start, a1_end = sd_index.to_axis(a['pair'], a['start1'], a['end1'])
+    a2_start, a2_end = sd_index.to_axis(a['pair'], a['start2'], a['end2'])
+    b1_start, b1_end = sd_index.to_axis(b['pair'], b['start1'], b['end1'])
+    b2_start, b2_end = sd_index.to_axis(b['pair'], b['start2'], b['end2'])
+    for ai, bi in sd_index.iter_overlap_pairs(a1_start, a1_end, b1_start, b1_end, max_pairs):
+        score = np.minimum(
+            reciprocal_fraction(a1_start[ai], a1_end[ai], b1_start[bi], b1_end[bi]),
+            reciprocal_fraction(a2_start[ai], a2_end[ai], b2_start[bi], b2_end[bi]))
+        yield ai, bi, score
+
+
+def update_best(best_score, best_partner, rows, partner_lines, scores):
+    # Keep the best-scoring partner per row; ties go to the lower line number
+    if len(rows) == 0:
+        return
+    order = np.lexsort((partner_lines, -scores, rows))
+    rows = rows[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    r = rows[first]
+    s = scores[order][first]
+    p = partner_lines[order][first]
+    better = (s > best_score[r]) | ((s == best_score[r]) & (s > 0) & (p < best_partner[r]))
+    best_score[r[better]] = s[better]
+    best_partner[r[better]] = p[better]
+
+
+def match_shard(shard_dir, n_shard, memory_budget):
+    # Match one shard.  For every SD line of either callset, records the
+    # best minimum-reciprocal-overlap score against the other callset and
+    # that partner's line number; the threshold is applied by the caller.
+    pair_codes = {}
+    a = load_shard(shard_path(shard_dir, 'A', n_shard), pair_codes)
+    b = load_shard(shard_path(shard_dir, 'B', n_shard), pair_codes)
+
+    a_best = np.zeros(len(a['line']))
+    a_partner = np.full(len(a['line']), -1, dtype=np.int64)
+    b_best = np.zeros(len(b['line']))
+    b_partner = np.full(len(b['line']), -1, dtype=np.int64)
+
+    max_pairs = max(memory_budget // BYTES_PER_CANDIDATE, 1 << 16)
+    for ai, bi, score in iter_candidate_matches(a, b, max_pairs):
+        update_best(a_best, a_partner, ai, b['line'][bi], score)
+        update_best(b_best, b_partner, bi, a['line'][ai], score)
+
+    # spill lines were written in file order, so these are sorted by line
+    szResult = os.path.join(shard_dir, f"best.{n_shard:04d}.npz")
+    np.savez(szResult, a_line=a['line'], a_best=a_best, a_partner=a_partner,
+             b_line=b['line'], b_best=b_best, b_partner=b_partner)
+    return szResult
+
+
+def merged_line_numbers(results, side, min_overlap):
+    # Globally sorted line numbers scoring at least min_overlap, merged from
+    # the per-shard sorted results
+    def matched(szResult):
+        with np.load(szResult) as r:
+            return r[f'{side}_line'][r[f'{side}_best'] >= min_overlap].tolist()
+    return heapq.merge(*(matched(p) for p in results))
+
+
+def threshold_sweep(results, grid):
+    # In-common / just-A / just-B SD counts at each threshold, from the
+    # best scores alone (a line is in common at t iff its best score >= t)
+    a_best = []
+    b_best = []
+    for szResult in results:
+        with np.load(szResult) as r:
+            a_best.append(r['a_best'])
+            b_best.append(r['b_best'])
+    a_best = np.sort(np.concatenate(a_best)) if a_best else np.zeros(0)
+    b_best = np.sort(np.concatenate(b_best)) if b_best else np.zeros(0)
+    rows = []
+    for t in grid:
+        nA = len(a_best) - np.searchsorted(a_best, t, side='left')
+        nB = len(b_best) - np.searchsorted(b_best, t, side='left')
+        rows.append((t, nA, nB, len(a_best) - nA, len(b_best) - nB))
+    return rows
+
+
+def write_best_matches(results, szOutput, szNameA, szNameB):
+    # Per-SD best partner table for both callsets, in line order
+    with open(szOutput, "w") as fOut:
+        fOut.write("Callset\tLine\tBest_Partner_Line\tBest_Min_Reciprocal_Overlap\n")
+        for side, szName in (('a', szNameA), ('b', szNameB)):
+            def rows(szResult):
+                with np.load(szResult) as r:
+                    return list(zip(r[f'{side}_line'].tolist(), r[f'{side}_partner'].tolist(),
+                                    r[f'{side}_best'].tolist()))
+            for nLine, nPartner, fBest in heapq.merge(*(rows(p) for p in results)):
+                szPartner = str(nPartner) if fBest > 0 else "NA"
+                fOut.write(f"{szName}\t{nLine}\t{szPartner}\t{fBest:.4f}\n")
+
+
+def write_split(szInput, matched_lines, szMatched, szUnmatched, skip_comments):
+    # Stream szInput, sending matched lines to szMatched (if given) and the
+    # rest to szUnmatched
+    matched = iter(matched_lines)
+    nNext = next(matched, None)
+    fMatched = open(szMatched, "w") if szMatched else None
+    try:
+        with open(szInput, "r") as fInput, open(szUnmatched, "w") as fUnmatched:
+            n1Line = 0
+            for szLine in fInput:
+                n1Line += 1
+                while nNext is not None and nNext < n1Line:
+                    nNext = next(matched, None)
+                if nNext == n1Line:
+                    if fMatched:
+                        fMatched.write(szLine)
+                    continue
+                if skip_comments and szLine.startswith('#'):
+                    continue
+                fUnmatched.write(szLine)
+    finally:
+        if fMatched:
+            fMatched.close()
+
+
+def run_sharded(szCallsetA, szCallsetB, szJustA, szJustB, szInCommon, shard_dir,
+                n_shards=0, n_workers=4, memory_budget_mb=4096, min_overlap=0.5,
+                sweep_grid=None, szSweep=None, szBestMatch=None, names=('A', 'B'),
+                line_indexes=None):
+    # Partition, match in parallel, and merge into the three output BEDs.
+    # Optionally also write the threshold sweep and per-SD best-match table.
+    # With line_indexes (one .lineidx.npz path per callset) the outputs are
+    # sd_selection bitmaps at the .sel.npz counterparts of the BED names.
+    os.makedirs(shard_dir, exist_ok=True)
+    memory_per_worker = memory_budget_mb * (1 << 20) // max(n_workers, 1)
+
+    if n_shards <= 0:
+        # spill text is roughly the size of a loaded shard; aim for shards
+        # that fit in a quarter of a worker's budget
+        nBytes = os.path.getsize(szCallsetA) + os.path.getsize(szCallsetB)
+        n_shards = max(n_workers * 4, -(-nBytes * 4 // memory_per_worker))
+
+    print(f"partitioning into {n_shards} contig-pair shards under {shard_dir}")
+    nLinesA = partition_callset(szCallsetA, shard_dir, 'A', n_shards)
+    nLinesB = partition_callset(szCallsetB, shard_dir, 'B', n_shards)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(match_shard, [shard_dir] * n_shards, range(n_shards),
+                                [memory_per_worker] * n_shards))
+
+    if line_indexes:
+        for szCallset, side, nLines, szIndex, szMatched, szUnmatched, bSkip in (
+                (szCallsetA, 'a', nLinesA, line_indexes[0], None, szJustA, True),
+                (szCallsetB, 'b', nLinesB, line_indexes[1], szInCommon, szJustB, False)):
+            aMatched = np.zeros(nLines + 1, dtype=bool)
+            aMatched[np.fromiter(merged_line_numbers(results, side, min_overlap), dtype=np.int64)] = True
+            sd_selection.write_split(szCallset, szIndex, aMatched,
+                                     szMatched and sd_selection.selection_path(szMatched),
+                                     sd_selection.selection_path(szUnmatched), bSkip)
+    else:
+        write_split(szCallsetA, merged_line_numbers(results, 'a', min_overlap), None, szJustA, True)
+        write_split(szCallsetB, merged_line_numbers(results, 'b', min_overlap), szInCommon, szJustB, False)
+
+    if szSweep:
+        with open(szSweep, "w") as fSweep:
+            fSweep.write(f"Min_Reciprocal_Overlap\tInCommon_{names[0]}\tInCommon_{names[1]}\t"
+                         f"Just_{names[0]}\tJust_{names[1]}\n")
+            for t, nA, nB, nJustA, nJustB in threshold_sweep(results, sweep_grid):
+                fSweep.write(f"{t:g}\t{nA}\t{nB}\t{nJustA}\t{nJustB}\n")
+    if szBestMatch:
+        write_best_matches(results, szBestMatch, names[0], names[1])
+
+    for n in range(n_shards):
+        for szPath in (shard_path(shard_dir, 'A', n), shard_path(shard_dir, 'B', n), results[n]):
+            os.remove(szPath)
+    try:
+        os.rmdir(shard_dir)
+    except OSError:
+        pass
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# Shared-memory copies of one haplotype's parsed inputs (SD table, Inspector
+# errors and their interval indexes) for many worker processes on one node.
+#
+# Each input is published once as a directory of .npy files under /dev/shm
+# (tmpfs; $SD_SHARED_ROOT overrides) and workers attach with
+# np.load(mmap_mode='r'): every process maps the same physical pages, so
+# memory stays flat as workers are added.  The arrays are read-only.
+#
+# A bundle's .holders file lists one PID per reference and is only touched
+# under flock on its .lock file.  Acquiring drops PIDs that are no longer
+# alive (crashed workers); the first live holder builds the bundle and the
+# last release deletes it.  Parents that fan out to a process pool should
+# hold a reference for the whole run so workers attach instead of rebuilding.
+#
+# The errors bundle is keyed by the error files' size/mtime; the SD bundle by
+# the table and the errors bundle, since its contig codes extend the errors'.
+#
+#   with sd_shared_index.shared_inputs(gsd, small, struct) as shared:
+#       shared.sd, shared.errors, shared.error_index, shared.structural_index,
+#       shared.domain_index, shared.domain_set
+#
+#   python sd_shared_index.py list
+#   python sd_shared_index.py purge [--all]
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+import sd_index
+from interval_set import IntervalSet
+
+SHM_ROOT = os.environ.get('SD_SHARED_ROOT') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+PREFIX = 'sd_shared.'
+
+
+def input_key(kind, *paths, extra=()):
+    # Stable across processes: the kind, the inputs' size/mtime and any extra
+    # key material
+    text = repr((kind, sd_index.file_signature(*paths), tuple(extra)))
+    return f"{kind}.{hashlib.sha1(text.encode()).hexdigest()[:20]}"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedArrays:
+    """Reference-counted directory of read-only .npy arrays plus JSON metadata
+
+    `build()` returns ({name: array}, metadata) and only runs in the process
+    that finds no live holder.  Entering returns ({name: memmap}, metadata).
+    """
+
+    def __init__(self, key, build, root=None):
+        self.path = os.path.join(root or SHM_ROOT, PREFIX + key)
+        self.build = build
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self.path + '.lock', 'a') as fLock:
+            fcntl.flock(fLock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fLock, fcntl.LOCK_UN)
+
+    def _live_holders(self):
+        try:
+            with open(self.path + '.holders', 'r') as fHolders:
+                return [pid for pid in map(int, fHolders.read().split()) if _alive(pid)]
+        except FileNotFoundError:
+            return []
+
+    def _write_holders(self, holders):
+        with open(self.path + '.holders', 'w') as fHolders:
+            fHolders.write("".join(f"{pid}\n" for pid in holders))
+
+    def _publish(self):
+        arrays, meta = self.build()
+        szTemp = f"{self.path}.tmp{os.getpid()}"
+        shutil.rmtree(szTemp, ignore_errors=True)
+        os.makedirs(szTemp)
+        for name, array in arrays.items():
+            np.save(os.path.join(szTemp, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(szTemp, 'meta.json'), 'w') as fMeta:
+            json.dump(meta, fMeta)
+        os.rename(szTemp, self.path)
+
+    def __enter__(self):
+        with self._locked():
+            holders = self._live_holders()
+            if not holders or not os.path.isdir(self.path):
+                # nobody alive holds it (or it was never built): (re)build
+                shutil.rmtree(self.path, ignore_errors=True)
+                self._publish()
+            holders.append(os.getpid())
+            self._write_holders(holders)
+        with open(os.path.join(self.path, 'meta.json'), 'r') as fMeta:
+            meta = json.load(fMeta)
+        arrays = {entry.name[:-len('.npy')]: np.load(entry.path, mmap_mode='r')
+                  for entry in os.scandir(self.path) if entry.name.endswith('.npy')}
+        return arrays, meta
+
+    def __exit__(self, *exc):
+        with self._locked():
+            holders = self._live_holders()
+            if os.getpid() in holders:
+                holders.remove(os.getpid())
+            if holders:
+                self._write_holders(holders)
+            else:
+                # mappings already open stay valid after the files go
+                shutil.rmtree(self.path, ignore_errors=True)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.path + '.holders')
+        return False
+
+
+def _index_arrays(prefix, index):
+    return {f'{prefix}_order': index.order, f'{prefix}_starts': index.starts,
+            f'{prefix}_ends': index.ends, f'{prefix}_max_end': index.max_end}
+
+
+def _index_from(prefix, arrays, bedtools_zero_length=True):
+    return sd_index.IntervalIndex.from_sorted(arrays[f'{prefix}_order'], arrays[f'{prefix}_starts'],
+                                              arrays[f'{prefix}_ends'], arrays[f'{prefix}_max_end'],
+                                              bedtools_zero_length)
+
+
+def _contig_codes(names):
+    contigs = sd_index.ContigCodes()
+    for name in names:
+        contigs.code(name)
+    return contigs
+
+
+def build_errors(small_path, struct_path):
+    # Errors plus the filters' indexes over all and over structural errors
+    contigs = sd_index.ContigCodes()
+    errors = sd_index.load_inspector_errors(small_path, struct_path, contigs)
+    struct = errors.subset(errors.structural)
+    arrays = {'contig': errors.contig, 'start': errors.start, 'end': errors.end,
+              'type_code': errors.type_code, 'structural': errors.structural}
+    arrays.update(_index_arrays('error_index', sd_index.IntervalIndex(errors.contig, errors.start, errors.end)))
+    arrays.update(_index_arrays('structural_index', sd_index.IntervalIndex(struct.contig, struct.start, struct.end)))
+    return arrays, {'contigs': contigs.names, 'type_names': list(errors.type_names)}
+
+
+def build_sd(path, contig_names):
+    # The SD table coded on top of the errors' contig codes, with an index and
+    # the merged set of both domains of every canonical pair
+    contigs = _contig_codes(contig_names)
+    sd = sd_index.load_genomic_superdup(path, contigs)
+    r = sd.pair_row
+    domain_contig = np.concatenate([sd.chr1[r], sd.chr2[r]])
+    domain_start = np.concatenate([sd.start1[r], sd.start2[r]])
+    domain_end = np.concatenate([sd.end1[r], sd.end2[r]])
+    domain_set = IntervalSet.from_arrays(contigs, domain_contig, domain_start, domain_end)
+    arrays = {'line': sd.line, 'chr1': sd.chr1, 'start1': sd.start1, 'end1': sd.end1,
+              'chr2': sd.chr2, 'start2': sd.start2, 'end2': sd.end2,
+              'pair': sd.pair, 'pair_row': sd.pair_row,
+              'identity': sd.identity, 'align_length': sd.align_length,
+              'domain_set_start': domain_set.start, 'domain_set_end': domain_set.end}
+    arrays.update(_index_arrays('domain_index', sd_index.IntervalIndex(domain_contig, domain_start, domain_end)))
+    return arrays, {'path': sd.path, 'n_lines': int(sd.n_lines), 'contigs': contigs.names}
+
+
+class SharedInputs:
+    """One haplotype's inputs wrapped around shared read-only arrays"""
+
+    def __init__(self, error_arrays, error_meta, sd_arrays=None, sd_meta=None):
+        self.contigs = _contig_codes(sd_meta['contigs'] if sd_meta else error_meta['contigs'])
+        a = error_arrays
+        self.errors = sd_index.ErrorTable(a['contig'], a['start'], a['end'], a['type_code'], a['structural'],
+                                          error_meta['type_names'], self.contigs)
+        self.error_index = _index_from('error_index', a)
+        self.structural_index = _index_from('structural_index', a)
+        self.sd = self.domain_index = self.domain_set = None
+        if sd_arrays is not None:
+            a = sd_arrays
+            self.sd = sd_index.SDTable(sd_meta['path'], sd_meta['n_lines'], a['line'],
+                                       a['chr1'], a['start1'], a['end1'], a['chr2'], a['start2'], a['end2'],
+                                       self.contigs, a['pair'], a['pair_row'], a['identity'], a['align_length'])
+            self.domain_index = _index_from('domain_index', a)
+            self.domain_set = IntervalSet(self.contigs, a['domain_set_start'], a['domain_set_end'], normalized=True)
+
+
+@contextlib.contextmanager
+def shared_inputs(szGenomicSuperDup, small_path, struct_path, root=None):
+    # Attach (building if needed) the errors bundle and, unless
+    # szGenomicSuperDup is None, the SD bundle on top of it
+    error_key = input_key('errors', small_path, struct_path)
+    with SharedArrays(error_key, lambda: build_errors(small_path, struct_path), root) as (error_arrays, error_meta):
+        if szGenomicSuperDup is None:
+            yield SharedInputs(error_arrays, error_meta)
+            return
+        sd_key = input_key('sd', szGenomicSuperDup, extra=(error_key,))
+        with SharedArrays(sd_key, lambda: build_sd(szGenomicSuperDup, error_meta['contigs']), root) as (sd_arrays, sd_meta):
+            yield SharedInputs(error_arrays, error_meta, sd_arrays, sd_meta)
+
+
+def list_bundles(root=None):
+    # (path, live holders, bytes) of every bundle under root
+    root = root or SHM_ROOT
+    bundles = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if entry.name.startswith(PREFIX) and entry.is_dir() and '.tmp' not in entry.name:
+            nBytes = sum(f.stat().st_size for f in os.scandir(entry.path))
+            bundles.append((entry.path, SharedArrays(entry.name[len(PREFIX):], None, root)._live_holders(), nBytes))
+    return bundles
+
+
+def purge(root=None, everything=False):
+    # Remove bundles without live holders (all bundles with everything=True).
+    # Lock files are left in place; they are empty.
+    root = root or SHM_ROOT
+    removed = []
+    for path, _, _ in list_bundles(root):
+        bundle = SharedArrays(os.path.basename(path)[len(PREFIX):], None, root)
+        with bundle._locked():
+            if everything or not bundle._live_holders():
+                shutil.rmtree(path, ignore_errors=True)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path + '.holders')
+                removed.append(path)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or clean up shared SD/error index bundles')
+    parser.add_argument('command', choices=['list', 'purge'])
+    parser.add_argument('--all', action='store_true', help='purge: also remove bundles that still have holders')
+    parser.add_argument('--root', default=SHM_ROOT)
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for path, holders, nBytes in list_bundles(args.root):
+            print(f"{path}\t{nBytes / 1e6:.1f} MB\tholders: {','.join(map(str, holders)) or 'none'}")
+    else:
+        for path in purge(args.root, args.all):
+            print(f"removed {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Identity- and length-stratified SD summaries of one filter run.
+#
+# Every canonical SD pair is binned by identity (fracMatch) and length
+# (alignL, or the longer domain where the table has no alignL) with
+# np.digitize on the values sd_index.load_genomic_superdup already reads in
+# its one pass, so binning costs two array lookups.  Per (identity, length)
+# bin the table reports pairs and nonredundant bp before and after the
+# filter; each bin's bp is one merge of its own domains, so the merges
+# together cost no more than one merge of the whole table.
+#
+# Bins are half-open, [lo, hi), with open-ended bins below the first and
+# from the last edge on; pairs without fracMatch land in identity bin NA.
+# The filter scripts write {prefix}.sd_strata.tsv with --bStrataTables:
+#
+#   python filter_sd_by_errors.py ... --bStrataTables \
+#       --szIdentityBins 0.9,0.95,0.98,0.99 --szLengthBins 1000,5000,10000,50000,100000
+#
+#   import sd_strata
+#   sd_strata.write_strata(prefix, sd, aPairsWithErrors, identity_edges, length_edges)
+
+import numpy as np
+
+from interval_set import IntervalSet
+
+STRATA_SUFFIX = '.sd_strata.tsv'
+DEFAULT_IDENTITY_BINS = '0.9,0.95,0.98,0.99'
+DEFAULT_LENGTH_BINS = '1000,5000,10000,50000,100000'
+COLUMNS = ['Identity_bin', 'Length_bin', 'SD_pairs', 'Removed_pairs', 'Filtered_pairs',
+           'Nonredundant_bp', 'Filtered_nonredundant_bp']
+
+
+def parse_edges(text):
+    # '0.9,0.95,0.98' -> increasing float edges
+    try:
+        edges = np.array([float(x) for x in text.split(',') if x.strip()], dtype=np.float64)
+    except ValueError:
+        raise ValueError(f"bin edges '{text}': expected comma-separated numbers")
+    if len(edges) == 0 or np.any(np.diff(edges) <= 0):
+        raise ValueError(f"bin edges '{text}': expected at least one edge, strictly increasing")
+    return edges
+
+
+def bin_labels(edges, fmt):
+    labels = [f"<{fmt(edges[0])}"]
+    labels += [f"[{fmt(lo)},{fmt(hi)})" for lo, hi in zip(edges[:-1], edges[1:])]
+    labels.append(f">={fmt(edges[-1])}")
+    return labels
+
+
+def pair_values(sd):
+    # (identity, length) of every canonical pair, from its representative row
+    r = sd.pair_row
+    length = sd.align_length[r]
+    domain_length = np.maximum(sd.end1[r] - sd.start1[r], sd.end2[r] - sd.start2[r])
+    return sd.identity[r], np.where(length >= 0, length, domain_length)
+
+
+def pair_bins(sd, identity_edges, length_edges):
+    # Identity bin (len(identity_edges) + 1 = NA) and length bin of every pair
+    identity, length = pair_values(sd)
+    identity_bin = np.digitize(identity, identity_edges)
+    identity_bin[np.isnan(identity)] = len(identity_edges) + 1
+    return identity_bin, np.digitize(length, length_edges)
+
+
+def strata_table(sd, removed_pairs, identity_edges, length_edges):
+    # {column: list}, one entry per non-empty (identity, length) bin
+    identity_bin, length_bin = pair_bins(sd, identity_edges, length_edges)
+    n_length = len(length_edges) + 1
+    key = identity_bin * n_length + length_bin
+    removed = np.asarray(removed_pairs, dtype=bool)
+    identity_labels = bin_labels(identity_edges, lambda x: f"{x:g}") + ['NA']
+    length_labels = bin_labels(length_edges, lambda x: f"{int(x)}" if x == int(x) else f"{x:g}")
+
+    keys, inverse = np.unique(key, return_inverse=True)
+    members = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[members], np.arange(len(keys) + 1))
+    table = {c: [] for c in COLUMNS}
+    for b, k in enumerate(keys.tolist()):
+        pairs = members[bounds[b]:bounds[b + 1]]
+        kept = pairs[~removed[pairs]]
+        table['Identity_bin'].append(identity_labels[k // n_length])
+        table['Length_bin'].append(length_labels[k % n_length])
+        table['SD_pairs'].append(len(pairs))
+        table['Removed_pairs'].append(len(pairs) - len(kept))
+        table['Filtered_pairs'].append(len(kept))
+        table['Nonredundant_bp'].append(IntervalSet.from_sd(sd, sd.pair_row[pairs]).length)
+        table['Filtered_nonredundant_bp'].append(IntervalSet.from_sd(sd, sd.pair_row[kept]).length)
+    return table
+
+
+def write_strata(szPrefix, sd, removed_pairs, identity_edges, length_edges):
+    table = strata_table(sd, removed_pairs, identity_edges, length_edges)
+    with open(szPrefix + STRATA_SUFFIX, "w") as fOut:
+        fOut.write("\t".join(COLUMNS) + "\n")
+        for values in zip(*(table[c] for c in COLUMNS)):
+            fOut.write("\t".join(map(str, values)) + "\n")
+    return szPrefix + STRATA_SUFFIX
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+
+# Triage: rough per-haplotype estimates from a random sample of each input,
+# with bootstrap confidence intervals, before committing to a full run.
+#
+#   filter   percent of SD pairs removed and of nonredundant SD bp lost, as
+#            filter_sd_by_errors.py (or --structural) would report them
+#   analyze  small-scale / structural error counts and nonredundant error bp,
+#            as analyze_inspector_error.py would report them
+#
+# The default sampling unit is the contig.  GenomicSuperDup.tab and the
+# Inspector BEDs are grouped by their first column, so every contig's block
+# of lines is found by galloping/bisecting byte offsets (a few dozen seeks
+# per contig, no full scan) and only the sampled blocks are read.  The
+# sampled lines are deduplicated into canonical pairs, each counted on the
+# contig of its first domain, and bp is merged per contig from both domains,
+# so pair counts and merged bp add up over contigs; with every contig read
+# they equal the filter's summary.  A pair listed only from an unsampled
+# contig's block is missed until that block is sampled, so tables that are
+# not mirrored estimate slightly low.  Inputs not grouped by contig are
+# detected and reported.
+#
+# `filter --unit lines` samples SD lines instead (uniformly from a
+# sd_selection line index when one is found in --line-index-dir, otherwise
+# by random byte offsets weighted back by line length).  It needs no
+# grouping but only estimates the percent of pairs removed.
+#
+#   python sd_triage.py filter --manifest cohort_manifest.tsv --fraction 0.05
+#   python sd_triage.py filter --manifest cohort_manifest.tsv --structural --contigs 40
+#   python sd_triage.py analyze --input-dir assembly_qc_files --fraction 0.1
+#   python sd_triage.py analyze --inventory sample_inventory.tsv --contigs 20
+
+import argparse
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sample_inventory
+import sd_index
+import sd_selection
+
+
+# --- contig blocks by byte-offset search ------------------------------------
+
+def _line_from(f, pos):
+    # (start, line) of the first line starting at or after byte pos
+    if pos <= 0:
+        f.seek(0)
+    else:
+        f.seek(pos - 1)
+        f.readline()
+    start = f.tell()
+    return start, f.readline()
+
+
+def _key(line):
+    return line.split(b'\t', 1)[0] if line else None
+
+
+def _first_data_line(f):
+    # Byte offset of the first line that is not a leading comment
+    f.seek(0)
+    while True:
+        start = f.tell()
+        line = f.readline()
+        if not line or not line.startswith(b'#'):
+            return start
+
+
+def contig_blocks(path):
+    # [(contig, start byte, end byte)] of the contiguous first-column blocks of
+    # a file grouped by contig, found by galloping then bisecting from each
+    # block start.  ValueError when a contig shows up in two blocks.
+    size = os.path.getsize(path)
+    blocks = []
+    seen = set()
+    with open(path, "rb") as f:
+        nStart = _first_data_line(f)
+        while nStart < size:
+            _, line = _line_from(f, nStart)
+            contig = _key(line)
+            if contig in seen:
+                raise ValueError(f"{path} is not grouped by contig ({contig.decode()} appears in two blocks)")
+            seen.add(contig)
+
+            # gallop: lo always lies inside the block, hi past its end
+            lo = nStart
+            step = max(len(line), 1)
+            while True:
+                hi = lo + step
+                if hi >= size or _key(_line_from(f, hi)[1]) != contig:
+                    break
+                lo = hi
+                step *= 2
+            hi = min(hi, size)
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _key(_line_from(f, mid)[1]) == contig:
+                    lo = mid
+                else:
+                    hi = mid
+            nEnd = _line_from(f, hi)[0] if hi < size else size
+            blocks.append((contig.decode(), nStart, nEnd))
+            nStart = nEnd
+    return blocks
+
+
+def read_block(path, contig, start, end):
+    # The lines of one contig block, checked to really all be that contig's
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).decode().splitlines()
+    lines = [line for line in lines if line and not line.startswith('#')]
+    for line in lines:
+        found = line.split('\t', 1)[0]
+        if found != contig:
+            raise ValueError(f"{path} is not grouped by contig (found {found} inside the {contig} block)")
+    return lines
+
+
+# --- estimates -----------------------------------------------------------------
+
+def bootstrap(per_unit, estimate, n_boot, alpha, rng):
+    # Point estimate and percentile CI of estimate(column sums) when the
+    # sampled units (rows of per_unit) are resampled with replacement
+    per_unit = np.asarray(per_unit, dtype=np.float64)
+    point = estimate(per_unit.sum(axis=0))
+    if len(per_unit) == 0:
+        return point, np.full_like(point, np.nan), np.full_like(point, np.nan)
+    idx = rng.integers(0, len(per_unit), size=(n_boot, len(per_unit)))
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        # metrics a unit type cannot estimate are NaN in every replicate
+        warnings.simplefilter('ignore', RuntimeWarning)
+        boot = estimate(per_unit[idx].sum(axis=1))
+        lo, hi = np.nanpercentile(boot, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return point, lo, hi
+
+
+def _percent(num, den):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, 100.0 * num / np.where(den > 0, den, 1), np.nan)
+
+
+def n_sampled(n_total, n_contigs, fraction):
+    if n_contigs:
+        return min(n_contigs, n_total)
+    return min(n_total, max(1, int(round(n_total * fraction))))
+
+
+# --- filter triage -------------------------------------------------------------
+
+FILTER_METRICS = ['Percent_Pairs_Removed', 'Percent_Nonredundant_bp_Lost', 'SD_pairs',
+                  'Nonredundant_bp_before_filtering', 'Nonredundant_bp_after_filtering']
+
+
+def _removed(errors_index, contigs, chr1, start1, end1, chr2, start2, end2):
+    # The filter decision for parsed SD lines: either domain overlaps an error
+    code1 = np.array([contigs.lookup(c) for c in chr1], dtype=np.int64)
+    code2 = np.array([contigs.lookup(c) for c in chr2], dtype=np.int64)
+    return (errors_index.overlaps_any(code1, start1, end1) |
+            errors_index.overlaps_any(code2, start2, end2))
+
+
+def _parse_sd_lines(lines):
+    fields = [line.split('\t') for line in lines]
+    return ([f[0] for f in fields],
+            np.array([int(f[1]) for f in fields], dtype=np.int64),
+            np.array([int(f[2]) for f in fields], dtype=np.int64),
+            [f[6] for f in fields],
+            np.array([int(f[7]) for f in fields], dtype=np.int64),
+            np.array([int(f[8]) for f in fields], dtype=np.int64))
+
+
+def _load_error_index(row, structural):
+    contigs = sd_index.ContigCodes()
+    errors = sd_index.load_inspector_errors(None if structural else row['SmallScaleErrors'],
+                                            row['StructuralErrors'], contigs)
+    return contigs, sd_index.IntervalIndex(errors.contig, errors.start, errors.end)
+
+
+def triage_filter_contigs(row, structural, n_contigs, fraction, rng):
+    # Per sampled contig: [SD pairs, removed pairs, merged bp, merged bp kept].
+    # The lines of all sampled blocks are deduplicated into canonical pairs,
+    # so mirrored, unmirrored and duplicated lines count once; each pair is
+    # owned by the contig of its first domain (by name) and both domains add
+    # bp to the contig they lie on.  Reading every contig gives the filter's
+    # summary exactly.
+    contigs, index = _load_error_index(row, structural)
+    blocks = contig_blocks(row['GenomicSuperDup'])
+    pick = np.sort(rng.choice(len(blocks), size=n_sampled(len(blocks), n_contigs, fraction), replace=False))
+
+    unit = {}
+    lines = []
+    for i, b in enumerate(pick):
+        unit[blocks[b][0]] = i
+        lines += read_block(row['GenomicSuperDup'], *blocks[b])
+
+    per_contig = np.zeros((len(pick), 4), dtype=np.int64)
+    if lines:
+        chr1, start1, end1, chr2, start2, end2 = _parse_sd_lines(lines)
+        removed = _removed(index, contigs, chr1, start1, end1, chr2, start2, end2)
+        code1 = np.array([contigs.code(c) for c in chr1], dtype=np.int64)
+        code2 = np.array([contigs.code(c) for c in chr2], dtype=np.int64)
+        _, r = sd_index.canonical_pairs(code1, start1, end1, code2, start2, end2)
+        owner = np.array([unit.get(min(chr1[k], chr2[k]), -1) for k in r], dtype=np.int64)
+        own = owner >= 0
+        per_contig[:, 0] = np.bincount(owner[own], minlength=len(pick))
+        per_contig[:, 1] = np.bincount(owner[own], weights=removed[r][own], minlength=len(pick))
+
+        # both domains of every pair, on the sampled contig they lie on
+        domain_unit = np.array([unit.get(c, -1) for c in np.concatenate([np.array(chr1, dtype=object)[r],
+                                                                         np.array(chr2, dtype=object)[r]])],
+                               dtype=np.int64)
+        domain_start = np.concatenate([start1[r], start2[r]])
+        domain_end = np.concatenate([end1[r], end2[r]])
+        domain_kept = np.tile(~removed[r], 2)
+        for column, mask in ((2, domain_unit >= 0), (3, (domain_unit >= 0) & domain_kept)):
+            block_start, block_end = sd_index.merge_axis(*sd_index.to_axis(
+                domain_unit[mask], domain_start[mask], domain_end[mask], bedtools_zero_length=False))
+            per_contig[:, column] = np.bincount(block_start // sd_index.CONTIG_STRIDE,
+                                                weights=block_end - block_start, minlength=len(pick))
+
+    expand = len(blocks) / max(len(pick), 1)
+
+    def estimate(s):
+        s = np.moveaxis(s, -1, 0)
+        return np.stack([_percent(s[1], s[0]), _percent(s[2] - s[3], s[2]),
+                         expand * s[0], expand * s[2], expand * s[3]], axis=-1)
+    return per_contig, estimate, len(pick), len(blocks)
+
+
+def _sample_lines_by_offset(path, n_lines, rng):
+    # SD lines containing uniform random byte offsets, and their byte lengths
+    # (a line is hit with probability proportional to its length)
+    size = os.path.getsize(path)
+    lines, lengths = [], []
+    with open(path, "rb") as f:
+        nFirst = _first_data_line(f)
+        for pos in np.sort(rng.integers(nFirst, size, size=n_lines)):
+            back = 0
+            while True:
+                back = min(pos, max(2 * back, 4096))
+                f.seek(pos - back)
+                nl = f.read(back).rfind(b'\n')
+                if nl >= 0 or back == pos:
+                    break
+            f.seek(pos - back + nl + 1)
+            line = f.readline()
+            lines.append(line.decode().rstrip('\n'))
+            lengths.append(len(line))
+    return lines, np.array(lengths, dtype=np.float64)
+
+
+def triage_filter_lines(row, structural, n_lines, line_index_dir, rng):
+    # Per sampled SD line: [weight, weight if removed]
+    contigs, index = _load_error_index(row, structural)
+    szIndex = None
+    if line_index_dir:
+        szIndex = os.path.join(line_index_dir, f"{row['Sample']}.{row['Haplotype']}.GenomicSuperDup"
+                                               f"{sd_selection.LINE_INDEX_SUFFIX}")
+        if not os.path.exists(szIndex):
+            szIndex = None
+
+    if szIndex:
+        offsets, comment = sd_selection.load_line_index(szIndex)
+        data_lines = np.flatnonzero(~comment)
+        pick = np.sort(rng.choice(data_lines, size=min(n_lines, len(data_lines)), replace=False))
+        lines = []
+        with open(row['GenomicSuperDup'], "rb") as f:
+            for n in pick:
+                f.seek(offsets[n])
+                lines.append(f.read(offsets[n + 1] - offsets[n]).decode().rstrip('\n'))
+        weight = np.ones(len(lines))
+        n_total = len(data_lines)
+    else:
+        lines, lengths = _sample_lines_by_offset(row['GenomicSuperDup'], n_lines, rng)
+        weight = 1.0 / lengths
+        n_total = 0
+
+    removed = _removed(index, contigs, *_parse_sd_lines(lines)) if lines else np.zeros(0, dtype=bool)
+    per_line = np.stack([weight, weight * removed], axis=-1)
+
+    def estimate(s):
+        s = np.moveaxis(s, -1, 0)
+        nan = np.full(np.shape(s[0]), np.nan)
+        pairs = nan if not n_total else np.full(np.shape(s[0]), n_total / 2)
+        return np.stack([_percent(s[1], s[0]), nan, pairs, nan, nan], axis=-1)
+    return per_line, estimate, len(lines), n_total
+
+
+# --- analyze triage ------------------------------------------------------------
+
+ANALYZE_METRICS = ['Small_Scale_Errors', 'Structural_Errors', 'Error_bp', 'Percent_Assembly_Error_bp']
+
+
+def _error_rows(lines, structural):
+    # (start, end, type) per Inspector BED line, parsed as
+    # analyze_inspector_error.py does (first HaplotypeSwitch coordinate)
+    rows = []
+    for line in lines:
+        fields = line.split('\t')
+        rows.append((int(fields[1].split(';')[0]), int(fields[2].split(';')[0]),
+                     fields[4] if structural else fields[7]))
+    return rows
+
+
+def triage_analyze(row, n_contigs, fraction, rng):
+    # Per sampled contig: [small-scale errors, structural errors, union error bp]
+    import analyze_inspector_error
+
+    paths = {False: row['SmallScaleErrors'], True: row['StructuralErrors']}
+    blocks = {s: {c: (a, b) for c, a, b in contig_blocks(p)} if p else {}
+              for s, p in paths.items()}
+    names = sorted(set(blocks[False]) | set(blocks[True]))
+    pick = np.sort(rng.choice(len(names), size=n_sampled(len(names), n_contigs, fraction), replace=False)) \
+        if names else np.zeros(0, dtype=np.int64)
+
+    per_contig = np.zeros((len(pick), 3), dtype=np.int64)
+    for i, n in enumerate(pick):
+        contig = names[n]
+        rows = {}
+        for s in (False, True):
+            rows[s] = _error_rows(read_block(paths[s], contig, *blocks[s][contig]), s) \
+                if contig in blocks[s] else []
+        # substitutions count 1 bp in analyze's size column but the sweep
+        # uses coordinates, as analyze's nonredundant coverage does
+        both = rows[False] + rows[True]
+        bp = 0
+        if both:
+            starts, ends, types = zip(*both)
+            bp = analyze_inspector_error.attribute_error_bp(*analyze_inspector_error.sweep_error_types(
+                [contig] * len(both), starts, ends, types))['union_bp']
+        per_contig[i] = (len(rows[False]), len(rows[True]), bp)
+
+    total_length = np.nan
+    if row['SummaryStatistics']:
+        total_length = analyze_inspector_error.parse_summary_statistics(
+            row['SummaryStatistics']).get('total_length', np.nan)
+    expand = len(names) / max(len(pick), 1)
+
+    def estimate(s):
+        s = np.moveaxis(s, -1, 0)
+        return np.stack([expand * s[0], expand * s[1], expand * s[2],
+                         100.0 * expand * s[2] / total_length], axis=-1)
+    return per_contig, estimate, len(pick), len(names)
+
+
+# --- driver --------------------------------------------------------------------
+
+def run_job(job, args, seed):
+    t0 = time.time()
+    rng = np.random.default_rng(seed)
+    if args.command == 'filter':
+        if args.unit == 'lines':
+            per_unit, estimate, n_units, n_total = triage_filter_lines(
+                job, args.structural, args.lines, args.line_index_dir, rng)
+        else:
+            per_unit, estimate, n_units, n_total = triage_filter_contigs(
+                job, args.structural, args.contigs, args.fraction, rng)
+    else:
+        per_unit, estimate, n_units, n_total = triage_analyze(job, args.contigs, args.fraction, rng)
+    point, lo, hi = bootstrap(per_unit, estimate, args.bootstrap, 1 - args.confidence, rng)
+    if n_units == n_total:
+        # every unit was read: the estimate is the full-run value
+        lo, hi = point, point
+    return point, lo, hi, n_units, n_total, time.time() - t0
+
+
+def analyze_jobs(input_dir, inventory=None):
+    # The haplotypes analyze_inspector_error.py would read: one scan of the
+    # input directory, or the cached sample inventory
+    if inventory:
+        rows = sample_inventory.load_inventory(inventory)
+    else:
+        rows, _ = sample_inventory.scan(None, input_dir)
+    return [row for row in rows if row['SmallScaleErrors'] or row['StructuralErrors'] or row['SummaryStatistics']]
+
+
+def _fmt(x):
+    if np.isnan(x):
+        return "NA"
+    return f"{x:.2f}" if abs(x) < 1000 else f"{x:.0f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sampled estimates with bootstrap CIs before a full run')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('filter', help='percent of SD pairs removed / nonredundant bp lost')
+    p.add_argument('--manifest', required=True)
+    p.add_argument('--structural', action='store_true', help='structural errors only, as filter_sd_by_structural_errors.py')
+    p.add_argument('--unit', choices=['contigs', 'lines'], default='contigs')
+    p.add_argument('--lines', type=int, default=2000, help='SD lines sampled with --unit lines')
+    p.add_argument('--line-index-dir', help='where sd_selection .lineidx.npz files for the manifest rows live')
+
+    p = sub.add_parser('analyze', help='error counts and nonredundant error bp')
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument('--input-dir', help='Input directory containing sample folders')
+    g.add_argument('--inventory', help='sample_inventory.py cache to read (and refresh) instead of scanning --input-dir')
+
+    for p in sub.choices.values():
+        p.add_argument('--contigs', type=int, default=0, help='contigs sampled per haplotype (overrides --fraction)')
+        p.add_argument('--fraction', type=float, default=0.05, help='fraction of contigs sampled per haplotype')
+        p.add_argument('--bootstrap', type=int, default=1000)
+        p.add_argument('--confidence', type=float, default=0.95)
+        p.add_argument('--seed', type=int, default=0)
+        p.add_argument('--threads', type=int, default=os.cpu_count())
+        p.add_argument('--output', help='TSV of estimates (default: print only)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'filter':
+        jobs, metrics = sd_index.read_manifest(args.manifest), FILTER_METRICS
+    else:
+        try:
+            jobs = analyze_jobs(args.input_dir, args.inventory)
+        except (OSError, ValueError) as e:
+            sys.exit(f"sd_triage.py: {e}")
+        metrics = ANALYZE_METRICS
+    seeds = np.random.SeedSequence(args.seed).spawn(len(jobs))
+
+    header = ['Sample', 'Haplotype', 'Units_Sampled', 'Units_Total']
+    for m in metrics:
+        header += [m, f'{m}_CI_Low', f'{m}_CI_High']
+    rows = []
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = [(pool.submit(run_job, job, args, seed), job) for job, seed in zip(jobs, seeds)]
+        for future, job in futures:
+            try:
+                point, lo, hi, n_units, n_total, seconds = future.result()
+            except (OSError, ValueError, IndexError) as e:
+                print(f"Error triaging {job['Sample']} {job['Haplotype']}: {e}", file=sys.stderr)
+                continue
+            row = [job['Sample'], job['Haplotype'], str(n_units), str(n_total or 'NA')]
+            text = []
+            for m, x, l, h in zip(metrics, point, lo, hi):
+                row += [_fmt(x), _fmt(l), _fmt(h)]
+                text.append(f"{m} {_fmt(x)} [{_fmt(l)}, {_fmt(h)}]")
+            rows.append(row)
+            print(f"{job['Sample']} {job['Haplotype']} ({n_units}/{n_total or '?'} {args.unit if args.command == 'filter' else 'contigs'}, "
+                  f"{seconds:.2f}s): " + ", ".join(text))
+
+    print(f"\n{len(rows)} of {len(jobs)} haplotypes triaged in {time.time() - t0:.1f}s "
+          f"({100 * args.confidence:g}% bootstrap intervals)")
+    if args.output:
+        with open(args.output, "w") as fOut:
+            fOut.write("\t".join(header) + "\n")
+            for row in rows:
+                fOut.write("\t".join(row) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -204,11 +204,11 @@ def create_summary_report(df, output_dir):
     
     print(f"Report saved to {report_file}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Visualize Inspector error statistics')
     parser.add_argument('--data-dir', default='/projects/standard/hsiehph/shared/DIR_homes/hudso501/analysisPI/data',
                         help='Directory containing the analysis output files')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Load summary data
     summary_file = os.path.join(args.data_dir, 'inspector_error_summary.tsv')